@@ -0,0 +1,34 @@
+"""
+Prometheus metrics of the auth service, exposed at /metrics.
+
+Every request of the other services is checked here, so the validation rate
+is the request rate of the whole system.
+"""
+import functools
+import time
+
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+VALIDATIONS = Counter('auth_token_validations_total', 'Token validations by outcome', ['result'])
+VALIDATION_SECONDS = Histogram('auth_token_validation_duration_seconds', 'Time to validate a token')
+
+
+def observe_validation(view):
+    """Times a token validation view and counts the outcomes: valid, invalid or bad_request"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        start = time.perf_counter()
+        response = view(request, *args, **kwargs)
+        VALIDATION_SECONDS.observe(time.perf_counter() - start)
+        if response.status_code != 200:
+            result = 'bad_request'
+        else:
+            result = 'valid' if response.data.get('valid') else 'invalid'
+        VALIDATIONS.labels(result).inc()
+        return response
+    return wrapper
+
+
+def metrics_view(request):
+    return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
@@ -23,6 +23,7 @@ from dj_rest_auth.views import PasswordResetView, PasswordResetConfirmView
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from .metrics import metrics_view
 from .views import validate_token
 
 schema_view = get_schema_view(
@@ -46,6 +47,7 @@ urlpatterns = [
         name="password_reset_confirm",
     ),
     path("auth/validate-token/", validate_token, name="validate_token"),
+    path("metrics", metrics_view, name="metrics"),
     path(
         "swagger<format>/", schema_view.without_ui(cache_timeout=0), name="schema_json"
     ),
@@ -8,9 +8,12 @@ from django.contrib.auth.models import User
 import jwt
 from django.conf import settings
 
+from .metrics import observe_validation
+
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@observe_validation
 def validate_token(request):
     """Internal endpoint for other microservices to validate JWT tokens"""
     token = request.data.get('token')
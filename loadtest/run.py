@@ -0,0 +1,296 @@
+"""
+HTTP load test of video_service and statistics_service.
+
+Starts the stub auth service and both Django services (see loadtest.serve) against SQLite or a local
+Postgres, with the local message broker instead of Kafka. statistics_service is seeded with completed
+results of one user, then the endpoints are driven at the given concurrency and throughput and latency
+percentiles are reported per scenario:
+
+    upload    POST video_service   /api/upload/
+    status    GET  video_service   /api/task/<task_id>/ (tasks created by upload)
+    tasks     GET  video_service   /api/tasks/
+    results   GET  statistics_service /api/results/ (--seed-results rows of one user)
+    download  GET  statistics_service /api/download/report/<task_id>/
+
+Run from the repository root:
+
+    python -m loadtest.run --concurrency 16 --requests 500 --seed-results 10000 --output loadtest.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from loadtest.stub_auth import token_for
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ['upload', 'status', 'tasks', 'results', 'download']
+PERCENTILES = [50, 90, 95, 99]
+
+ROI_DATA = {
+    "start_region": [[100, 100], [200, 100], [200, 200], [100, 200]],
+    "end_region": [[300, 100], [400, 100], [400, 200], [300, 200]],
+    "lanes": [[[150, 100], [250, 100], [250, 200], [150, 200]]],
+    "lanes_count": 1,
+    "length_km": 0.1,
+    "max_speed": 60
+}
+
+
+def percentile(sorted_values, percent):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class ServiceProcesses:
+    """Stub auth, video_service and statistics_service as child processes of the load test"""
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.processes = []
+
+    def __enter__(self):
+        args = self.args
+        shared = os.path.join(self.workdir, 'shared')
+        os.makedirs(shared, exist_ok=True)
+
+        self.start('auth', [sys.executable, '-m', 'loadtest.stub_auth', '--port', str(args.auth_port)], {})
+        base_env = {
+            'AUTH_SERVICE_URL': f'http://127.0.0.1:{args.auth_port}',
+            'SHARED_STORAGE_PATH': shared,
+            'LOADTEST_DATABASE': args.database,
+            'MESSAGING_BACKEND': 'local',
+            'MESSAGING_LOCAL_PATH': os.path.join(self.workdir, 'messages.sqlite3'),
+        }
+        self.start('video', [
+            sys.executable, '-m', 'loadtest.serve', 'video', '--port', str(args.video_port)
+        ], dict(base_env, LOADTEST_SQLITE_PATH=os.path.join(self.workdir, 'video.sqlite3')))
+        self.start('statistics', [
+            sys.executable, '-m', 'loadtest.serve', 'statistics', '--port', str(args.stats_port),
+            '--seed-results', str(args.seed_results), '--seed-user', args.seed_user,
+            '--report-size', str(args.report_size)
+        ], dict(base_env, LOADTEST_SQLITE_PATH=os.path.join(self.workdir, 'statistics.sqlite3')))
+
+        headers = {'Authorization': f'Bearer {token_for(args.seed_user)}'}
+        self.wait_ready(f'{args.video_url}/api/roi-schema/', {})
+        self.wait_ready(f'{args.stats_url}/api/results/', headers)
+        return self
+
+    def start(self, name, command, env):
+        log = open(os.path.join(self.workdir, f'{name}.log'), 'w')
+        process = subprocess.Popen(command, cwd=REPO_ROOT, env=dict(os.environ, **env), stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append((name, process, log))
+
+    def wait_ready(self, url, headers, timeout=180):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for name, process, _ in self.processes:
+                if process.poll() is not None:
+                    raise RuntimeError(f'{name} exited with code {process.returncode}, see {self.workdir}/{name}.log')
+            try:
+                if requests.get(url, headers=headers, timeout=5).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f'{url} is not ready after {timeout} seconds')
+
+    def __exit__(self, *exc):
+        for _, process, log in self.processes:
+            process.terminate()
+        for _, process, log in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.video_bytes = os.urandom(args.video_size * 1024)
+        self.uploaded = []
+        self.seeded = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def session(self):
+        # One keep-alive connection per worker thread
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def headers(self, user_id):
+        return {'Authorization': f'Bearer {token_for(user_id)}'}
+
+    def user_for(self, index):
+        return str(index % self.args.users + 1)
+
+    def request_upload(self, index):
+        user_id = self.user_for(index)
+        response = self.session().post(
+            f'{self.args.video_url}/api/upload/',
+            headers=self.headers(user_id),
+            files={'video': (f'loadtest_{index}.mp4', self.video_bytes, 'video/mp4')},
+            data={'roi_data': json.dumps(ROI_DATA)},
+            timeout=self.args.timeout
+        )
+        if response.status_code == 201:
+            with self.lock:
+                self.uploaded.append((user_id, response.json()['task_id']))
+        return response
+
+    def request_status(self, index):
+        user_id, task_id = self.uploaded[index % len(self.uploaded)]
+        return self.session().get(
+            f'{self.args.video_url}/api/task/{task_id}/', headers=self.headers(user_id), timeout=self.args.timeout
+        )
+
+    def request_tasks(self, index):
+        return self.session().get(
+            f'{self.args.video_url}/api/tasks/', headers=self.headers(self.user_for(index)), timeout=self.args.timeout
+        )
+
+    def request_results(self, index):
+        return self.session().get(
+            f'{self.args.stats_url}/api/results/', headers=self.headers(self.args.seed_user), timeout=self.args.timeout
+        )
+
+    def request_download(self, index):
+        task_id = self.seeded[index % len(self.seeded)]
+        return self.session().get(
+            f'{self.args.stats_url}/api/download/report/{task_id}/',
+            headers=self.headers(self.args.seed_user), timeout=self.args.timeout
+        )
+
+    def prepare(self, scenario):
+        # Status needs uploaded tasks, download needs seeded results
+        if scenario == 'status' and not self.uploaded:
+            for index in range(self.args.users):
+                self.request_upload(index)
+            if not self.uploaded:
+                raise RuntimeError('No task could be uploaded for the status scenario')
+        if scenario == 'download' and not self.seeded:
+            response = self.request_results(0)
+            response.raise_for_status()
+            self.seeded = [item['task_id'] for item in response.json()['results'] if 'report_download_url' in item]
+            if not self.seeded:
+                raise RuntimeError('No seeded results to download, use --seed-results')
+
+    def run(self, scenario):
+        self.prepare(scenario)
+        request = getattr(self, f'request_{scenario}')
+
+        def timed(index):
+            start = time.perf_counter()
+            try:
+                response = request(index)
+                # The body is read by requests, so the latency includes the transfer
+                status = response.status_code
+                size = len(response.content)
+            except requests.RequestException as e:
+                status, size = type(e).__name__, 0
+            return time.perf_counter() - start, status, size
+
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            started = time.perf_counter()
+            samples = list(pool.map(timed, range(self.args.requests)))
+            elapsed = time.perf_counter() - started
+
+        return summarize(scenario, samples, elapsed, self.args.concurrency)
+
+
+def summarize(scenario, samples, elapsed, concurrency):
+    latencies = sorted(latency for latency, _, _ in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': errors,
+        'statuses': statuses,
+        'elapsed': elapsed,
+        'throughput': len(samples) / elapsed if elapsed > 0 else None,
+        'bytes_received': sum(size for _, _, size in samples),
+        'latency': dict(
+            {f'p{p}': percentile(latencies, p) for p in PERCENTILES},
+            mean=sum(latencies) / len(latencies) if latencies else None,
+            max=latencies[-1] if latencies else None,
+        ),
+    }
+
+
+def print_results(results):
+    print(f"{'scenario':<10} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          + ' '.join(f"{f'p{p} ms':>9}" for p in PERCENTILES) + f" {'max ms':>9}")
+    for result in results:
+        latency = result['latency']
+        print(f"{result['scenario']:<10} {result['requests']:>8} {result['errors']:>6} {result['throughput']:>8.1f} "
+              + ' '.join(f"{latency[f'p{p}'] * 1000:>9.1f}" for p in PERCENTILES) + f" {latency['max'] * 1000:>9.1f}")
+
+
+def load_args():
+    parser = argparse.ArgumentParser(description='HTTP load test of video_service and statistics_service')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma separated scenarios in run order: {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=8, help='Parallel clients')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--users', type=int, default=10, help='Users the uploads are spread over')
+    parser.add_argument('--video-size', type=int, default=1024, help='Uploaded file size, KB')
+    parser.add_argument('--seed-results', type=int, default=10000, help='Completed results of --seed-user in statistics_service')
+    parser.add_argument('--seed-user', default='1')
+    parser.add_argument('--report-size', type=int, default=256 * 1024, help='Downloaded report size, bytes')
+    parser.add_argument('--database', choices=['sqlite', 'postgres'], default='sqlite',
+                        help='postgres uses DB_* / DATABASE_* variables of the services')
+    parser.add_argument('--timeout', type=float, default=60, help='Request timeout, seconds')
+    parser.add_argument('--auth-port', type=int, default=8101)
+    parser.add_argument('--video-port', type=int, default=8102)
+    parser.add_argument('--stats-port', type=int, default=8104)
+    parser.add_argument('--workdir', default=None, help='Databases, shared storage and service logs (default: temporary)')
+    parser.add_argument('--output', default=None, help='Path of the JSON result')
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    if args.concurrency < 1 or args.requests < 1 or args.users < 1:
+        parser.error('--concurrency, --requests and --users must be positive')
+    args.video_url = f'http://127.0.0.1:{args.video_port}'
+    args.stats_url = f'http://127.0.0.1:{args.stats_port}'
+    return args
+
+
+if __name__ == '__main__':
+    args = load_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix='loadtest_')
+    os.makedirs(workdir, exist_ok=True)
+    print(f'Working directory: {workdir}')
+
+    with ServiceProcesses(args, workdir):
+        load_test = LoadTest(args)
+        results = [load_test.run(scenario) for scenario in args.scenarios]
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'settings': {name: value for name, value in vars(args).items()},
+                'results': results,
+            }, f, indent=2)
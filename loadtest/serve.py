@@ -0,0 +1,103 @@
+"""
+Starts video_service or statistics_service for a load test.
+
+The service runs with its settings_loadtest module (SQLite or a local Postgres), the local message broker
+(MESSAGING_BACKEND=local) and AUTH_SERVICE_URL pointing at loadtest.stub_auth. Tables are created
+on start; statistics_service can be seeded with completed results of one user to exercise large lists.
+Requests are served by the same threaded development server the Dockerfiles run.
+"""
+import argparse
+import logging
+import os
+import sys
+import uuid
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICES = {
+    'video': ('video_service', 'video_service.settings_loadtest'),
+    'statistics': ('statistics_service', 'statistics_service.settings_loadtest'),
+}
+
+# statistics_service settings require the connection variables even when SQLite is used
+STATISTICS_DB_DEFAULTS = {
+    'DATABASE_NAME': 'stats_db',
+    'DATABASE_USER': 'postgres',
+    'DATABASE_PASSWORD': 'postgres',
+    'DATABASE_HOST': 'localhost',
+    'DATABASE_PORT': '5434',
+}
+
+
+def setup(service):
+    directory, settings_module = SERVICES[service]
+    sys.path.insert(0, os.path.join(REPO_ROOT, directory))
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    if service == 'statistics':
+        for name, value in STATISTICS_DB_DEFAULTS.items():
+            os.environ.setdefault(name, value)
+
+    import django
+    django.setup()
+
+
+def migrate():
+    from django.core.management import call_command
+    # Apps without migrations (video_app) get their tables from the models
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def seed_results(user_id, count, report_size):
+    """Completed results of one user, all pointing at one report file of report_size bytes"""
+    from django.conf import settings
+    from traffic_app.models import VideoProcessingResult
+
+    reports_dir = os.path.join(settings.SHARED_STORAGE_PATH, 'reports')
+    os.makedirs(reports_dir, exist_ok=True)
+    report_path = os.path.join(reports_dir, f'loadtest_report_{user_id}.json')
+    with open(report_path, 'wb') as f:
+        f.write(b'[' + b' ' * max(report_size - 2, 0) + b']')
+
+    existing = VideoProcessingResult.objects.filter(user_id=user_id).count()
+    VideoProcessingResult.objects.bulk_create(
+        [
+            VideoProcessingResult(
+                task_id=uuid.uuid4(),
+                user_id=user_id,
+                status='completed',
+                report_path=report_path,
+                report_paths={'json': report_path},
+            )
+            for _ in range(max(count - existing, 0))
+        ],
+        batch_size=1000
+    )
+    logging.info(f'Seeded {max(count - existing, 0)} results for user {user_id}')
+
+
+def serve(host, port):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import run
+    # Request lines and per-request info logs are kept out of the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('django.server').setLevel(logging.WARNING)
+    logging.warning(f'Serving on http://{host}:{port}/')
+    run(host, port, WSGIHandler(), threading=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a service for load tests')
+    parser.add_argument('service', choices=list(SERVICES))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8102)
+    parser.add_argument('--seed-results', type=int, default=0, help='Completed results of --seed-user (statistics only)')
+    parser.add_argument('--seed-user', default='1')
+    parser.add_argument('--report-size', type=int, default=256 * 1024, help='Size of the seeded report file, bytes')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    setup(args.service)
+    migrate()
+    if args.seed_results and args.service == 'statistics':
+        seed_results(args.seed_user, args.seed_results, args.report_size)
+    serve(args.host, args.port)
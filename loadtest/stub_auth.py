@@ -0,0 +1,74 @@
+"""
+Stub of the auth service token check for load tests.
+
+Any token of the form ``user-<id>`` is valid for user <id>, everything else is rejected.
+Only ``POST /auth/validate-token/`` is served, with the same response shape as auth_service.
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_PREFIX = 'user-'
+
+
+def token_for(user_id):
+    return f'{TOKEN_PREFIX}{user_id}'
+
+
+class StubAuthHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/auth/validate-token':
+            self.send_json(404, {'error': 'Not found'})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            token = json.loads(self.rfile.read(length) or b'{}').get('token', '')
+        except json.JSONDecodeError:
+            self.send_json(400, {'valid': False, 'error': 'Invalid JSON'})
+            return
+
+        if token.startswith('Bearer '):
+            token = token[7:]
+        if not token.startswith(TOKEN_PREFIX) or not token[len(TOKEN_PREFIX):]:
+            self.send_json(200, {'valid': False, 'error': 'Invalid token'})
+            return
+
+        user_id = token[len(TOKEN_PREFIX):]
+        self.send_json(200, {
+            'valid': True,
+            'user_id': user_id,
+            'username': token,
+            'email': f'{token}@loadtest.local'
+        })
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # One line per request would dominate the run time of the stub
+        pass
+
+
+def serve(host='127.0.0.1', port=8101):
+    server = ThreadingHTTPServer((host, port), StubAuthHandler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub auth service for load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8101)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,111 @@
+import json
+from typing import Iterator
+
+import numpy as np
+
+from benchmarks.synthetic_video import SyntheticScene, CLASS_SIZES
+from data_loader.data_sector import DataSector
+
+Detections = tuple[np.ndarray, list[int], list[int]]|None
+
+
+def generated_detections(scene: SyntheticScene, tracks: int, frames: int, travel_frames: int = 100) -> Iterator[Detections]:
+    """
+    Детекции без видео: tracks ТС одновременно в кадре, поровну на все полосы всех секторов.
+    ТС пересекает кадр за travel_frames кадров, ушедшее ТС сразу сменяется новым (новый track_id)
+    """
+    lane_count = scene.sectors * scene.lanes
+    lanes = np.arange(tracks) % lane_count
+    centers_y = np.array([sum(scene.lane_band(lane // scene.lanes, lane % scene.lanes)) // 2 for lane in range(lane_count)])[lanes]
+    length, height = CLASS_SIZES["car"]
+    height = min(height, scene.lane_height - 4)
+    span = scene.width + length
+    step = span / travel_frames
+    # Сдвиг фаз: ТС одной полосы распределены по длине кадра
+    phases = (np.arange(tracks) // lane_count) * span / max(1, -(-tracks // lane_count))
+    classes = [index % len(scene.classes) for index in range(tracks)]
+
+    for frame in range(frames):
+        positions = phases + frame * step
+        cycles = (positions // span).astype(int)
+        right = positions % span
+        boxes = np.stack([right - length, centers_y - height / 2, right, centers_y + height / 2], axis=1)
+        track_ids = (cycles * tracks + np.arange(tracks) + 1).tolist()
+        yield boxes, track_ids, classes
+
+
+def load_detections(path: str) -> Iterator[Detections]:
+    # Записанные RecordingDetector детекции, по строке JSON на кадр
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line)
+            if item is None:
+                yield None
+            else:
+                yield np.array(item["boxes"], dtype=float), item["track_ids"], item["classes"]
+
+
+def scene_sectors(scene: SyntheticScene) -> list[DataSector]:
+    return sectors_from_json(scene.sector_json())
+
+
+def sectors_from_json(data: dict, scale: float = 1.0) -> list[DataSector]:
+    # Как DataConstructor: точки приводятся к разрешению, в котором записаны детекции
+    def adapt(points):
+        return (np.array(points) * scale).astype(int).tolist()
+
+    return [
+        DataSector(
+            sector["sector_id"],
+            adapt(sector["region_start"]["coords"]),
+            adapt(sector["region_end"]["coords"]),
+            [adapt(lane["coords"]) for lane in sector["lanes"]],
+            sector["lanes_count"],
+            sector["sector_length"],
+            sector["max_speed"],
+        )
+        for sector in data["sectors"]
+    ]
+
+
+class ReplayDetector:
+    """Выдаёт готовые детекции по кадру за вызов: учёт SectorManager замеряется без нейросети"""
+
+    def __init__(self, detections: Iterator[Detections], vehicle_classes: list[str]):
+        self.class_names = {index: name for index, name in enumerate(vehicle_classes)}
+        self.__detections = iter(detections)
+
+    def track(self, frame) -> Detections:
+        return next(self.__detections, None)
+
+    def reset_tracker(self):
+        pass
+
+
+class RecordingDetector:
+    """Обёртка детектора, записывающая его результаты для повторного прогона в ReplayDetector"""
+
+    def __init__(self, detector, path: str):
+        self.detector = detector
+        self.class_names = detector.class_names
+        self.__file = open(path, "w", encoding="utf-8")
+
+    def track(self, frame) -> Detections:
+        detections = self.detector.track(frame)
+        if detections is None:
+            item = None
+        else:
+            boxes, track_ids, classes = detections
+            item = {
+                "boxes": np.asarray(boxes, dtype=float).tolist(),
+                "track_ids": [int(track_id) for track_id in track_ids],
+                "classes": [int(track_class) for track_class in classes],
+            }
+        self.__file.write(json.dumps(item) + "\n")
+        return detections
+
+    def reset_tracker(self):
+        self.detector.reset_tracker()
+
+    def close(self):
+        self.__file.close()
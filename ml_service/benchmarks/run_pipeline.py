@@ -0,0 +1,171 @@
+"""
+Сквозной бенчмарк ML-конвейера на синтетическом видео.
+
+Генерирует видео с ТС-прямоугольниками на известных полосах и с известными скоростями, файл секторов
+и эталон, прогоняет main.py целиком (заглушка детектора или настоящая модель через --model) и выводит
+кадры в секунду по этапам и точность кол-ва ТС и времени проезда относительно эталона.
+Запуск из каталога ml_service, без сети и GPU:
+
+    python -m benchmarks.run_pipeline --duration 60 --lanes 3 --density 30
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from benchmarks.synthetic_video import SyntheticScene
+from benchmarks.stub_detector import StubDetector
+from benchmarks.detections import RecordingDetector
+from data_loader.data_constructor import Settings
+
+TRAVEL_TIME_COLUMN = "Среднее время проезда сек"
+
+
+def load_args():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк ML-конвейера на синтетическом видео")
+    parser.add_argument("--width", type=int, default=1280, help="Ширина видео")
+    parser.add_argument("--height", type=int, default=720, help="Высота видео")
+    parser.add_argument("--fps", type=float, default=25, help="Кадров в секунду")
+    parser.add_argument("--duration", type=float, default=60, help="Длительность видео. В секундах")
+    parser.add_argument("--sectors", type=int, default=1, help="Кол-во секторов")
+    parser.add_argument("--lanes", type=int, default=2, help="Кол-во полос в секторе")
+    parser.add_argument("--density", type=float, default=20, help="Поток на полосу, ТС в минуту")
+    parser.add_argument("--speed", type=float, default=40, help="Средняя скорость. В км/ч")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора ТС")
+    parser.add_argument("--pipeline", choices=["inline", "processes"], default="inline", help="Режим конвейера main.py")
+    parser.add_argument("--model", type=str, default=None, help="Путь к настоящей модели вместо заглушки (точность на синтетике не показательна)")
+    parser.add_argument("--workdir", type=str, default=None, help="Каталог для видео и отчётов (по умолчанию временный)")
+    parser.add_argument("--output", type=str, default=None, help="Путь для JSON с результатами бенчмарка")
+    parser.add_argument("--record-detections", type=str, default=None, help="Записать детекции для benchmarks.sector_manager_bench")
+    return parser.parse_args()
+
+
+def sector_accuracy(report: dict, truth: dict) -> dict:
+    # Кол-во ТС и среднее время проезда по сектору против эталона
+    settings = Settings()
+    accuracy = {}
+    for sector_id, expected in truth.items():
+        rows = report.get(str(sector_id), [])
+        counts = [sum(row.get(name) or 0 for name in settings.vehicle_classes) for row in rows]
+        measured = sum(counts)
+        weighted = [(row[TRAVEL_TIME_COLUMN], count) for row, count in zip(rows, counts) if row.get(TRAVEL_TIME_COLUMN) is not None]
+        mean_travel = sum(value * count for value, count in weighted) / sum(count for _, count in weighted) if weighted else None
+
+        result = {
+            "expected_count": expected["count"],
+            "measured_count": measured,
+            "expected_mean_travel_time": expected["mean_travel_time"],
+            "measured_mean_travel_time": mean_travel,
+        }
+        if mean_travel is not None and expected["mean_travel_time"]:
+            result["travel_time_error"] = (mean_travel - expected["mean_travel_time"]) / expected["mean_travel_time"]
+        accuracy[sector_id] = result
+    return accuracy
+
+
+def stage_fps(timings: dict) -> dict:
+    # Сколько кадров в секунду выдержал бы каждый этап сам по себе
+    return {
+        name: stage["count"] / stage["total"] if stage["total"] else None
+        for name, stage in timings["stages"].items()
+    }
+
+
+def run(args) -> dict:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ml_benchmark_")
+    os.makedirs(workdir, exist_ok=True)
+    paths = {name: os.path.join(workdir, name) for name in (
+        "input.mp4", "sectors.json", "output.mp4", "report.xlsx", "timings.json", "usage.json"
+    )}
+
+    settings = Settings()
+    scene = SyntheticScene(
+        width=args.width, height=args.height, fps=args.fps, duration=args.duration,
+        sectors=args.sectors, lanes=args.lanes, density=args.density, speed=args.speed,
+        classes=settings.vehicle_classes, seed=args.seed
+    )
+    truth = scene.write(paths["input.mp4"], paths["sectors.json"])
+    logging.warning(f"Синтетическое видео: {paths['input.mp4']}")
+
+    sys.argv = [
+        "main.py",
+        "--video-path", paths["input.mp4"],
+        "--model-path", args.model or "stub",
+        "--output-path", paths["output.mp4"],
+        "--report-path", paths["report.xlsx"],
+        "--report-formats", "json",
+        "--sector_path", paths["sectors.json"],
+        "--timings-path", paths["timings.json"],
+        "--usage-path", paths["usage.json"],
+        "--pipeline", args.pipeline,
+    ]
+
+    import main
+    # Логи по каждому кадру искажают замер
+    logging.getLogger().setLevel(logging.WARNING)
+    detector_factory = None
+    if args.model is None:
+        detector_factory = lambda imgsize, timings: StubDetector(settings.vehicle_classes, timings)
+
+    recorders = []
+    if args.record_detections:
+        def recording_factory(imgsize, timings, base_factory=detector_factory):
+            if base_factory is not None:
+                detector = base_factory(imgsize, timings)
+            else:
+                from ultralytics import YOLO
+                from traffic_observer.detector import Detector
+                detector = Detector(YOLO(args.model), imgsize, timings)
+            recorders.append(RecordingDetector(detector, args.record_detections))
+            return recorders[-1]
+        detector_factory = recording_factory
+
+    try:
+        main.main(detector_factory)
+    finally:
+        for recorder in recorders:
+            recorder.close()
+
+    with open(paths["timings.json"], encoding="utf-8") as f:
+        timings = json.load(f)
+    with open(paths["usage.json"], encoding="utf-8") as f:
+        usage = json.load(f)
+    with open(os.path.join(workdir, "report.json"), encoding="utf-8") as f:
+        report = json.load(f)
+
+    return {
+        "scene": vars(args),
+        "detector": "model" if args.model else "stub",
+        "usage": usage,
+        "stage_fps": stage_fps(timings),
+        "timings": timings["stages"],
+        "accuracy": sector_accuracy(report, truth),
+        "workdir": workdir,
+    }
+
+
+def print_result(result: dict):
+    usage = result["usage"]
+    print(f"Детектор: {result['detector']}, время: {usage['wall_time']:.2f} сек, "
+          f"FPS: {usage['effective_fps']:.1f}, к реальному времени: {usage['realtime_factor']:.2f}x")
+    print("Этап            кадр/сек    p50 мс    p95 мс")
+    for name, stage in result["timings"].items():
+        fps = result["stage_fps"][name]
+        print(f"{name:<14} {fps if fps is not None else float('nan'):>9.1f} {stage['p50'] * 1000:>9.2f} {stage['p95'] * 1000:>9.2f}")
+    print("Сектор  ТС эталон  ТС замер  время эталон  время замер")
+    for sector_id, item in result["accuracy"].items():
+        expected = item["expected_mean_travel_time"]
+        measured = item["measured_mean_travel_time"]
+        print(f"{sector_id:<7} {item['expected_count']:>9} {item['measured_count']:>9} "
+              f"{expected if expected is not None else float('nan'):>13.2f} {measured if measured is not None else float('nan'):>12.2f}")
+
+
+if __name__ == "__main__":
+    args = load_args()
+    result = run(args)
+    print_result(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,246 @@
+"""
+Микро-бенчмарк учёта SectorManager без нейросети.
+
+Готовые детекции (сгенерированные или записанные run_pipeline --record-detections) подаются прямо в
+SectorManager.update, замеряется время на кадр по этапам учёта (regions, annotation, lanes) и traffic_stats.
+Строятся кривые масштабирования: от числа треков в кадре, от числа секторов и от прошедшего времени
+периода (накопление counted_ids и ids_blacklist), для каждой кривой - показатель роста по log-log.
+С --baseline сравнивает с прошлым результатом и завершается с кодом 1 при замедлении больше --tolerance.
+Запуск из каталога ml_service:
+
+    python -m benchmarks.sector_manager_bench --output bench.json
+    python -m benchmarks.sector_manager_bench --baseline bench.json
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.detections import ReplayDetector, generated_detections, load_detections, scene_sectors, sectors_from_json
+from benchmarks.synthetic_video import SyntheticScene
+from data_loader.data_constructor import Settings
+from diagnostics.stage_timings import StageTimings
+from traffic_observer.sector_manager import SectorManager
+
+BOOKKEEPING_STAGES = ("regions", "annotation", "lanes")
+
+
+def parse_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def load_args():
+    parser = argparse.ArgumentParser(description="Микро-бенчмарк учёта SectorManager на готовых детекциях")
+    parser.add_argument("--tracks", type=parse_list, default=[10, 25, 50, 100, 200], help="Точки кривой по трекам в кадре")
+    parser.add_argument("--sectors", type=parse_list, default=[1, 2, 4, 8], help="Точки кривой по секторам")
+    parser.add_argument("--lanes", type=int, default=3, help="Полос в секторе")
+    parser.add_argument("--frames", type=int, default=500, help="Кадров на точку кривых по трекам и секторам")
+    parser.add_argument("--base-tracks", type=int, default=50, help="Треков в кадре для кривых по секторам и времени")
+    parser.add_argument("--period-frames", type=int, default=20000, help="Кадров в прогоне без закрытия периода")
+    parser.add_argument("--period-block", type=int, default=2000, help="Кадров в точке кривой по времени периода")
+    parser.add_argument("--fps", type=float, default=25, help="Кадров в секунду видео")
+    parser.add_argument("--travel-frames", type=int, default=100, help="За сколько кадров ТС пересекает кадр")
+    parser.add_argument("--detections", type=str, default=None, help="Записанные детекции вместо кривых (JSON по строке на кадр)")
+    parser.add_argument("--sector_path", type=str, default=None, help="Файл секторов записанных детекций")
+    parser.add_argument("--video-width", type=int, default=None, help="Ширина видео, к которому относится файл секторов (по умолчанию target-width)")
+    parser.add_argument("--output", type=str, default=None, help="Путь для JSON с результатами")
+    parser.add_argument("--baseline", type=str, default=None, help="Прошлый результат для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Допустимое замедление относительно --baseline (доля)")
+    args = parser.parse_args()
+    if args.detections and not args.sector_path:
+        parser.error("--detections requires --sector_path")
+    return args
+
+
+def make_manager(data_sectors, detections, fps: float, observation_time: float) -> SectorManager:
+    settings = Settings()
+    return SectorManager(
+        data_sectors,
+        settings.vehicle_classes,
+        1 / fps,
+        observation_time,
+        settings.vehicle_size_coeffs,
+        [settings.target_height, settings.target_width],
+        None,
+        timings=StageTimings(),
+        detector_factory=lambda imgsize, timings: ReplayDetector(detections, settings.vehicle_classes),
+    )
+
+
+def run_frames(sector_manager: SectorManager, frame: np.ndarray, frames: int) -> float:
+    # Среднее время update на кадр
+    start = time.perf_counter()
+    for _ in range(frames):
+        sector_manager.update(frame)
+    return (time.perf_counter() - start) / frames
+
+
+def stage_means(timings: StageTimings) -> dict[str, float]:
+    return {
+        name: timings.stages[name].total / timings.stages[name].count
+        for name in BOOKKEEPING_STAGES if name in timings.stages and timings.stages[name].count
+    }
+
+
+def measure_stats(sector_manager: SectorManager) -> float:
+    start = time.perf_counter()
+    sector_manager.close_period()
+    sector_manager.traffic_stats()
+    return time.perf_counter() - start
+
+
+def blank_frame(scene: SyntheticScene) -> np.ndarray:
+    return np.zeros((scene.height, scene.width, 3), dtype=np.uint8)
+
+
+def measure_point(scene: SyntheticScene, tracks: int, frames: int, fps: float, travel_frames: int) -> dict:
+    detections = generated_detections(scene, tracks, frames, travel_frames)
+    # Период длиннее прогона: учёт идёт на одном незакрытом периоде
+    sector_manager = make_manager(scene_sectors(scene), detections, fps, frames / fps + 1)
+    per_frame = run_frames(sector_manager, blank_frame(scene), frames)
+    return {
+        "tracks": tracks,
+        "sectors": scene.sectors,
+        "frame_time": per_frame,
+        "stages": stage_means(sector_manager.timings),
+        "traffic_stats_time": measure_stats(sector_manager),
+        "structures": sector_manager.structure_sizes(),
+    }
+
+
+def period_curve(scene: SyntheticScene, tracks: int, frames: int, block: int, fps: float, travel_frames: int) -> list[dict]:
+    # Один длинный незакрытый период: время на кадр по блокам кадров
+    detections = generated_detections(scene, tracks, frames, travel_frames)
+    sector_manager = make_manager(scene_sectors(scene), detections, fps, frames / fps + 1)
+    frame = blank_frame(scene)
+    points = []
+    for done in range(block, frames + 1, block):
+        per_frame = run_frames(sector_manager, frame, block)
+        points.append({
+            "elapsed": done / fps,
+            "frame_time": per_frame,
+            "structures": sector_manager.structure_sizes(),
+        })
+    return points
+
+
+def growth_exponent(xs: list[float], ys: list[float]) -> float|None:
+    # Наклон в log-log: ~1 - линейный рост, ~2 - квадратичный
+    if len(xs) < 2:
+        return None
+    return float(np.polyfit(np.log(xs), np.log(ys), 1)[0])
+
+
+def run_curves(args) -> dict:
+    classes = Settings().vehicle_classes
+
+    tracks_points = [
+        measure_point(SyntheticScene(lanes=args.lanes, classes=classes), tracks, args.frames, args.fps, args.travel_frames)
+        for tracks in args.tracks
+    ]
+    sectors_points = [
+        measure_point(SyntheticScene(sectors=sectors, lanes=args.lanes, classes=classes), args.base_tracks, args.frames, args.fps, args.travel_frames)
+        for sectors in args.sectors
+    ]
+    period_points = period_curve(
+        SyntheticScene(lanes=args.lanes, classes=classes), args.base_tracks,
+        args.period_frames, args.period_block, args.fps, args.travel_frames
+    )
+
+    # Время кадра после прогрева: рост от накопления, а не от первых кадров
+    period_growth = growth_exponent(
+        [point["elapsed"] for point in period_points[1:]],
+        [point["frame_time"] for point in period_points[1:]]
+    )
+    return {
+        "curves": {
+            "tracks": {
+                "points": tracks_points,
+                "growth": growth_exponent(args.tracks, [point["frame_time"] for point in tracks_points]),
+            },
+            "sectors": {
+                "points": sectors_points,
+                "growth": growth_exponent(args.sectors, [point["frame_time"] for point in sectors_points]),
+            },
+            "period": {
+                "points": period_points,
+                "growth": period_growth,
+            },
+        },
+    }
+
+
+def run_recorded(args) -> dict:
+    settings = Settings()
+    # Детекции записаны в разрешении нейросети, сектора - в разрешении видео
+    scale = settings.target_width / (args.video_width or settings.target_width)
+    with open(args.sector_path, encoding="utf-8") as f:
+        data_sectors = sectors_from_json(json.load(f), scale)
+    with open(args.detections, encoding="utf-8") as f:
+        frames = sum(1 for _ in f)
+
+    sector_manager = make_manager(data_sectors, load_detections(args.detections), args.fps, settings.observation_time)
+    frame = np.zeros((settings.target_height, settings.target_width, 3), dtype=np.uint8)
+    per_frame = run_frames(sector_manager, frame, frames)
+    return {
+        "recorded": {
+            "frames": frames,
+            "frame_time": per_frame,
+            "stages": stage_means(sector_manager.timings),
+            "traffic_stats_time": measure_stats(sector_manager),
+            "structures": sector_manager.structure_sizes(),
+        },
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    # Точки, ставшие медленнее базовых больше чем на tolerance
+    regressions = []
+    for name, curve in result.get("curves", {}).items():
+        base_points = baseline.get("curves", {}).get(name, {}).get("points", [])
+        for point, base in zip(curve["points"], base_points):
+            ratio = point["frame_time"] / base["frame_time"]
+            if ratio > 1 + tolerance:
+                label = {key: point[key] for key in ("tracks", "sectors", "elapsed") if key in point}
+                regressions.append(f"{name} {label}: {ratio:.2f}x")
+    if "recorded" in result and "recorded" in baseline:
+        ratio = result["recorded"]["frame_time"] / baseline["recorded"]["frame_time"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"recorded: {ratio:.2f}x")
+    return regressions
+
+
+def print_result(result: dict):
+    for name, curve in result.get("curves", {}).items():
+        growth = curve["growth"]
+        print(f"{name}: рост {growth:.2f}" if growth is not None else f"{name}:")
+        for point in curve["points"]:
+            label = ", ".join(f"{key}={point[key]}" for key in ("tracks", "sectors", "elapsed") if key in point)
+            stages = " ".join(f"{stage}={value * 1000:.3f}" for stage, value in point.get("stages", {}).items())
+            print(f"  {label}: {point['frame_time'] * 1000:.3f} мс/кадр {stages}")
+    if "recorded" in result:
+        recorded = result["recorded"]
+        print(f"recorded: {recorded['frames']} кадров, {recorded['frame_time'] * 1000:.3f} мс/кадр, "
+              f"traffic_stats {recorded['traffic_stats_time'] * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    args = load_args()
+    # Логи по каждому кадру искажают замер
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run_recorded(args) if args.detections else run_curves(args)
+    print_result(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Замедление: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,65 @@
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic_video import decode_color
+from diagnostics.stage_timings import StageTimings
+
+# Яркость, начиная с которой пиксель считается частью ТС (фон синтетического видео чёрный)
+FOREGROUND_THRESHOLD = 30
+
+
+class StubDetector:
+    """
+    Детерминированная замена YOLO для синтетического видео: ТС - закрашенные прямоугольники,
+    класс и слот читаются из цвета, трек - слот, пока ТС не пропадёт из кадра.
+    Интерфейс совпадает с Detector: track(frame), reset_tracker(), class_names
+    """
+
+    def __init__(self, vehicle_classes: list[str], timings: StageTimings|None = None):
+        self.class_names = {index: name for index, name in enumerate(vehicle_classes)}
+        self.timings = timings or StageTimings()
+        self.__slot_tracks: dict[int, int] = {}
+        self.__next_track_id = 1
+
+    def track(self, frame):
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, FOREGROUND_THRESHOLD, 1, cv2.THRESH_BINARY)
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=4)
+        detected = time.perf_counter()
+
+        boxes, track_ids, classes = [], [], []
+        seen = set()
+        for label in range(1, count):
+            x, y, width, height, area = stats[label]
+            # Края ТС после сжатия и масштабирования дают мелкие обрывки
+            if area < 50:
+                continue
+            cx, cy = (int(value) for value in centroids[label])
+            class_index, slot = decode_color(frame[cy, cx])
+            if slot in seen:
+                continue
+            seen.add(slot)
+
+            # Слот, пропавший из кадра, при следующем появлении - новое ТС
+            if slot not in self.__slot_tracks:
+                self.__slot_tracks[slot] = self.__next_track_id
+                self.__next_track_id += 1
+            boxes.append([x, y, x + width, y + height])
+            track_ids.append(self.__slot_tracks[slot])
+            classes.append(class_index)
+
+        for slot in list(self.__slot_tracks):
+            if slot not in seen:
+                del self.__slot_tracks[slot]
+
+        self.timings.add("inference", detected - start)
+        self.timings.add("tracking", time.perf_counter() - detected)
+        if not track_ids:
+            return None
+        return np.array(boxes, dtype=float), track_ids, classes
+
+    def reset_tracker(self):
+        self.__slot_tracks.clear()
@@ -0,0 +1,181 @@
+import json
+import random
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+# Цвет ТС кодирует его класс (синий канал) и слот (зелёный и красный каналы).
+# Уровни разнесены на 50, чтобы сжатие видео не путало соседние значения
+CHANNEL_LEVELS = (55, 105, 155, 205, 255)
+SLOTS = len(CHANNEL_LEVELS) ** 2
+# Размер ТС каждого класса в пикселях исходного видео (ширина по ходу движения, высота)
+CLASS_SIZES = {"bus": (110, 36), "car": (60, 30), "motobike": (32, 18), "road_train": (160, 38), "truck": (90, 36)}
+# Минимальный зазор между ТС одной полосы в пикселях: прямоугольники не сливаются в один
+MIN_GAP = 20
+# Слот освобождается не раньше, чем через это время после ухода ТС из кадра: трекер-заглушка не спутает ТС
+SLOT_REUSE_GAP = 1.0
+
+
+def vehicle_color(class_index: int, slot: int) -> tuple[int, int, int]:
+    # BGR
+    return CHANNEL_LEVELS[class_index], CHANNEL_LEVELS[slot // len(CHANNEL_LEVELS)], CHANNEL_LEVELS[slot % len(CHANNEL_LEVELS)]
+
+
+def decode_color(color) -> tuple[int, int]:
+    # Ближайшие уровни каналов -> (индекс класса, слот)
+    levels = np.array(CHANNEL_LEVELS)
+    blue, green, red = (int(np.abs(levels - value).argmin()) for value in color)
+    return blue, green * len(CHANNEL_LEVELS) + red
+
+
+@dataclass
+class SyntheticScene:
+    """Сцена: сектора с горизонтальными полосами, ТС едут слева направо с известной скоростью"""
+    width: int = 1280
+    height: int = 720
+    fps: float = 25
+    duration: float = 60
+    sectors: int = 1
+    lanes: int = 2
+    # Поток на полосу, ТС в минуту
+    density: float = 20
+    # Скорость, км/ч, и её разброс между ТС (доля)
+    speed: float = 40
+    speed_jitter: float = 0.2
+    meters_per_pixel: float = 0.1
+    classes: list[str] = field(default_factory=lambda: ["bus", "car", "motobike", "road_train", "truck"])
+    class_weights: list[float] = field(default_factory=lambda: [0.1, 0.7, 0.05, 0.05, 0.1])
+    seed: int = 0
+
+    @property
+    def lane_height(self) -> int:
+        return self.height // (self.sectors * self.lanes)
+
+    @property
+    def start_x(self) -> tuple[int, int]:
+        # Стартовая область сектора по горизонтали
+        return int(self.width * 0.2), int(self.width * 0.25)
+
+    @property
+    def end_x(self) -> tuple[int, int]:
+        # Полосы-финиши сектора по горизонтали
+        return int(self.width * 0.7), int(self.width * 0.75)
+
+    def lane_band(self, sector: int, lane: int) -> tuple[int, int]:
+        top = (sector * self.lanes + lane) * self.lane_height
+        return top, top + self.lane_height
+
+    def sector_json(self) -> dict:
+        # Формат файла секторов ML-сервиса (--sector_path)
+        sectors = []
+        for sector in range(self.sectors):
+            top, _ = self.lane_band(sector, 0)
+            _, bottom = self.lane_band(sector, self.lanes - 1)
+            x0, x1 = self.start_x
+            lanes = []
+            for lane in range(self.lanes):
+                lane_top, lane_bottom = self.lane_band(sector, lane)
+                lx0, lx1 = self.end_x
+                lanes.append({"coords": [[lx0, lane_top], [lx1, lane_top], [lx1, lane_bottom], [lx0, lane_bottom]]})
+            sectors.append({
+                "sector_id": sector + 1,
+                "region_start": {"coords": [[x0, top], [x1, top], [x1, bottom], [x0, bottom]]},
+                "region_end": {"coords": lanes[0]["coords"]},
+                "lanes": lanes,
+                "lanes_count": self.lanes,
+                # Путь центра ТС от входа в стартовую область до входа в полосу, км
+                "sector_length": (self.end_x[0] - self.start_x[0]) * self.meters_per_pixel / 1000,
+                "max_speed": self.speed,
+            })
+        return {"sectors": sectors}
+
+    def vehicles(self) -> list[dict]:
+        # Расписание ТС: появление у левого края, скорость в пикселях в секунду
+        rng = random.Random(self.seed)
+        vehicles = []
+        slot_free_at = [0.0] * SLOTS
+        for sector in range(self.sectors):
+            for lane in range(self.lanes):
+                top, bottom = self.lane_band(sector, lane)
+                t = rng.expovariate(self.density / 60)
+                leader = None
+                while t < self.duration:
+                    class_index = rng.choices(range(len(self.classes)), self.class_weights)[0]
+                    length, height = CLASS_SIZES.get(self.classes[class_index], (60, 30))
+                    speed = self.speed * (1 + rng.uniform(-self.speed_jitter, self.speed_jitter))
+                    pixels_per_second = speed / 3.6 / self.meters_per_pixel
+                    # Без обгонов и касаний: зазор с предыдущим ТС полосы сохраняется до его выхода из кадра
+                    if leader is not None:
+                        t = max(t, leader["appear"] + (leader["length"] + MIN_GAP) / leader["pixels_per_second"])
+                        leader_exit = leader["appear"] + (self.width + leader["length"]) / leader["pixels_per_second"]
+                        t = max(t, leader_exit - (self.width - MIN_GAP) / pixels_per_second)
+                    slot = min(range(SLOTS), key=lambda candidate: slot_free_at[candidate])
+                    t = max(t, slot_free_at[slot])
+                    if t >= self.duration:
+                        break
+
+                    exit_time = t + (self.width + length) / pixels_per_second
+                    slot_free_at[slot] = exit_time + SLOT_REUSE_GAP
+                    vehicles.append({
+                        "sector_id": sector + 1,
+                        "lane": lane,
+                        "class": self.classes[class_index],
+                        "class_index": class_index,
+                        "slot": slot,
+                        "appear": t,
+                        "pixels_per_second": pixels_per_second,
+                        "length": length,
+                        "height": min(height, bottom - top - 4),
+                        "center_y": (top + bottom) // 2,
+                        # Центр ТС проходит путь от стартовой области до полосы
+                        "travel_time": (self.end_x[0] - self.start_x[0]) / pixels_per_second,
+                        "start_time": t + (self.start_x[0] + length / 2) / pixels_per_second,
+                    })
+                    leader = vehicles[-1]
+                    t += rng.expovariate(self.density / 60)
+        return vehicles
+
+    def ground_truth(self, vehicles: list[dict]) -> dict:
+        # Ожидаемые кол-во и среднее время проезда по секторам (ТС, успевшие доехать до полосы)
+        truth = {}
+        for sector in range(1, self.sectors + 1):
+            passed = [
+                v for v in vehicles
+                if v["sector_id"] == sector and v["start_time"] + v["travel_time"] < self.duration
+            ]
+            truth[sector] = {
+                "count": len(passed),
+                "mean_travel_time": float(np.mean([v["travel_time"] for v in passed])) if passed else None,
+            }
+        return truth
+
+    def render(self, video_path: str, vehicles: list[dict]):
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (self.width, self.height))
+        frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        try:
+            for index in range(int(self.duration * self.fps)):
+                t = index / self.fps
+                frame[:] = 0
+                for v in vehicles:
+                    if v["appear"] > t:
+                        continue
+                    left = int((t - v["appear"]) * v["pixels_per_second"] - v["length"])
+                    if left > self.width:
+                        continue
+                    top = v["center_y"] - v["height"] // 2
+                    cv2.rectangle(
+                        frame, (left, top), (left + v["length"], top + v["height"]),
+                        vehicle_color(v["class_index"], v["slot"]), thickness=-1
+                    )
+                writer.write(frame)
+        finally:
+            writer.release()
+
+    def write(self, video_path: str, sector_path: str) -> dict:
+        # Видео, файл секторов и эталон для сравнения
+        vehicles = self.vehicles()
+        self.render(video_path, vehicles)
+        with open(sector_path, "w", encoding="utf-8") as f:
+            json.dump(self.sector_json(), f)
+        return self.ground_truth(vehicles)
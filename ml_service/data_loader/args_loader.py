@@ -1,5 +1,8 @@
 import argparse
 
+from data_manager.report_writers import REPORT_WRITERS
+from diagnostics.cpu_profile import PROFILE_MODES
+
 def load_args():
     # Добавление аргументов запуска
     parser = argparse.ArgumentParser()
@@ -7,16 +10,51 @@ def load_args():
     parser.add_argument("--model-path", type=str, required=True, help="Путь к модельке")
     parser.add_argument("--output-path", type=str, required=True, help="Путь для выходного файлы")
     parser.add_argument("--report-path", type=str, required=True, help="Путь для выходного отчета")
+    parser.add_argument("--report-formats", type=str, default=None, help="Форматы отчёта через запятую: xlsx, csv, json, parquet (по умолчанию из настроек)")
+    parser.add_argument("--buckets-path", type=str, default=None, help="Путь для CSV с корзинами статистики (необязательно)")
+    parser.add_argument("--timings-path", type=str, default=None, help="Путь для JSON со временем этапов обработки (необязательно)")
+    parser.add_argument("--usage-path", type=str, default=None, help="Путь для JSON с расходом ресурсов задачи (необязательно)")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=None, help="Профилировать обработку: sampling - выборка стеков, cprofile - каждый вызов")
+    parser.add_argument("--profile-path", type=str, default=None, help="Путь без расширения для файлов профиля")
+    parser.add_argument("--memory-profile-path", type=str, default=None, help="Путь для JSON с динамикой памяти по ходу обработки (необязательно)")
+    parser.add_argument("--memory-interval", type=float, default=30, help="Интервал снимков памяти. В секундах")
+    parser.add_argument("--task-id", type=str, default=None, help="Идентификатор задачи. Если задан, показатели периодов публикуются в Kafka")
     parser.add_argument("--sector_path", type=str, required=True, help="Массив точек областей")
+    parser.add_argument("--start", type=float, default=None, help="Начало обрабатываемого отрезка видео. В секундах")
+    parser.add_argument("--end", type=float, default=None, help="Конец обрабатываемого отрезка видео. В секундах")
+    parser.add_argument("--sample-duration", type=float, default=None, help="Длительность выборочного замера. В секундах")
+    parser.add_argument("--preview", action="store_true", help="Быстрый предварительный проход: низкое разрешение и шаг по кадрам, без выходного видео")
+    parser.add_argument("--pipeline", choices=["inline", "processes"], default="inline", help="inline - всё в одном процессе, processes - декодирование и запись в отдельных процессах через общую память")
+    parser.add_argument("--show", action="store_true", help="Показывать обрабатываемые кадры в окне")
+    parser.add_argument("--sample-interval", type=float, default=None, help="Период повторения выборочных замеров. В секундах")
 
     # Получение всех аргументов
     args = parser.parse_args()
 
-    # Доступ к аргументам
-    video_path = args.video_path
-    model_path = args.model_path
-    output_path = args.output_path
-    report_path = args.report_path
-    sector_path = args.sector_path
-    
-    return video_path, model_path, output_path, report_path, sector_path
\ No newline at end of file
+    # Проверка отрезка времени
+    if args.start is not None and args.start < 0:
+        parser.error("--start не может быть отрицательным")
+    if args.end is not None and args.end <= (args.start or 0):
+        parser.error("--end должен быть больше --start")
+
+    # Проверка форматов отчёта
+    if args.report_formats is not None:
+        args.report_formats = [name.strip() for name in args.report_formats.split(",") if name.strip()]
+        unknown = set(args.report_formats) - set(REPORT_WRITERS)
+        if not args.report_formats or unknown:
+            parser.error(f"--report-formats: допустимы {', '.join(REPORT_WRITERS)}")
+
+    # Проверка профилирования
+    if args.profile is not None and args.profile_path is None:
+        parser.error("--profile требует --profile-path")
+
+    if args.memory_interval <= 0:
+        parser.error("--memory-interval должен быть больше 0")
+
+    # Проверка расписания выборочных замеров
+    if (args.sample_duration is None) != (args.sample_interval is None):
+        parser.error("--sample-duration и --sample-interval задаются вместе")
+    if args.sample_duration is not None and not 0 < args.sample_duration <= args.sample_interval:
+        parser.error("--sample-duration должен быть больше 0 и не больше --sample-interval")
+
+    return args
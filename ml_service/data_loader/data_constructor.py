@@ -5,9 +5,17 @@ import numpy as np
 import json
 
 from data_loader.args_loader import load_args
-from data_loader.video_loader import open_video
+from data_loader.video_loader import open_video, seek_video
+from data_loader.input_error import InputError
 from data_loader.data_sector import DataSector
+from data_loader.sampling_schedule import SamplingSchedule
+from data_loader.frame_source import VideoFrameSource
+from data_loader.shared_frames import SharedMemoryFrameSource
 from traffic_observer.sector_manager import SectorManager
+from data_manager.period_events import PeriodEventPublisher
+from diagnostics.stage_timings import StageTimings
+from diagnostics.memory_profile import MemoryProfiler
+from diagnostics.resource_usage import ResourceUsage
 
 class Settings:
     def __init__(self):
@@ -20,61 +28,210 @@ class Settings:
         self.target_height = toml_settings["target-height"]
         self.vehicle_classes = toml_settings["vehicle-classes"]
         self.vehicle_size_coeffs = toml_settings["vehicle-size-coeffs"]
+        self.preview_width = toml_settings["preview-width"]
+        self.preview_height = toml_settings["preview-height"]
+        self.preview_stride = toml_settings["preview-stride"]
+        self.shared_frame_slots = toml_settings["shared-frame-slots"]
+        self.keep_vehicle_times = toml_settings["keep-vehicle-times"]
+        self.bucket_time = toml_settings["bucket-time"]
+        self.report_windows = toml_settings["report-windows"]
+        self.period_events_topic = toml_settings["period-events-topic"]
+        self.report_formats = toml_settings["report-formats"]
 
 class DataConstructor:
     def __init__(self):
-        video_path, model_path, output_path, report_path, sector_path = load_args()
-        self.__video_path = video_path
-        self.__model_path = model_path
-        self.__output_path = output_path
-        self.__report_path = report_path
-        self.__sector_path = sector_path
+        # Учёт ресурсов с самого начала задачи, включая загрузку модели
+        self.usage = ResourceUsage()
+        args = load_args()
+        self.__video_path = args.video_path
+        self.__model_path = args.model_path
+        self.__output_path = args.output_path
+        self.__report_path = args.report_path
+        self.__buckets_path = args.buckets_path
+        self.__task_id = args.task_id
+        self.__report_formats = args.report_formats
+        self.__timings_path = args.timings_path
+        self.__memory_profile_path = args.memory_profile_path
+        self.__memory_interval = args.memory_interval
+        self.__usage_path = args.usage_path
+        self.__sector_path = args.sector_path
+        self.__start_time = args.start or 0
+        self.__end_time = args.end
+        self.__sampling_schedule = SamplingSchedule(args.sample_duration, args.sample_interval)
+        self.__preview = args.preview
+        self.__pipeline = args.pipeline
+        self.__show = args.show
         self.settings = Settings()
+        # Общий накопитель времени этапов для источника кадров и менеджера секторов
+        self.timings = StageTimings()
 
-    def get_video(self) -> tuple[cv2.VideoCapture, cv2.VideoWriter]:
+    def get_video(self) -> tuple[cv2.VideoCapture, cv2.VideoWriter|None]:
         cap, fps = open_video(self.__video_path)
+        if self.__start_time > 0:
+            # Перематываем сразу к началу отрезка, не декодируя предшествующие кадры
+            self.__start_time = seek_video(cap, self.__start_time)
+
+        if not self.saves_output_video():
+            return cap, None
+
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         output = cv2.VideoWriter(self.__output_path, fourcc, fps, (self.settings.target_width, self.settings.target_height))
         return cap, output
     
-    def get_sector_manager(self):
+    def get_frame_source(self) -> VideoFrameSource|SharedMemoryFrameSource:
+        size = (self.settings.target_width, self.settings.target_height)
+
+        if self.__pipeline == "processes":
+            # Декодирование и запись в отдельных процессах, кадры в общей памяти
+            temp_cap, fps = open_video(self.__video_path)
+            temp_cap.release()
+            return SharedMemoryFrameSource(
+                self.__video_path,
+                self.__sampling_schedule,
+                self.__start_time,
+                self.__end_time,
+                size,
+                self.get_frame_stride(),
+                self.__output_path if self.saves_output_video() else None,
+                fps,
+                self.settings.shared_frame_slots,
+                self.timings
+            )
+
+        cap, output = self.get_video()
+        spans = self.__sampling_schedule.spans(self.__start_time, self.__end_time)
+        return VideoFrameSource(cap, output, spans, size, self.get_frame_stride(), self.timings)
+
+    def get_sector_manager(self, detector_factory=None):
         temp_cap, fps = open_video(self.__video_path)
         video_width = int(temp_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         data_sectors = self.__load_sectors()
         adapted_data_sectors = self.__adapt_sectors_points(data_sectors, video_width, self.settings.target_width)
 
         temp_cap.release()
+
+        # При выборочных замерах каждый замер - отдельный период
+        observation_time = self.settings.observation_time
+        if self.__sampling_schedule.enabled:
+            observation_time = self.__sampling_schedule.duration
+            logging.info(f"Выборочные замеры: время наблюдения равно длительности замера {observation_time} сек")
+
+        # Предварительный проход: нейросеть работает в низком разрешении и видит каждый stride-й кадр
+        imgsize = [self.settings.target_height, self.settings.target_width]
+        if self.__preview:
+            imgsize = [self.settings.preview_height, self.settings.preview_width]
+            logging.info(f"Предварительный проход: разрешение {imgsize}, шаг {self.get_frame_stride()} кадров")
+
         return SectorManager(
             adapted_data_sectors,
             self.settings.vehicle_classes,
-            1/fps,
-            self.settings.observation_time,
+            self.get_frame_stride()/fps,
+            observation_time,
             self.settings.vehicle_size_coeffs,
-            [self.settings.target_height, self.settings.target_width],
-            self.__model_path
+            imgsize,
+            self.__model_path,
+            self.__start_time,
+            self.settings.keep_vehicle_times,
+            self.settings.bucket_time,
+            self.timings,
+            detector_factory
         )
     
+    def get_total_frames(self) -> int|None:
+        # Сколько кадров пройдёт через детектор: отрезки расписания внутри окна, с учётом шага кадров.
+        # None - длительность видео неизвестна (поток или повреждённый заголовок)
+        temp_cap, fps = open_video(self.__video_path)
+        frame_count = temp_cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        temp_cap.release()
+        if fps <= 0 or frame_count <= 0:
+            return None
+
+        duration = frame_count / fps
+        end = duration if self.__end_time is None else min(self.__end_time, duration)
+        measured = sum(span_end - span_start for span_start, span_end in self.__sampling_schedule.spans(self.__start_time, end))
+        return max(round(measured * fps / self.get_frame_stride()), 0)
+
     def get_output_paths(self) -> tuple[str, str]:
         return self.__report_path, self.__output_path
 
+    def get_period_publisher(self, sector_manager: SectorManager) -> PeriodEventPublisher|None:
+        # Публикация периодов нужна только для задач сервиса
+        if self.__task_id is None:
+            return None
+        return PeriodEventPublisher(sector_manager, self.__task_id, self.settings.period_events_topic, self.__preview)
+
+    def get_report_formats(self) -> list[str]:
+        return self.__report_formats or self.settings.report_formats
+
+    def get_memory_profiler(self, sector_manager: SectorManager) -> MemoryProfiler|None:
+        # Снимки памяти только по запросу: tracemalloc заметно замедляет обработку
+        if self.__memory_profile_path is None:
+            return None
+        return MemoryProfiler(self.__memory_profile_path, self.__memory_interval, probe=sector_manager.structure_sizes)
+
+    def write_timings(self):
+        # Время этапов обработки пишется только по запросу
+        if self.__timings_path is None:
+            return
+        self.timings.write(
+            self.__timings_path,
+            pipeline=self.__pipeline,
+            preview=self.__preview,
+            frame_stride=self.get_frame_stride()
+        )
+        logging.info(f"Время этапов обработки сохранено в {self.__timings_path}")
+
+    def write_usage(self, measured_spans: list[tuple[float, float]]):
+        # Расход ресурсов пишется только по запросу
+        if self.__usage_path is None:
+            return
+        self.usage.write(self.__usage_path, self.timings, measured_spans)
+
+    def get_buckets_path(self) -> str|None:
+        # Файл с корзинами статистики для построения окон вне ML-сервиса
+        return self.__buckets_path
+
+    def get_time_window(self) -> tuple[float, float|None]:
+        # Отрезок видео для обработки. None - до конца видео
+        return self.__start_time, self.__end_time
+
+    def get_sampling_schedule(self) -> SamplingSchedule:
+        return self.__sampling_schedule
+
+    def saves_output_video(self) -> bool:
+        # Предварительный проход не сохраняет видео
+        return not self.__preview
+
+    def show_frames(self) -> bool:
+        # Показ кадров в окне (недоступно в headless-сборке OpenCV)
+        return self.__show
+
+    def get_frame_stride(self) -> int:
+        # Каждый какой кадр обрабатывается
+        return self.settings.preview_stride if self.__preview else 1
+
     def __load_sectors(self) -> list[DataSector]:
-        with open(self.__sector_path, "r", encoding="utf-8") as file:
-            data = json.load(file)  
-
-        sectors = []
-        for sector in data["sectors"]:
-            sector_id = sector["sector_id"]
-            start_points = sector["region_start"]["coords"]
-            end_points = sector["region_end"]["coords"]
-            lanes_points = [lane["coords"] for lane in sector["lanes"]]
-            lanes_count = sector["lanes_count"]
-            sector_length = sector["sector_length"]
-            max_speed = sector["max_speed"]
-            
-            # Creating Sector object
-            sector_object = DataSector(sector_id, start_points, end_points, lanes_points, lanes_count, sector_length, max_speed)
-            sectors.append(sector_object)
-        
+        try:
+            with open(self.__sector_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+
+            sectors = []
+            for sector in data["sectors"]:
+                sector_id = sector["sector_id"]
+                start_points = sector["region_start"]["coords"]
+                end_points = sector["region_end"]["coords"]
+                lanes_points = [lane["coords"] for lane in sector["lanes"]]
+                lanes_count = sector["lanes_count"]
+                sector_length = sector["sector_length"]
+                max_speed = sector["max_speed"]
+
+                # Creating Sector object
+                sector_object = DataSector(sector_id, start_points, end_points, lanes_points, lanes_count, sector_length, max_speed)
+                sectors.append(sector_object)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Нет файла, не JSON или не хватает полей: задача непригодна
+            raise InputError(f"Файл секторов {self.__sector_path} непригоден: {e!r}") from e
+
         return sectors
     
     def __adapt_sectors_points(self, data_sectors: list[DataSector], video_width, required_width) -> list[DataSector]:
@@ -0,0 +1,82 @@
+import cv2
+import time
+from typing import Iterable, Iterator
+
+from data_loader.video_loader import get_position, seek_video
+from diagnostics.stage_timings import StageTimings
+
+# События источника кадров
+SPAN_START = "span_start"
+FRAME = "frame"
+SPAN_END = "span_end"
+
+
+def iter_spans(cap: cv2.VideoCapture, spans: Iterable[tuple[float, float|None]], stride: int = 1, timings: StageTimings|None = None) -> Iterator[tuple]:
+    # Декодирует только заданные отрезки видео, каждый stride-й кадр.
+    # События: (SPAN_START, начало отрезка), (FRAME, кадр, время кадра), (SPAN_END, None)
+    timings = timings or StageTimings()
+    for index, (span_start, span_end) in enumerate(spans):
+        # Первый отрезок уже выставлен при открытии видео, к остальным перематываем
+        if index > 0:
+            span_start = seek_video(cap, span_start)
+        yield SPAN_START, span_start
+
+        finished = False
+        # Время пропуска кадров относится к декодированию следующего кадра
+        skipped = 0.0
+        while cap.isOpened():
+            decode_start = time.perf_counter()
+            ret, frame = cap.read()
+            timings.add("decode", time.perf_counter() - decode_start + skipped)
+            if not ret:
+                finished = True
+                break
+            position = get_position(cap)
+            # Конец отрезка: дальше видео не декодируем
+            if span_end is not None and position >= span_end:
+                break
+
+            yield FRAME, frame, position
+
+            # Пропуск кадров без преобразования в изображение
+            skip_start = time.perf_counter()
+            for _ in range(stride - 1):
+                cap.grab()
+            skipped = time.perf_counter() - skip_start
+
+        yield SPAN_END, None
+        if finished:
+            return
+
+
+class VideoFrameSource:
+    # Декодирование и запись видео в том же процессе, что и обработка
+    def __init__(self, cap: cv2.VideoCapture, output: cv2.VideoWriter|None, spans, size: tuple[int, int], stride: int = 1,
+                 timings: StageTimings|None = None):
+        self.cap = cap
+        self.timings = timings or StageTimings()
+        self.output = output
+        self.spans = spans
+        self.size = size
+        self.stride = stride
+
+    def __iter__(self):
+        for event in iter_spans(self.cap, self.spans, self.stride, self.timings):
+            if event[0] == FRAME:
+                _, frame, position = event
+                with self.timings.stage("resize"):
+                    frame = cv2.resize(frame, self.size)
+                yield FRAME, frame, position
+            else:
+                yield event
+
+    def submit(self, frame):
+        # Обработанный кадр уходит в выходное видео
+        if self.output is not None:
+            with self.timings.stage("encode"):
+                self.output.write(frame)
+
+    def close(self):
+        self.cap.release()
+        if self.output is not None:
+            self.output.release()
@@ -0,0 +1,9 @@
+# Коды выхода main.py, по которым wrapper.py отличает непригодную задачу от сбоя, который стоит повторить
+EXIT_USAGE_ERROR = 2  # неверные аргументы (argparse)
+EXIT_INPUT_ERROR = 3  # видео не открывается или файл секторов повреждён
+
+PERMANENT_EXIT_CODES = (EXIT_USAGE_ERROR, EXIT_INPUT_ERROR)
+
+
+class InputError(Exception):
+    """Входные данные задачи непригодны для обработки: повтор задачи с теми же данными не поможет"""
@@ -0,0 +1,29 @@
+from typing import Iterator
+
+Secs = float
+
+
+class SamplingSchedule:
+    # Расписание выборочных замеров: duration секунд из каждых interval секунд.
+    # Без параметров обрабатывается весь отрезок целиком
+    def __init__(self, duration: Secs|None = None, interval: Secs|None = None):
+        self.duration = duration
+        self.interval = interval
+
+    @property
+    def enabled(self) -> bool:
+        return self.duration is not None and self.interval is not None
+
+    def spans(self, start: Secs, end: Secs|None) -> Iterator[tuple[Secs, Secs|None]]:
+        # Отрезки видео для замера. end=None - до конца видео, вызывающий код сам прекращает перебор
+        if not self.enabled:
+            yield start, end
+            return
+
+        span_start = start
+        while end is None or span_start < end:
+            span_end = span_start + self.duration
+            if end is not None:
+                span_end = min(span_end, end)
+            yield span_start, span_end
+            span_start += self.interval
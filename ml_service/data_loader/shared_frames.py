@@ -0,0 +1,163 @@
+import cv2
+import logging
+import multiprocessing as mp
+import queue
+import time
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+
+from data_loader.frame_source import iter_spans, FRAME
+from data_loader.sampling_schedule import SamplingSchedule
+from data_loader.video_loader import open_video, seek_video
+from diagnostics.stage_timings import StageTimings
+
+DONE = "done"
+
+
+class FrameRing:
+    # Кольцо заранее выделенных кадров в общей памяти.
+    # Между процессами передаются только индексы слотов, сами кадры не копируются
+    def __init__(self, slots: int, shape: tuple[int, int, int], name: str|None = None):
+        self.slots = slots
+        self.shape = shape
+        frame_bytes = int(np.prod(shape))
+        if name is None:
+            self.shm = SharedMemory(create=True, size=slots * frame_bytes)
+        else:
+            # Дочерние процессы делят resource_tracker с родителем: его регистрация удалит сегмент,
+            # даже если main.py упадёт или будет остановлен, не дойдя до unlink
+            self.shm = SharedMemory(name=name)
+        self.frames = np.ndarray((slots, *shape), dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def frame(self, slot: int) -> np.ndarray:
+        return self.frames[slot]
+
+    def close(self):
+        self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Снаружи ещё есть ссылки на кадры, буфер освободится вместе с ними
+            pass
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _decode_worker(video_path, schedule, start, end, size, stride, ring_name, slots, free_slots, decoded):
+    ring = FrameRing(slots, (size[1], size[0], 3), ring_name)
+    cap, _ = open_video(video_path)
+    if start > 0:
+        start = seek_video(cap, start)
+
+    for event in iter_spans(cap, schedule.spans(start, end), stride):
+        if event[0] == FRAME:
+            _, frame, position = event
+            slot = free_slots.get()
+            # Масштабирование сразу в общий буфер
+            cv2.resize(frame, size, dst=ring.frame(slot))
+            decoded.put((FRAME, slot, position))
+        else:
+            decoded.put(event)
+
+    decoded.put((DONE,))
+    cap.release()
+    ring.close()
+
+
+def _encode_worker(output_path, fps, size, ring_name, slots, encoded, free_slots):
+    ring = FrameRing(slots, (size[1], size[0], 3), ring_name)
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    output = cv2.VideoWriter(output_path, fourcc, fps, size)
+
+    while (slot := encoded.get()) is not None:
+        output.write(ring.frame(slot))
+        free_slots.put(slot)
+
+    output.release()
+    ring.close()
+
+
+class SharedMemoryFrameSource:
+    # Декодирование, обработка и запись видео в отдельных процессах.
+    # Кадры лежат в кольце общей памяти, через очереди передаются индексы слотов
+    def __init__(self, video_path: str, schedule: SamplingSchedule, start: float, end: float|None,
+                 size: tuple[int, int], stride: int, output_path: str|None, fps: float, slots: int,
+                 timings: StageTimings|None = None):
+        # Декодирование и запись идут в других процессах: здесь замеряется ожидание кадра и передача слота
+        self.timings = timings or StageTimings()
+        ctx = mp.get_context("spawn")
+        self.ring = FrameRing(slots, (size[1], size[0], 3))
+        self.free_slots = ctx.Queue()
+        self.decoded = ctx.Queue()
+        self.encoded = ctx.Queue() if output_path is not None else None
+        for slot in range(slots):
+            self.free_slots.put(slot)
+
+        self.decoder = ctx.Process(
+            target=_decode_worker,
+            args=(video_path, schedule, start, end, size, stride, self.ring.name, slots, self.free_slots, self.decoded),
+            daemon=True
+        )
+        self.encoder = None
+        if output_path is not None:
+            self.encoder = ctx.Process(
+                target=_encode_worker,
+                args=(output_path, fps, size, self.ring.name, slots, self.encoded, self.free_slots),
+                daemon=True
+            )
+
+        self.decoder.start()
+        if self.encoder is not None:
+            self.encoder.start()
+        self.__slot = None
+        self.__done = False
+        logging.info(f"Запущены процессы декодирования и записи, слотов в общей памяти: {slots}")
+
+    def __next_event(self):
+        while True:
+            try:
+                return self.decoded.get(timeout=1)
+            except queue.Empty:
+                if not self.decoder.is_alive():
+                    raise RuntimeError(f"Процесс декодирования завершился с кодом {self.decoder.exitcode}")
+
+    def __iter__(self):
+        while True:
+            wait_start = time.perf_counter()
+            event = self.__next_event()
+            if event[0] == DONE:
+                self.__done = True
+                return
+            if event[0] == FRAME:
+                self.timings.add("decode", time.perf_counter() - wait_start)
+                _, self.__slot, position = event
+                yield FRAME, self.ring.frame(self.__slot), position
+            else:
+                yield event
+
+    def submit(self, frame):
+        # Кадр обработан на месте в общей памяти: передаём слот на запись или освобождаем
+        if self.encoded is not None:
+            with self.timings.stage("encode"):
+                self.encoded.put(self.__slot)
+        else:
+            self.free_slots.put(self.__slot)
+        self.__slot = None
+
+    def close(self):
+        if not self.__done:
+            # Обработка прервана: дальше декодировать незачем
+            self.decoder.terminate()
+        self.decoder.join()
+
+        if self.encoder is not None:
+            self.encoded.put(None)
+            self.encoder.join()
+
+        self.ring.close()
+        self.ring.unlink()
@@ -1,6 +1,8 @@
 import cv2
 import logging
 
+from data_loader.input_error import InputError
+
 def get_fps(cap) -> float|int:
     major_ver, _, _ = cv2.__version__.split('.')
     if int(major_ver) >= 3:
@@ -11,8 +13,8 @@ def open_video(video_path: str):
     cap = cv2.VideoCapture(video_path)
 
     if not cap.isOpened():
-        logging.error(f"Не удалось открыть видеофайл {video_path}")
-        quit()
+        # quit() завершал процесс с кодом 0, и задача с битым видео считалась выполненной
+        raise InputError(f"Не удалось открыть видеофайл {video_path}")
     else:
         logging.info(f"Видеофайл открыт успешно: {video_path}")
         fps = get_fps(cap)
@@ -21,4 +23,15 @@ def open_video(video_path: str):
         else:
             logging.warning("Частота кадров не может быть определена.")
 
-    return cap, fps
\ No newline at end of file
+    return cap, fps
+
+def seek_video(cap, time: float) -> float:
+    # Перемотка к ключевому кадру перед time и декодирование только до нужного кадра
+    cap.set(cv2.CAP_PROP_POS_MSEC, time * 1000)
+    position = get_position(cap)
+    logging.info(f"Видео перемотано к {position:.2f} сек")
+    return position
+
+def get_position(cap) -> float:
+    # Время последнего прочитанного кадра. В секундах
+    return cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
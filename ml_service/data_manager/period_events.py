@@ -0,0 +1,70 @@
+import json
+import logging
+import math
+
+from traffic_observer.period import Period
+from traffic_observer.sector_manager import SectorManager
+from data_manager.stats_engine import PERCENTILES
+
+# Столбцы отчёта, попадающие в событие периода
+EVENT_COLUMNS = {
+    "intensity": "Интенсивность траффика",
+    "mean_travel_time": "Среднее время проезда сек",
+    "mean_speed": "Средняя скорость движения км/ч",
+    **{f"speed_p{p}": f"Скорость p{p} км/ч" for p in PERCENTILES},
+    "density": "Плотность траффика",
+    "mean_delay": "Средняя задержка сек",
+    "time_index": "Временной индекс",
+}
+
+
+def json_number(value) -> float|None:
+    # NaN и бесконечности не сериализуются в JSON, периоды без ТС дают null
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def period_events(sector_manager: SectorManager, periods: list[Period]) -> list[dict]:
+    # Компактные события закрытого периода: по одному на сектор
+    events = []
+    for sector, period, stats in zip(sector_manager.sectors, periods, sector_manager.period_stats(periods)):
+        row = stats.iloc[0]
+        event = {
+            "sector_id": sector.id,
+            "period_index": len(sector.periods_data) - 1,
+            "start_time": period.start_time,
+            "end_time": period.start_time + period.observation_time,
+            "observation_time": period.observation_time,
+        }
+        event.update({key: json_number(row[column]) for key, column in EVENT_COLUMNS.items()})
+        event["class_counts"] = {name: int(count) for name, count in period.classwise_traveled_count.items()}
+        events.append(event)
+    return events
+
+
+class PeriodEventPublisher:
+    """Публикует показатели каждого закрытого периода в Kafka (или локальный брокер) по мере обработки видео"""
+
+    def __init__(self, sector_manager: SectorManager, task_id: str, topic: str, preliminary: bool = False):
+        # Kafka нужна только при запуске из сервиса, локальный запуск обходится без неё
+        from messaging import create_producer
+
+        self.sector_manager = sector_manager
+        self.task_id = task_id
+        self.topic = topic
+        self.preliminary = preliminary
+        self.producer = create_producer(value_serializer=lambda v: json.dumps(v).encode("utf-8"))
+
+    def __call__(self, periods: list[Period]):
+        # Отправка асинхронная: цикл обработки кадров не ждёт брокер
+        for event in period_events(self.sector_manager, periods):
+            event["task_id"] = self.task_id
+            event["preliminary"] = self.preliminary
+            self.producer.send(self.topic, event)
+        logging.info(f"Опубликованы показатели периода в {self.topic}")
+
+    def close(self):
+        try:
+            self.producer.flush()
+        finally:
+            self.producer.close()
@@ -0,0 +1,103 @@
+import io
+import json
+import math
+import os
+import re
+import zipfile
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# Лист отчёта: имя и таблица. Один и тот же набор листов пишется во все форматы
+Sheet = tuple[str, pd.DataFrame]
+
+
+def plain_value(value):
+    # Значение ячейки без типов numpy, пропуски - None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+# Символы, запрещённые Excel в имени листа; имя сектора приходит от пользователя
+SHEET_NAME_FORBIDDEN = re.compile(r"[\[\]:*?/\\]")
+
+
+def sheet_name(name: str) -> str:
+    # Имя листа, которое примет Excel: без запрещённых символов и не длиннее 31 символа
+    return SHEET_NAME_FORBIDDEN.sub("", name).strip()[:31] or "Лист"
+
+
+def write_xlsx(sheets: list[Sheet], path: str):
+    # xlsxwriter в режиме constant_memory сбрасывает каждую строку на диск сразу после записи,
+    # поэтому строки пишутся строго по порядку, а память не зависит от размера листа
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        for name, df in sheets:
+            worksheet = workbook.add_worksheet(sheet_name(name))
+            worksheet.write_row(0, 0, [str(column) for column in df.columns])
+            for row_ind, row in enumerate(df.itertuples(index=False, name=None), start=1):
+                worksheet.write_row(row_ind, 0, [plain_value(value) for value in row])
+    finally:
+        workbook.close()
+
+
+def write_json(sheets: list[Sheet], path: str):
+    # Один документ: имя листа -> список строк
+    document = {
+        name: [{str(column): plain_value(value) for column, value in zip(df.columns, row)}
+               for row in df.itertuples(index=False, name=None)]
+        for name, df in sheets
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False)
+
+
+def write_zipped(sheets: list[Sheet], path: str, extension: str, write_sheet: Callable[[pd.DataFrame, io.BytesIO], None]):
+    # Табличные форматы без листов: по файлу на лист в одном архиве
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, df in sheets:
+            buffer = io.BytesIO()
+            write_sheet(df, buffer)
+            # Те же имена, что у листов xlsx: "/" в имени создал бы в архиве каталог
+            archive.writestr(f"{sheet_name(name)}.{extension}", buffer.getvalue())
+
+
+def write_csv(sheets: list[Sheet], path: str):
+    write_zipped(sheets, path, "csv", lambda df, buffer: df.to_csv(buffer, index=False, encoding="utf-8"))
+
+
+def write_parquet(sheets: list[Sheet], path: str):
+    write_zipped(sheets, path, "parquet", lambda df, buffer: df.to_parquet(buffer, index=False))
+
+
+# Формат отчёта -> (расширение файла, функция записи)
+REPORT_WRITERS: dict[str, tuple[str, Callable[[list[Sheet], str], None]]] = {
+    "xlsx": (".xlsx", write_xlsx),
+    "json": (".json", write_json),
+    "csv": (".csv.zip", write_csv),
+    "parquet": (".parquet.zip", write_parquet),
+}
+
+
+def report_paths(report_path: str, formats: list[str]) -> dict[str, str]:
+    # Пути отчётов всех форматов рядом с основным. xlsx пишется ровно по report_path
+    base, ext = os.path.splitext(report_path)
+    paths = {}
+    for report_format in formats:
+        extension, _ = REPORT_WRITERS[report_format]
+        paths[report_format] = report_path if extension == ext else base + extension
+    return paths
+
+
+def write_report(sheets: list[Sheet], report_path: str, formats: list[str]) -> dict[str, str]:
+    paths = report_paths(report_path, formats)
+    for report_format, path in paths.items():
+        _, writer = REPORT_WRITERS[report_format]
+        writer(sheets, path)
+    return paths
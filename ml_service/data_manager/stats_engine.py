@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+from traffic_observer.quantile_sketch import QuantileSketch
+
+SECS_IN_HOUR = 3600
+# Перцентили времени проезда и скорости в отчёте
+PERCENTILES = (50, 85, 95)
+
+# Векторные формулы: принимают как числа, так и массивы по всем периодам сразу
+
+def weighted_count(classwise_counts: np.ndarray, size_coeffs: np.ndarray) -> np.ndarray:
+    # Кол-во ТС, приведённое коэффициентами размера. classwise_counts: [периоды x классы]
+    return classwise_counts @ size_coeffs
+
+def intensity(weighted: np.ndarray, observation_time: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.divide(weighted, np.divide(observation_time, SECS_IN_HOUR))
+
+def mean_hours(total: np.ndarray, count: np.ndarray) -> np.ndarray:
+    # Среднее в часах, NaN для периодов без проездов
+    total = np.asarray(total, dtype=float)
+    count = np.asarray(count, dtype=float)
+    out = np.full(np.broadcast(total, count).shape, np.nan)
+    np.divide(total, count * SECS_IN_HOUR, out=out, where=count > 0)
+    return out
+
+def speed(length: np.ndarray, mean_travel_time: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.divide(length, mean_travel_time)
+
+def density(intensity_value: np.ndarray, lanes_count: np.ndarray, speed_value: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.divide(intensity_value, lanes_count * speed_value)
+
+def delay(mean_travel_time: np.ndarray, mean_free_time: np.ndarray) -> np.ndarray:
+    return mean_travel_time - mean_free_time
+
+def time_index(mean_travel_time: np.ndarray, mean_free_time: np.ndarray) -> np.ndarray:
+    mean_free_time = np.asarray(mean_free_time, dtype=float)
+    out = np.full(mean_free_time.shape, np.nan)
+    np.divide(mean_travel_time, mean_free_time, out=out, where=mean_free_time != 0)
+    return out
+
+
+def sketch_percentiles(sketch) -> tuple[list[float], list[float]]:
+    # Перцентили времени проезда и времена, соответствующие перцентилям скорости:
+    # p85 скорости - это скорость, которую не превышают 85% ТС, т.е. 15-й перцентиль времени
+    travel = [sketch.quantile(p / 100) for p in PERCENTILES]
+    speed_travel = [sketch.quantile(1 - p / 100) for p in PERCENTILES]
+    return travel, speed_travel
+
+
+def percentile_columns(travel_quantiles: np.ndarray, speed_travel_quantiles: np.ndarray, length: np.ndarray) -> dict[str, np.ndarray]:
+    columns = {}
+    for ind, p in enumerate(PERCENTILES):
+        columns[f"Время проезда p{p} сек"] = travel_quantiles[:, ind]
+    for ind, p in enumerate(PERCENTILES):
+        columns[f"Скорость p{p} км/ч"] = speed(length, speed_travel_quantiles[:, ind] / SECS_IN_HOUR)
+    return columns
+
+
+def std_seconds(m2: np.ndarray, count: np.ndarray) -> np.ndarray:
+    # Выборочное СКО по накопленной сумме квадратов отклонений, NaN при менее чем двух ТС
+    out = np.full(np.broadcast(m2, count).shape, np.nan)
+    np.divide(m2, count - 1, out=out, where=count > 1)
+    return np.sqrt(out)
+
+
+def flatten_periods(periods_by_sector, vehicle_classes) -> dict[str, np.ndarray]:
+    # Все периоды всех секторов в виде плоских массивов, по элементу на период.
+    # Суммы по ТС берутся из агрегатов периодов, сами времена ТС не перебираются
+    sector_index, observation_time, start_time, classwise_counts = [], [], [], []
+    travel_count, travel_sum, travel_m2, free_count, free_sum = [], [], [], [], []
+    travel_quantiles, speed_travel_quantiles = [], []
+
+    for s_idx, periods in enumerate(periods_by_sector):
+        for period in periods:
+            sector_index.append(s_idx)
+            observation_time.append(period.observation_time)
+            start_time.append(period.start_time)
+            classwise_counts.append([period.classwise_traveled_count.get(name, 0) for name in vehicle_classes])
+
+            aggregate = period.aggregate
+            travel_count.append(aggregate.travel_time.count)
+            travel_sum.append(aggregate.travel_time.total)
+            travel_m2.append(aggregate.travel_time.m2)
+            free_count.append(aggregate.free_time.count)
+            free_sum.append(aggregate.free_time.total)
+
+            travel, speed_travel = sketch_percentiles(aggregate.travel_time_sketch)
+            travel_quantiles.append(travel)
+            speed_travel_quantiles.append(speed_travel)
+
+    periods = len(sector_index)
+    return {
+        "sector": np.array(sector_index, dtype=int),
+        "observation_time": np.array(observation_time, dtype=float),
+        "start_time": np.array(start_time, dtype=float),
+        "classwise_counts": np.array(classwise_counts, dtype=float).reshape(periods, len(vehicle_classes)),
+        "travel_count": np.array(travel_count, dtype=float),
+        "travel_sum": np.array(travel_sum, dtype=float),
+        "travel_m2": np.array(travel_m2, dtype=float),
+        "free_count": np.array(free_count, dtype=float),
+        "free_sum": np.array(free_sum, dtype=float),
+        "travel_quantiles": np.array(travel_quantiles, dtype=float).reshape(periods, len(PERCENTILES)),
+        "speed_travel_quantiles": np.array(speed_travel_quantiles, dtype=float).reshape(periods, len(PERCENTILES)),
+    }
+
+
+def period_metrics(flat: dict[str, np.ndarray], lengths: np.ndarray, lanes_counts: np.ndarray, size_coeffs: np.ndarray) -> pd.DataFrame:
+    # Все показатели для всех периодов за один векторный проход
+    length = lengths[flat["sector"]]
+    lanes = lanes_counts[flat["sector"]]
+
+    ti = intensity(weighted_count(flat["classwise_counts"], size_coeffs), flat["observation_time"])
+    travel = mean_hours(flat["travel_sum"], flat["travel_count"])
+    free = mean_hours(flat["free_sum"], flat["free_count"])
+    v = speed(length, travel)
+
+    return pd.DataFrame({
+        "sector": flat["sector"],
+        "Интенсивность траффика": ti,
+        "Среднее время проезда сек": travel * SECS_IN_HOUR,
+        "СКО времени проезда сек": std_seconds(flat["travel_m2"], flat["travel_count"]),
+        "Средняя скорость движения км/ч": v,
+        **percentile_columns(flat["travel_quantiles"], flat["speed_travel_quantiles"], length),
+        "Плотность траффика": density(ti, lanes, v),
+        "Среднее своб. время сек": free * SECS_IN_HOUR,
+        "Средняя задержка сек": delay(travel, free) * SECS_IN_HOUR,
+        "Временной индекс": time_index(travel, free),
+        "Время наблюдения сек": flat["observation_time"],
+        "Начало периода сек": flat["start_time"],
+        "Конец периода сек": flat["start_time"] + flat["observation_time"],
+    })
+
+
+def sector_traffic_stats(sectors, vehicle_classes, size_coeffs: dict[str, float], periods_by_sector=None) -> list[pd.DataFrame]:
+    # Таблица показателей по периодам для каждого сектора.
+    # periods_by_sector - свои периоды вместо закрытых (например, текущий открытый)
+    if periods_by_sector is None:
+        periods_by_sector = [sector.periods_data for sector in sectors]
+
+    flat = flatten_periods(periods_by_sector, vehicle_classes)
+    lengths = np.array([sector.length for sector in sectors], dtype=float)
+    lanes_counts = np.array([sector.lanes_count for sector in sectors], dtype=float)
+    coeffs = np.array([size_coeffs.get(name, 1) for name in vehicle_classes], dtype=float)
+
+    metrics = period_metrics(flat, lengths, lanes_counts, coeffs)
+    return [
+        metrics[metrics["sector"] == s_idx].drop(columns="sector").reset_index(drop=True)
+        for s_idx in range(len(sectors))
+    ]
+
+
+def sector_percentile_summary(sectors, vehicle_classes) -> pd.DataFrame:
+    # Перцентили за всё время наблюдения: скетчи всех периодов объединяются, память постоянна
+    rows = []
+    for sector in sectors:
+        total = None
+        classwise = {}
+        for period in sector.periods_data:
+            aggregate = period.aggregate
+            if total is None:
+                total = QuantileSketch()
+            total.merge(aggregate.travel_time_sketch)
+            for class_name, sketch in aggregate.classwise_travel_time_sketch.items():
+                if class_name not in classwise:
+                    classwise[class_name] = QuantileSketch()
+                classwise[class_name].merge(sketch)
+
+        if total is None:
+            continue
+        named_sketches = [("все", total)] + [(name, classwise[name]) for name in vehicle_classes if name in classwise]
+        for class_name, sketch in named_sketches:
+            travel, speed_travel = sketch_percentiles(sketch)
+            row = {"Сектор": sector.id, "Класс": class_name, "Кол-во ТС": sketch.count}
+            row.update({
+                name: values[0]
+                for name, values in percentile_columns(np.array([travel]), np.array([speed_travel]), np.array([sector.length])).items()
+            })
+            rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def sector_classwise_stats(sectors, vehicle_classes) -> list[pd.DataFrame]:
+    # Кол-во проехавших ТС каждого класса по периодам для каждого сектора
+    return [
+        pd.DataFrame(
+            [[period.classwise_traveled_count[name] for name in vehicle_classes] for period in sector.periods_data],
+            columns=list(vehicle_classes)
+        )
+        for sector in sectors
+    ]
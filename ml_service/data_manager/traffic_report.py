@@ -1,25 +1,57 @@
 import pandas as pd
-from pandas.io.excel import ExcelWriter
 from traffic_observer.sector_manager import SectorManager
+from data_manager.report_writers import write_report
 import logging
 
-def create_stats_report(sector_cluster: SectorManager, report_path: str):
+def sampling_dataframe(measured_spans: list[tuple[float, float]]) -> pd.DataFrame:
+    # Таблица замеренных отрезков и пропусков между ними
+    rows = []
+    for ind, (start, end) in enumerate(measured_spans):
+        if ind > 0 and start > rows[-1]["Конец сек"]:
+            rows.append({"Начало сек": rows[-1]["Конец сек"], "Конец сек": start, "Замер": False})
+        rows.append({"Начало сек": start, "Конец сек": end, "Замер": True})
+    return pd.DataFrame(rows, columns=["Начало сек", "Конец сек", "Замер"])
+
+def windows_dataframe(sector_cluster: SectorManager, window: float) -> pd.DataFrame:
+    # Показатели всех секторов по окнам заданной длины в одной таблице
+    frames = []
+    for sector, stats in zip(sector_cluster.sectors, sector_cluster.window_stats(window)):
+        stats = stats.copy()
+        stats.insert(0, "Сектор", sector.id)
+        frames.append(stats)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def create_stats_report(
+        sector_cluster: SectorManager,
+        report_path: str,
+        measured_spans: list[tuple[float, float]]|None = None,
+        report_windows: list[float] = (),
+        report_formats: list[str] = ("xlsx",)
+) -> dict[str, str]:
     traffic_stats = sector_cluster.traffic_stats()
     classwise_stats = sector_cluster.classwise_stats()
     logging.info("Созданы датафреймы со статистикой.")
 
-    res_dataframes = []
-    i = 1
-    for traf_stat, class_stat in zip(traffic_stats, classwise_stats):
-        df_res_tmp = pd.concat([traf_stat, class_stat], axis=1)
-        res_dataframes.append(df_res_tmp)
-
-        print("*********************")
-        print(f"Sector #{i}")
-        print(df_res_tmp)
-        i += 1
-
-    # Запись данных в файл
-    with ExcelWriter(report_path) as writer:
-        for ind, df in enumerate(res_dataframes):
-            df.to_excel(writer, sheet_name=f"{ind + 1}")
\ No newline at end of file
+    # Лист на каждый сектор: периоды по строкам
+    sheets = []
+    for sector, traf_stat, class_stat in zip(sector_cluster.sectors, traffic_stats, classwise_stats):
+        df_res_tmp = pd.concat([traf_stat, class_stat], axis=1).rename_axis("Период").reset_index()
+        sheets.append((f"{sector.id}", df_res_tmp))
+        logging.debug(f"Sector #{sector.id}\n{df_res_tmp}")
+
+    # Перцентили за всё время наблюдения
+    sheets.append(("Перцентили", sector_cluster.percentile_summary()))
+
+    # Окна разной длины, собранные из одних и тех же корзин
+    for window in report_windows:
+        sheets.append((f"Окно {window:g} сек", windows_dataframe(sector_cluster, window)))
+
+    # Отметка замеренных отрезков при выборочных замерах
+    if measured_spans is not None:
+        sheets.append(("Замеры", sampling_dataframe(measured_spans)))
+
+    # Запись одних и тех же листов во все запрошенные форматы
+    paths = write_report(sheets, report_path, list(report_formats))
+    logging.info(f"Отчёт сохранён: {paths}")
+    return paths
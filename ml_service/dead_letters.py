@@ -0,0 +1,118 @@
+"""
+Tasks in the dead letter topic: failed ML_MAX_ATTEMPTS times or rejected for unusable input.
+
+    python dead_letters.py list
+    python dead_letters.py requeue TASK_ID [TASK_ID ...]
+    python dead_letters.py requeue --all
+
+The topic is read from the beginning by a throwaway consumer group without committing, so
+listing does not consume anything. Requeueing releases the task in the registry and publishes
+it to the task topic as a first attempt; the dead letter stays in the topic as history, a task
+dead-lettered several times is listed with its last failure.
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from messaging import consumer_lag, create_consumer, create_producer
+from task_registry import TaskRegistry
+
+# Same topics as in wrapper.py
+TASK_TOPIC = 'video_processing_tasks'
+DEAD_LETTER_TOPIC = 'video_processing_tasks_dead'
+
+# Longest wait for the group assignment and the first messages
+READ_TIMEOUT = 30
+
+
+def read_dead_letters() -> dict[str, dict]:
+    """Last dead letter of every task_id, in the order the tasks failed"""
+    consumer = create_consumer(
+        DEAD_LETTER_TOPIC,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+        group_id=f'ml_dead_letters_{uuid.uuid4().hex}',
+        auto_offset_reset='earliest',
+        enable_auto_commit=False
+    )
+    letters = {}
+    deadline = time.monotonic() + READ_TIMEOUT
+    try:
+        while True:
+            records = consumer.poll(timeout_ms=1000)
+            for messages in records.values():
+                for message in messages:
+                    letters.pop(message.value.get('task_id'), None)
+                    letters[message.value.get('task_id')] = message.value
+            # Done once an empty poll finds the whole topic read
+            if not records and (consumer_lag(consumer) == 0 or time.monotonic() > deadline):
+                break
+    finally:
+        consumer.close()
+    return letters
+
+
+def format_time(timestamp) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(sep=' ', timespec='seconds') if timestamp else '-'
+
+
+def list_letters(letters: dict[str, dict]):
+    for task_id, letter in letters.items():
+        kind = 'permanent' if letter.get('permanent') else f"{letter.get('attempt', 1)} attempts"
+        error = (letter.get('error') or '').strip().splitlines()
+        print(f"{task_id}  {format_time(letter.get('failed_at'))}  {kind}  {letter.get('video_path', '')}")
+        if error:
+            print(f"    {error[-1]}")
+        if letter.get('log_path'):
+            print(f"    log: {letter['log_path']}")
+    print(f"{len(letters)} dead-lettered tasks")
+
+
+def requeue(letters: dict[str, dict], task_ids: list[str]) -> int:
+    """Publishes the tasks again, the number of task_ids that are not in the dead letter topic"""
+    producer = create_producer(value_serializer=lambda v: json.dumps(v).encode('utf-8'))
+    registry = TaskRegistry()
+    missing = 0
+    for task_id in task_ids:
+        letter = letters.get(task_id)
+        if letter is None:
+            print(f"{task_id}: not in {DEAD_LETTER_TOPIC}", file=sys.stderr)
+            missing += 1
+            continue
+        task_data = {
+            key: value for key, value in letter.items()
+            if key not in ('error', 'permanent', 'log_path', 'failed_at', 'last_error')
+        }
+        task_data['attempt'] = 1
+        task_data['published_at'] = time.time()
+        registry.release(task_id)
+        producer.send(TASK_TOPIC, task_data)
+        print(f"{task_id}: requeued")
+    producer.flush()
+    producer.close()
+    return missing
+
+
+def load_args():
+    parser = argparse.ArgumentParser(description="Tasks in the dead letter topic of the ML service")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List dead-lettered tasks with their last error")
+    requeue_parser = commands.add_parser("requeue", help="Publish dead-lettered tasks for processing again")
+    requeue_parser.add_argument("task_ids", nargs="*", help="Tasks to requeue")
+    requeue_parser.add_argument("--all", action="store_true", help="Requeue every dead-lettered task")
+    args = parser.parse_args()
+    if args.command == "requeue" and not args.all and not args.task_ids:
+        parser.error("requeue needs task ids or --all")
+    return args
+
+
+if __name__ == "__main__":
+    args = load_args()
+    letters = read_dead_letters()
+    if args.command == "list":
+        list_letters(letters)
+    else:
+        missing = requeue(letters, list(letters) if args.all else args.task_ids)
+        sys.exit(1 if missing else 0)
@@ -0,0 +1,153 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable
+
+# Режимы профилирования: sampling - периодический снимок стека, cprofile - учёт каждого вызова
+PROFILE_MODES = ("sampling", "cprofile")
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Снимает стек профилируемого потока каждые interval секунд из отдельного потока.
+    Накладные расходы не зависят от числа вызовов, поэтому подходит для боевых задач
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self.__target = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self, thread_id: int|None = None):
+        self.__target = thread_id or threading.get_ident()
+        self.__thread = threading.Thread(target=self.__run, name="sampling-profiler", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            frame = sys._current_frames().get(self.__target)
+            if frame is None:
+                continue
+            # Стек от корня к листу, как в collapsed-формате flamegraph
+            names = []
+            while frame is not None:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path: str):
+        # Формат "кадр;кадр;кадр кол-во" читают flamegraph.pl, speedscope и inferno
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit: int) -> list[dict]:
+        # Собственные (лист стека) и полные (функция где-то в стеке) выборки по функциям
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            names = stack.split(";")
+            own[names[-1]] += count
+            for name in set(names):
+                total[name] += count
+
+        return [
+            {
+                "function": name,
+                "own_samples": own[name],
+                "total_samples": count,
+                "own_share": own[name] / self.samples if self.samples else 0.0,
+                "total_share": count / self.samples if self.samples else 0.0,
+            }
+            for name, count in total.most_common(limit)
+        ]
+
+
+def write_summary(path_base: str, summary: dict, text: str):
+    # JSON для сервисов и текст для чтения глазами
+    with open(f"{path_base}.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    with open(f"{path_base}_top.txt", "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def profile_call(func: Callable[[], None], mode: str, path_base: str, top: int = 30, interval: float = 0.005):
+    """
+    Выполняет func под профилировщиком и пишет результаты рядом с path_base:
+    sampling - <base>.collapsed, cprofile - <base>.pstats; в обоих случаях <base>.json и <base>_top.txt
+    """
+    os.makedirs(os.path.dirname(path_base) or ".", exist_ok=True)
+    started = time.perf_counter()
+
+    if mode == "sampling":
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        try:
+            func()
+        finally:
+            profiler.stop()
+            profiler.write_collapsed(f"{path_base}.collapsed")
+            functions = profiler.top(top)
+            text = "\n".join(
+                f"{item['own_share']:7.2%} {item['total_share']:7.2%}  {item['function']}" for item in functions
+            )
+            write_summary(path_base, {
+                "mode": mode,
+                "interval": interval,
+                "samples": profiler.samples,
+                "wall_time": time.perf_counter() - started,
+                "stacks_path": f"{path_base}.collapsed",
+                "top": functions,
+            }, "   own    total  function\n" + text + "\n")
+            logging.info(f"Профиль сохранён в {path_base}.collapsed")
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        func()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{path_base}.pstats")
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream).sort_stats("cumulative")
+        stats.print_stats(top)
+        functions = [
+            {
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "own_time": own_time,
+                "total_time": total_time,
+            }
+            for (filename, line, name), (_, calls, own_time, total_time, _) in sorted(
+                stats.stats.items(), key=lambda item: item[1][3], reverse=True
+            )[:top]
+        ]
+        write_summary(path_base, {
+            "mode": mode,
+            "wall_time": time.perf_counter() - started,
+            "stats_path": f"{path_base}.pstats",
+            "top": functions,
+        }, stream.getvalue())
+        logging.info(f"Профиль сохранён в {path_base}.pstats")
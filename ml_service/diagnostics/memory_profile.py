@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import Callable
+
+# Корень ML-сервиса: его модули показываются относительными путями, остальное - по пакетам
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def code_group(filename: str) -> str:
+    # Модуль сервиса (traffic_observer/sector_manager.py), сторонний пакет (ultralytics) или модуль Python
+    path = os.path.abspath(filename)
+    if path.startswith(PROJECT_ROOT + os.sep):
+        return os.path.relpath(path, PROJECT_ROOT)
+    parts = path.split(os.sep)
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            index = parts.index(marker)
+            if index + 1 < len(parts):
+                return parts[index + 1].removesuffix(".py")
+    return f"python:{os.path.basename(path)}"
+
+
+def code_location(frame: tracemalloc.Frame) -> str:
+    path = os.path.abspath(frame.filename)
+    if path.startswith(PROJECT_ROOT + os.sep):
+        path = os.path.relpath(path, PROJECT_ROOT)
+    return f"{path}:{frame.lineno}"
+
+
+def current_rss() -> int|None:
+    # Текущий RSS процесса в байтах (Linux), tracemalloc видит только память Python
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryProfiler:
+    """
+    Периодические снимки выделений памяти во время обработки.
+    Рост привязывается к строкам кода и пакетам относительно первого снимка,
+    probe дополняет снимок размерами структур (словари секторов, counted_ids, периоды)
+    """
+
+    def __init__(self, path: str, interval: float = 30, top: int = 20, nframes: int = 1,
+                 probe: Callable[[], dict[str, int]]|None = None):
+        self.path = path
+        self.interval = interval
+        self.top = top
+        self.nframes = nframes
+        self.probe = probe
+        self.timeline: list[dict] = []
+        self.__baseline = None
+        self.__started = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        tracemalloc.start(self.nframes)
+        self.__started = time.perf_counter()
+        self.__baseline = self.__take()
+        self.__record(self.__baseline)
+        self.__thread = threading.Thread(target=self.__run, name="memory-profiler", daemon=True)
+        self.__thread.start()
+        logging.info(f"Профилирование памяти: снимок каждые {self.interval} сек")
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+        if self.__baseline is not None:
+            self.__record(self.__take())
+            tracemalloc.stop()
+            self.write()
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            self.__record(self.__take())
+
+    def __take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    def __record(self, snapshot: tracemalloc.Snapshot):
+        current, peak = tracemalloc.get_traced_memory()
+
+        # Память по пакетам и модулям сервиса
+        groups: dict[str, int] = {}
+        for stat in snapshot.statistics("filename"):
+            group = code_group(stat.traceback[0].filename)
+            groups[group] = groups.get(group, 0) + stat.size
+
+        # Строки кода с наибольшим ростом с начала обработки
+        growth = [
+            {
+                "location": code_location(stat.traceback[0]),
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in snapshot.compare_to(self.__baseline, "lineno")[:self.top]
+            if stat.size_diff > 0
+        ]
+
+        entry = {
+            "elapsed": time.perf_counter() - self.__started,
+            "traced": current,
+            "traced_peak": peak,
+            "rss": current_rss(),
+            "groups": dict(sorted(groups.items(), key=lambda item: item[1], reverse=True)[:self.top]),
+            "growth": growth,
+        }
+        if self.probe is not None:
+            entry["structures"] = self.probe()
+        self.timeline.append(entry)
+
+    def summary(self) -> dict:
+        # Рост по группам кода и по структурам от первого снимка к последнему
+        first, last = self.timeline[0], self.timeline[-1]
+        groups = set(first["groups"]) | set(last["groups"])
+        group_growth = {group: last["groups"].get(group, 0) - first["groups"].get(group, 0) for group in groups}
+        summary = {
+            "duration": last["elapsed"],
+            "traced_growth": last["traced"] - first["traced"],
+            "traced_peak": max(entry["traced_peak"] for entry in self.timeline),
+            "rss_peak": max((entry["rss"] for entry in self.timeline if entry["rss"] is not None), default=None),
+            "group_growth": dict(sorted(group_growth.items(), key=lambda item: item[1], reverse=True)[:self.top]),
+        }
+        if "structures" in first:
+            summary["structures_growth"] = {
+                name: last["structures"].get(name, 0) - value for name, value in first["structures"].items()
+            }
+        return summary
+
+    def write(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({
+                "unit": "bytes",
+                "interval": self.interval,
+                "summary": self.summary(),
+                "timeline": self.timeline,
+            }, f, ensure_ascii=False, indent=2)
+        logging.info(f"Профиль памяти сохранён в {self.path}")
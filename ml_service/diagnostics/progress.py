@@ -0,0 +1,41 @@
+import re
+import sys
+import time
+
+# Машиночитаемая строка хода обработки в stderr: "PROGRESS <обработано кадров>/<всего кадров или ?>".
+# wrapper.py читает вывод main.py построчно и переводит её в проценты задачи
+PROGRESS_RE = re.compile(r"^PROGRESS (\d+)/(\d+|\?)$")
+
+
+def parse_progress(line: str) -> tuple[int, int|None]|None:
+    # (обработано, всего) из строки хода обработки, None - обычная строка журнала
+    match = PROGRESS_RE.match(line.strip())
+    if match is None:
+        return None
+    total = match.group(2)
+    return int(match.group(1)), None if total == "?" else int(total)
+
+
+class ProgressReporter:
+    """Ход обработки кадров: не чаще раза в interval секунд, чтобы не раздувать журнал задачи"""
+
+    def __init__(self, total_frames: int|None, interval: float = 1.0, stream=None):
+        self.total_frames = total_frames
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.frames = 0
+        self.reported_at = None
+
+    def update(self, frames: int = 1):
+        self.frames += frames
+        now = time.monotonic()
+        if self.reported_at is None or now - self.reported_at >= self.interval:
+            self.report(now)
+
+    def finish(self):
+        self.report(time.monotonic())
+
+    def report(self, now: float):
+        self.reported_at = now
+        total = "?" if self.total_frames is None else self.total_frames
+        print(f"PROGRESS {self.frames}/{total}", file=self.stream, flush=True)
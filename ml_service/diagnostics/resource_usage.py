@@ -0,0 +1,51 @@
+import json
+import logging
+import resource
+import socket
+import sys
+import time
+
+from diagnostics.stage_timings import StageTimings
+
+
+def maxrss_bytes(usage: resource.struct_rusage) -> int:
+    # ru_maxrss в килобайтах на Linux и в байтах на macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+class ResourceUsage:
+    """Расход ресурсов одной задачи: время, CPU, пиковая память, кадры и скорость относительно видео"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    def summary(self, timings: StageTimings, measured_spans: list[tuple[float, float]]) -> dict:
+        wall_time = time.perf_counter() - self.started
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        # Завершённые дочерние процессы: декодирование и запись при --pipeline processes
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        decoded = timings.stages["decode"].count if "decode" in timings.stages else 0
+        inferred = timings.stages["inference"].count if "inference" in timings.stages else 0
+        video_duration = sum(end - start for start, end in measured_spans)
+
+        return {
+            "host": socket.gethostname(),
+            "wall_time": wall_time,
+            "cpu_time": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+            "cpu_user": own.ru_utime + children.ru_utime,
+            "cpu_system": own.ru_stime + children.ru_stime,
+            "peak_rss": maxrss_bytes(own),
+            "children_peak_rss": maxrss_bytes(children),
+            "frames_decoded": decoded,
+            "frames_inferred": inferred,
+            "effective_fps": inferred / wall_time if wall_time > 0 else None,
+            "video_duration": video_duration,
+            # Больше 1 - быстрее реального времени
+            "realtime_factor": video_duration / wall_time if wall_time > 0 else None,
+        }
+
+    def write(self, path: str, timings: StageTimings, measured_spans: list[tuple[float, float]]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(timings, measured_spans), f, ensure_ascii=False, indent=2)
+        logging.info(f"Расход ресурсов сохранён в {path}")
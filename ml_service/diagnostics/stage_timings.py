@@ -0,0 +1,93 @@
+import bisect
+import itertools
+import json
+import math
+import socket
+import time
+from contextlib import contextmanager
+
+from traffic_observer.quantile_sketch import QuantileSketch
+
+# Этапы обработки кадра в порядке конвейера
+STAGES = ("decode", "resize", "inference", "tracking", "regions", "annotation", "lanes", "encode")
+
+# Верхние границы корзин гистограммы в секундах (как le у гистограмм Prometheus), последняя - +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+
+class StageHistogram:
+    # Распределение длительностей одного этапа: кол-во, сумма, максимум и квантили по скетчу
+    __slots__ = ("count", "total", "max", "sketch", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sketch = QuantileSketch()
+        self.buckets = [0] * len(BUCKETS)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.sketch.add(seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def cumulative_buckets(self) -> dict[str, int]:
+        # Накопленные кол-ва по верхним границам: сервис складывает их в гистограммы метрик
+        counts = itertools.accumulate(self.buckets)
+        return {("+Inf" if math.isinf(bound) else str(bound)): count for bound, count in zip(BUCKETS, counts)}
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else math.nan,
+            "p50": self.sketch.quantile(0.5),
+            "p95": self.sketch.quantile(0.95),
+            "max": self.max,
+        }
+
+
+class StageTimings:
+    """Накопитель времени по этапам обработки. По кадрам ничего не логируется, только гистограммы"""
+
+    def __init__(self):
+        self.stages: dict[str, StageHistogram] = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float):
+        if stage not in self.stages:
+            self.stages[stage] = StageHistogram()
+        self.stages[stage].add(seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        # Известные этапы в порядке конвейера, затем остальные
+        names = [name for name in STAGES if name in self.stages]
+        names += [name for name in self.stages if name not in STAGES]
+        stages = {}
+        for name in names:
+            stages[name] = {
+                key: value if isinstance(value, int) or math.isfinite(value) else None
+                for key, value in self.stages[name].summary().items()
+            }
+            stages[name]["buckets"] = self.stages[name].cumulative_buckets()
+        return {
+            "host": socket.gethostname(),
+            "unit": "s",
+            "wall_time": time.perf_counter() - self.started,
+            "stages": stages,
+        }
+
+    def write(self, path: str, **meta):
+        # meta - сведения о запуске (конвейер, разрешение и т.п.) для сравнения задач между собой
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**meta, **self.summary()}, f, ensure_ascii=False, indent=2)
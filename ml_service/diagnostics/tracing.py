@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+# Спаны одной трассы копятся в <TRACE_DIR>/<trace_id>.jsonl, по строке JSON на спан.
+# Тот же файл дописывают video_service и statistics_service, разбивку задержки по участкам отдаёт statistics_service
+DEFAULT_TRACE_DIR = "/shared/traces"
+
+
+def trace_path(trace_id: str, directory: str|None = None) -> str:
+    return os.path.join(directory or os.getenv("TRACE_DIR", DEFAULT_TRACE_DIR), f"{trace_id}.jsonl")
+
+
+class Tracer:
+    """
+    Запись спанов одной трассы: имя, сервис, начало и конец по часам эпохи, родительский спан.
+    Без trace_id (задача пришла без трассы) ничего не пишет
+    """
+
+    def __init__(self, service: str, trace_id: str|None, parent_id: str|None = None, directory: str|None = None):
+        self.service = service
+        self.trace_id = trace_id
+        self.directory = directory
+        # Открытые спаны: вложенные получают родителем последний из них
+        self.stack = [parent_id] if parent_id else []
+
+    @classmethod
+    def from_env(cls, service: str) -> "Tracer":
+        # Трасса, переданная родительским процессом (wrapper.py -> main.py)
+        return cls(service, os.getenv("TRACE_ID"), os.getenv("TRACE_PARENT_ID"))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.trace_id)
+
+    def env(self) -> dict[str, str]:
+        # Переменные окружения, с которыми дочерний процесс продолжит трассу внутри текущего спана
+        if not self.enabled:
+            return {}
+        env = {"TRACE_ID": self.trace_id}
+        if self.stack:
+            env["TRACE_PARENT_ID"] = self.stack[-1]
+        if self.directory:
+            env["TRACE_DIR"] = self.directory
+        return env
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        # attributes можно дополнить внутри блока: with tracer.span(...) as attributes
+        span_id = uuid.uuid4().hex[:16]
+        parent_id = self.stack[-1] if self.stack else None
+        self.stack.append(span_id)
+        start = time.time()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.stack.pop()
+            self.write(name, start, time.time(), span_id, parent_id, attributes)
+
+    def record(self, name: str, start: float, end: float, **attributes):
+        # Спан, измеренный задним числом, например ожидание сообщения в очереди
+        self.write(name, start, end, uuid.uuid4().hex[:16], self.stack[-1] if self.stack else None, attributes)
+
+    def write(self, name: str, start: float, end: float, span_id: str, parent_id: str|None, attributes: dict):
+        if not self.enabled:
+            return
+        span = {
+            "trace_id": self.trace_id,
+            "span_id": span_id,
+            "parent_id": parent_id,
+            "name": name,
+            "service": self.service,
+            "start": start,
+            "end": end,
+            "duration": end - start,
+            "attributes": attributes,
+        }
+        path = trace_path(self.trace_id, self.directory)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Одна короткая строка на запись: процессы дописывают файл, не мешая друг другу
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(span, ensure_ascii=False) + "\n")
+        except OSError as e:
+            # Трасса - диагностика, задача из-за неё не падает
+            logging.warning(f"Спан {name} не записан: {e}")
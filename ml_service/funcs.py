@@ -1,13 +1,19 @@
-import statistics
+import numpy as np
 from typing import Iterable
-from traffic_observer.lane import Lane
+from data_manager import stats_engine
 
 Hours = float
 Percents = float
 Seconds = float
 Kilometer = float
 Kmph = float
-SECS_IN_HOUR = 3600
+SECS_IN_HOUR = stats_engine.SECS_IN_HOUR
+
+# Скалярные обёртки над векторными формулами data_manager.stats_engine
+
+
+def _values(vehicles_time: Iterable[Seconds|float]) -> np.ndarray:
+    return np.fromiter(vehicles_time, float)
 
 
 def traffic_intensity(
@@ -17,11 +23,9 @@ def traffic_intensity(
 ) -> float:
     ''' Интенсивность движения транспортных средств (1 пункт) '''
 
-    s = 0
-    for cls_name, traveled_count in classwise_traveled_count.items():
-        s += traveled_count * vehicle_size_coeffs.get(cls_name, 1)
-
-    return s / (observation_time / SECS_IN_HOUR)
+    counts = np.array(list(classwise_traveled_count.values()), dtype=float)
+    coeffs = np.array([vehicle_size_coeffs.get(cls_name, 1) for cls_name in classwise_traveled_count], dtype=float)
+    return float(stats_engine.intensity(stats_engine.weighted_count(counts, coeffs), observation_time))
     
 
 def vehicle_class_share(
@@ -35,10 +39,8 @@ def vehicle_class_share(
 def mean_travel_time(vehicles_travel_time: Iterable[Seconds|float]) -> Hours:
     ''' Среднее время движения транспортных средств (3 пункт) (probably redundant) '''
 
-    try:
-        return statistics.mean(vehicles_travel_time) / SECS_IN_HOUR
-    except statistics.StatisticsError:
-        return float("nan")
+    values = _values(vehicles_travel_time)
+    return float(stats_engine.mean_hours(values.sum(), len(values)))
 
 
 def mean_vehicle_speed(
@@ -47,29 +49,23 @@ def mean_vehicle_speed(
 ) -> Kmph:
     ''' Средняя скорость движения транспортных средств (3 пункт) '''
 
-    return sector_length / mean_travel_time(vehicles_travel_time)
+    return float(stats_engine.speed(sector_length, mean_travel_time(vehicles_travel_time)))
 
 def mean_free_time(vehicles_free_time: Iterable[Seconds|float]) -> Hours:
-    try:
-        return statistics.mean(vehicles_free_time) / SECS_IN_HOUR
-    except statistics.StatisticsError:
-        return float("nan")
+    values = _values(vehicles_free_time)
+    return float(stats_engine.mean_hours(values.sum(), len(values)))
 
 def mean_vehicle_delay(
     vehicles_travel_time: list[list[float]],
     vehicles_free_time: list[int]
 ) -> Hours:
-    return mean_travel_time(vehicles_travel_time) - mean_free_time(vehicles_free_time)
+    return float(stats_engine.delay(mean_travel_time(vehicles_travel_time), mean_free_time(vehicles_free_time)))
     
 def time_index(
     vehicles_travel_time: list[list[float]],
     vehicles_free_time: list[int]
 ):
-    free_time = mean_free_time(vehicles_free_time)
-    if free_time != 0:
-        return mean_travel_time(vehicles_travel_time)/mean_free_time(vehicles_free_time)
-    else:
-        return float("nan")
+    return float(stats_engine.time_index(mean_travel_time(vehicles_travel_time), mean_free_time(vehicles_free_time)))
 
 def traffic_density(
     classwise_traveled_count: dict[str, Seconds],
@@ -82,4 +78,4 @@ def traffic_density(
     ti = traffic_intensity(classwise_traveled_count, vehicle_size_coeffs, observation_time)
     v = mean_vehicle_speed(vehicles_travel_time, sector_length)
 
-    return ti / (lane_count * v)
+    return float(stats_engine.density(ti, lane_count, v))
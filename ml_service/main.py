@@ -1,8 +1,15 @@
 import cv2
 import logging
+import sys
 
 from data_manager.traffic_report import create_stats_report
 from data_loader.data_constructor import DataConstructor
+from data_loader.args_loader import load_args
+from data_loader.input_error import EXIT_INPUT_ERROR, InputError
+from diagnostics.cpu_profile import profile_call
+from diagnostics.progress import ProgressReporter
+from diagnostics.tracing import Tracer
+from data_loader.frame_source import SPAN_START, SPAN_END
 
 logging.basicConfig(
     level=logging.INFO,
@@ -12,40 +19,126 @@ logging.basicConfig(
     ]
 )
 
-dataConstructor = DataConstructor()
-cap, output = dataConstructor.get_video()
-sector_manager = dataConstructor.get_sector_manager()
-settings = dataConstructor.settings
 
-# Начало обработки видео
-logging.info("Начало обработки видео...")
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
+def process_video(frame_source, sector_manager, show: bool, progress: ProgressReporter|None = None) -> list[tuple[float, float]]:
+    # Проход по кадрам, возвращает замеренные отрезки видео
+    logging.info("Начало обработки видео...")
+    measured_spans = []
+    span_start = None
 
-    frame = cv2.resize(frame, (settings.target_width, settings.target_height))
-    sector_manager.update(frame)
+    def close_span():
+        sector_manager.close_period()
+        span_end = sector_manager.period_timer.unresettable_time
+        # Перемотка за конец видео даёт отрезок без кадров, в замеры он не входит
+        if span_end > span_start:
+            measured_spans.append((span_start, span_end))
 
-    # Показ текущего кадра
-    cv2.imshow("frame", frame)
-    output.write(frame)
+    try:
+        for event in frame_source:
+            if event[0] == SPAN_START:
+                # Новый отрезок (после перемотки): незавершённые проезды сбрасываются
+                span_start = event[1]
+                sector_manager.seek(span_start)
+                continue
+            if event[0] == SPAN_END:
+                close_span()
+                span_start = None
+                continue
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+            _, frame, _ = event
+            sector_manager.update(frame)
+            frame_source.submit(frame)
+            if progress:
+                progress.update()
 
-report_path, output_path  = dataConstructor.get_output_paths()
+            # Показ текущего кадра
+            if show:
+                cv2.imshow("frame", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
 
-# Освобождаем ресурсы
-sector_manager.new_period()
-logging.info("Обработка видео завершена.")
+        # Обработка прервана посреди отрезка
+        if span_start is not None:
+            close_span()
+        if progress:
+            progress.finish()
+    finally:
+        # Освобождаем ресурсы, сохранение видеофайла
+        frame_source.close()
+        if show:
+            cv2.destroyAllWindows()
 
-# Сохранение видеофайла
-cap.release()
-output.release()
-cv2.destroyAllWindows()
+    return measured_spans
 
-logging.info(f"Видеофайл сохранён в {output_path}")
 
-# Создание отчёта
-create_stats_report(sector_manager, report_path)
+def main(detector_factory=None):
+    # detector_factory - свой детектор вместо YOLO, например заглушка в бенчмарках
+    dataConstructor = DataConstructor()
+    # Трасса задачи из окружения wrapper.py: подготовка, кадры и отчёт - отдельные спаны
+    tracer = Tracer.from_env("ml_service.main")
+    with tracer.span("setup"):
+        frame_source = dataConstructor.get_frame_source()
+        sector_manager = dataConstructor.get_sector_manager(detector_factory)
+    sampling_schedule = dataConstructor.get_sampling_schedule()
+
+    # Показатели каждого закрытого периода сразу уходят в Kafka
+    period_publisher = dataConstructor.get_period_publisher(sector_manager)
+    if period_publisher:
+        sector_manager.add_period_listener(period_publisher)
+
+    # Снимки памяти охватывают и обработку, и построение отчёта
+    memory_profiler = dataConstructor.get_memory_profiler(sector_manager)
+    if memory_profiler:
+        memory_profiler.start()
+
+    try:
+        try:
+            with tracer.span("frames") as attributes:
+                progress = ProgressReporter(dataConstructor.get_total_frames())
+                measured_spans = process_video(frame_source, sector_manager, dataConstructor.show_frames(), progress)
+                attributes["video_duration"] = sum(end - start for start, end in measured_spans)
+        finally:
+            if period_publisher:
+                period_publisher.close()
+
+        report_path, output_path = dataConstructor.get_output_paths()
+        logging.info("Обработка видео завершена.")
+        dataConstructor.write_timings()
+        if dataConstructor.saves_output_video():
+            logging.info(f"Видеофайл сохранён в {output_path}")
+
+        with tracer.span("report"):
+            # Создание отчёта
+            create_stats_report(
+                sector_manager,
+                report_path,
+                measured_spans if sampling_schedule.enabled else None,
+                dataConstructor.settings.report_windows,
+                dataConstructor.get_report_formats()
+            )
+
+            # Корзины статистики для окон произвольной длины без повторной обработки видео
+            buckets_path = dataConstructor.get_buckets_path()
+            if buckets_path:
+                sector_manager.bucket_table().to_csv(buckets_path, index=False)
+                logging.info(f"Корзины статистики сохранены в {buckets_path}")
+
+        # Расход ресурсов всей задачи, вместе с построением отчёта
+        dataConstructor.write_usage(measured_spans)
+    finally:
+        if memory_profiler:
+            memory_profiler.stop()
+
+
+if __name__ == "__main__":
+    args = load_args()
+    try:
+        if args.profile:
+            # Профиль конкретной задачи без отладчиков и пересборки образа
+            profile_call(main, args.profile, args.profile_path)
+        else:
+            main()
+    except InputError as e:
+        # Отдельный код выхода: wrapper.py не повторяет такую задачу, а сразу отправляет её в dead letter
+        logging.error(f"Задача непригодна для обработки: {e}")
+        sys.exit(EXIT_INPUT_ERROR)
@@ -0,0 +1,339 @@
+"""
+Обмен сообщениями между сервисами: Kafka или локальный брокер на SQLite.
+
+MESSAGING_BACKEND=kafka (по умолчанию) - kafka-python и KAFKA_BOOTSTRAP_SERVERS.
+MESSAGING_BACKEND=local - файл MESSAGING_LOCAL_PATH, общий для всех сервисов на одной машине.
+Семантика топиков как у Kafka: сообщения копятся в журнале с возрастающими смещениями, группа потребителей
+хранит своё смещение и получает каждое сообщение один раз, новая группа начинает с конца (latest) или
+с начала журнала (earliest). Такие же модули есть в video_service и statistics_service.
+"""
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+DEFAULT_LOCAL_PATH = "/shared/messages.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    "offset" INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    value BLOB NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_topic ON messages (topic, "offset");
+CREATE TABLE IF NOT EXISTS group_offsets (
+    group_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    "offset" INTEGER NOT NULL,
+    PRIMARY KEY (group_id, topic)
+);
+"""
+
+
+def backend() -> str:
+    return os.getenv("MESSAGING_BACKEND", "kafka")
+
+
+def bootstrap_servers() -> list[str]:
+    return os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092").split(",")
+
+
+# Раздел топика, как kafka.structs.TopicPartition. У локального брокера раздел у топика один
+TopicPartition = namedtuple("TopicPartition", ["topic", "partition"])
+
+
+@dataclass
+class LocalMessage:
+    # Поля ConsumerRecord из kafka-python, которыми пользуются сервисы
+    topic: str
+    offset: int
+    value: object
+    timestamp: float
+    partition: int = 0
+
+
+class LocalBroker:
+    """Журнал топиков и смещения групп в одном файле SQLite, доступном нескольким процессам"""
+
+    def __init__(self, path: str|None = None):
+        self.path = path or os.getenv("MESSAGING_LOCAL_PATH", DEFAULT_LOCAL_PATH)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        # Соединение на операцию: производители и потребители работают из разных потоков и процессов
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return ClosingConnection(connection)
+
+    def publish(self, topic: str, value: bytes) -> int:
+        with self.connect() as connection:
+            cursor = connection.execute(
+                'INSERT INTO messages (topic, value, timestamp) VALUES (?, ?, ?)', (topic, value, time.time())
+            )
+            return cursor.lastrowid
+
+    def join(self, topics: list[str], group_id: str, auto_offset_reset: str = "latest"):
+        # Смещение новой группы: конец журнала (latest) или его начало (earliest)
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for topic in topics:
+                if auto_offset_reset == "earliest":
+                    start = 0
+                else:
+                    start = connection.execute(
+                        'SELECT COALESCE(MAX("offset"), 0) FROM messages WHERE topic = ?', (topic,)
+                    ).fetchone()[0]
+                connection.execute(
+                    'INSERT OR IGNORE INTO group_offsets (group_id, topic, "offset") VALUES (?, ?, ?)',
+                    (group_id, topic, start)
+                )
+            connection.execute("COMMIT")
+
+    def fetch(self, topics: list[str], group_id: str, max_records: int = 100) -> list[LocalMessage]:
+        # Выборка и сдвиг смещения группы в одной транзакции: сообщение достаётся одному потребителю группы
+        messages = []
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for topic in topics:
+                position = connection.execute(
+                    'SELECT "offset" FROM group_offsets WHERE group_id = ? AND topic = ?', (group_id, topic)
+                ).fetchone()[0]
+                rows = connection.execute(
+                    'SELECT "offset", value, timestamp FROM messages WHERE topic = ? AND "offset" > ? ORDER BY "offset" LIMIT ?',
+                    (topic, position, max_records - len(messages))
+                ).fetchall()
+                if rows:
+                    connection.execute(
+                        'UPDATE group_offsets SET "offset" = ? WHERE group_id = ? AND topic = ?',
+                        (rows[-1][0], group_id, topic)
+                    )
+                    messages += [LocalMessage(topic, offset, value, timestamp) for offset, value, timestamp in rows]
+                if len(messages) >= max_records:
+                    break
+            connection.execute("COMMIT")
+        return messages
+
+    def rewind(self, topics: list[str], group_id: str, since: float):
+        # Смещение группы - перед первым сообщением не старше since
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for topic in topics:
+                start = connection.execute(
+                    'SELECT COALESCE(MAX("offset"), 0) FROM messages WHERE topic = ? AND timestamp < ?', (topic, since)
+                ).fetchone()[0]
+                connection.execute(
+                    'UPDATE group_offsets SET "offset" = ? WHERE group_id = ? AND topic = ?', (start, group_id, topic)
+                )
+            connection.execute("COMMIT")
+
+    def lag(self, topics: list[str], group_id: str) -> int:
+        # Сообщения после смещения группы, ещё не выданные ни одному потребителю
+        with self.connect() as connection:
+            return connection.execute(
+                'SELECT COUNT(*) FROM messages JOIN group_offsets ON messages.topic = group_offsets.topic '
+                'WHERE group_offsets.group_id = ? AND messages."offset" > group_offsets."offset" '
+                f'AND messages.topic IN ({", ".join("?" * len(topics))})',
+                (group_id, *topics)
+            ).fetchone()[0]
+
+
+class ClosingConnection:
+    # sqlite3.Connection как контекстный менеджер не закрывает соединение
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None and self.connection.in_transaction:
+            self.connection.execute("ROLLBACK")
+        self.connection.close()
+
+
+class LocalProducer:
+    """Производитель локального брокера с интерфейсом KafkaProducer: send, flush, close"""
+
+    def __init__(self, value_serializer: Callable[[object], bytes]|None = None, path: str|None = None):
+        self.broker = LocalBroker(path)
+        self.value_serializer = value_serializer or (lambda value: value)
+
+    def send(self, topic: str, value=None):
+        # Запись синхронная: после send сообщение уже в журнале
+        self.broker.publish(topic, self.value_serializer(value))
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+
+class LocalConsumer:
+    """
+    Потребитель локального брокера с интерфейсом KafkaConsumer: итерация, poll, pause/resume, commit и close.
+    Смещение группы сдвигается при выборке, commit ничего не делает: сообщение достаётся одному потребителю
+    сразу, но после падения процесса выбранные и не обработанные сообщения не вернутся
+    """
+
+    def __init__(self, *topics: str, group_id: str, auto_offset_reset: str = "latest",
+                 value_deserializer: Callable[[bytes], object]|None = None,
+                 poll_interval: float = 0.5, path: str|None = None):
+        self.broker = LocalBroker(path)
+        self.topics = list(topics)
+        self.group_id = group_id
+        self.value_deserializer = value_deserializer or (lambda value: value)
+        self.poll_interval = poll_interval
+        self.closed = False
+        # Выбранные, но ещё не отданные итератором сообщения: они тоже входят в отставание
+        self.pending: list[LocalMessage] = []
+        self.paused: set[TopicPartition] = set()
+        self.broker.join(self.topics, group_id, auto_offset_reset)
+
+    def fetch(self, max_records: int = 100, topics: list[str]|None = None) -> list[LocalMessage]:
+        messages = self.broker.fetch(self.topics if topics is None else topics, self.group_id, max_records)
+        for message in messages:
+            message.value = self.value_deserializer(message.value)
+        return messages
+
+    def assignment(self) -> set[TopicPartition]:
+        return {TopicPartition(topic, 0) for topic in self.topics}
+
+    def pause(self, *partitions: TopicPartition):
+        self.paused.update(partitions)
+
+    def resume(self, *partitions: TopicPartition):
+        self.paused.difference_update(partitions)
+
+    def poll(self, timeout_ms: int = 0, max_records: int|None = None) -> dict[TopicPartition, list[LocalMessage]]:
+        # Как KafkaConsumer.poll: сообщения по разделам, приостановленные разделы пропускаются
+        topics = [topic for topic in self.topics if TopicPartition(topic, 0) not in self.paused]
+        messages = self.fetch(max_records or 100, topics) if topics else []
+        if not messages:
+            time.sleep(min(timeout_ms / 1000, self.poll_interval))
+        records = {}
+        for message in messages:
+            records.setdefault(TopicPartition(message.topic, 0), []).append(message)
+        return records
+
+    def commit(self, offsets=None):
+        pass
+
+    def __iter__(self) -> Iterator[LocalMessage]:
+        while not self.closed:
+            if not self.pending:
+                self.pending = self.fetch()
+            if not self.pending:
+                time.sleep(self.poll_interval)
+                continue
+            yield self.pending.pop(0)
+
+    def lag(self) -> int:
+        return self.broker.lag(self.topics, self.group_id) + len(self.pending)
+
+    def close(self):
+        self.closed = True
+
+
+def consumer_lag(consumer) -> int|None:
+    """Сколько сообщений группа ещё не обработала по назначенным потребителю разделам, None - неизвестно"""
+    if isinstance(consumer, LocalConsumer):
+        return consumer.lag()
+
+    partitions = list(consumer.assignment())
+    if not partitions:
+        return None
+    end_offsets = consumer.end_offsets(partitions)
+    return sum(max(end_offsets[partition] - consumer.position(partition), 0) for partition in partitions)
+
+
+def rewind(consumer, since: float, timeout: float = 30):
+    """
+    Перематывает группу к сообщениям не старше since (время Unix, секунды). У Kafka ждёт назначения разделов;
+    выбранные при этом сообщения отбрасываются - они новее since и придут снова после перемотки
+    """
+    if isinstance(consumer, LocalConsumer):
+        consumer.pending.clear()
+        consumer.broker.rewind(consumer.topics, consumer.group_id, since)
+        return
+
+    deadline = time.monotonic() + timeout
+    while not consumer.assignment():
+        if time.monotonic() > deadline:
+            raise TimeoutError("No partitions assigned to the consumer")
+        consumer.poll(timeout_ms=1000)
+    partitions = list(consumer.assignment())
+    offsets = consumer.offsets_for_times({partition: int(since * 1000) for partition in partitions})
+    for partition in partitions:
+        # Нет сообщений не старше since - с конца раздела
+        if offsets[partition] is None:
+            consumer.seek_to_end(partition)
+        else:
+            consumer.seek(partition, offsets[partition].offset)
+
+
+def commit_offset(consumer, topic: str, partition: int, offset: int):
+    """Фиксирует смещение группы: offset - следующее сообщение раздела, которое группа ещё не обработала"""
+    if isinstance(consumer, LocalConsumer):
+        return
+
+    from kafka.structs import OffsetAndMetadata
+    from kafka.structs import TopicPartition as KafkaTopicPartition
+    consumer.commit({KafkaTopicPartition(topic, partition): OffsetAndMetadata(offset, None)})
+
+
+class OffsetTracker:
+    """
+    Смещения сообщений в обработке по разделам. Зафиксировать можно только непрерывный префикс:
+    пока сообщение 5 в работе, завершение 6 не сдвигает смещение группы
+    """
+
+    def __init__(self):
+        self.offsets: dict[tuple[str, int], dict[int, bool]] = {}
+
+    def start(self, topic: str, partition: int, offset: int):
+        self.offsets.setdefault((topic, partition), {})[offset] = False
+
+    def done(self, topic: str, partition: int, offset: int) -> int|None:
+        # Смещение для commit_offset или None, если раньше в разделе ещё есть незавершённые сообщения
+        offsets = self.offsets[(topic, partition)]
+        offsets[offset] = True
+        committable = None
+        for pending in sorted(offsets):
+            if not offsets[pending]:
+                break
+            committable = pending + 1
+            del offsets[pending]
+        return committable
+
+
+def create_producer(value_serializer: Callable[[object], bytes]|None = None):
+    if backend() == "local":
+        return LocalProducer(value_serializer)
+
+    from kafka import KafkaProducer
+    return KafkaProducer(bootstrap_servers=bootstrap_servers(), value_serializer=value_serializer)
+
+
+def create_consumer(*topics: str, group_id: str, auto_offset_reset: str = "latest",
+                    value_deserializer: Callable[[bytes], object]|None = None,
+                    enable_auto_commit: bool = True):
+    # enable_auto_commit=False - смещения фиксирует вызывающий код через commit_offset после обработки
+    if backend() == "local":
+        return LocalConsumer(*topics, group_id=group_id, auto_offset_reset=auto_offset_reset,
+                             value_deserializer=value_deserializer)
+
+    from kafka import KafkaConsumer
+    return KafkaConsumer(
+        *topics,
+        bootstrap_servers=bootstrap_servers(),
+        value_deserializer=value_deserializer,
+        group_id=group_id,
+        auto_offset_reset=auto_offset_reset,
+        enable_auto_commit=enable_auto_commit
+    )
@@ -0,0 +1,90 @@
+"""
+Prometheus metrics of the ML service, exposed by wrapper.py at /metrics.
+
+Frame-level numbers come from the files main.py writes for every run: per-stage timing
+histograms (--timings-path) and resource usage (--usage-path). They are added up here once
+the run finishes, labelled with the pass ("preview" or "full").
+"""
+import json
+import logging
+import math
+import threading
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import HistogramMetricFamily
+
+logger = logging.getLogger(__name__)
+
+TASKS_IN_FLIGHT = Gauge('ml_tasks_in_flight', 'Tasks being processed by this replica')
+QUEUE_DEPTH = Gauge('ml_task_queue_depth', 'Tasks waiting in video_processing_tasks for the consumer group')
+TASKS = Counter('ml_tasks_total', 'Finished task attempts: completed, retrying, failed or cancelled', ['status'])
+TASK_DURATION = Histogram(
+    'ml_task_duration_seconds', 'Wall time of a main.py run', ['pass'],
+    buckets=(5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, math.inf)
+)
+FRAMES = Counter('ml_frames_processed_total', 'Frames passed through the detector', ['pass'])
+TASK_FPS = Gauge('ml_task_fps', 'Detector frames per second of the last run', ['pass'])
+MODEL_LOAD = Histogram(
+    'ml_model_load_seconds', 'Time to load the detection model in a run',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, math.inf)
+)
+
+# Stages timed per run that are not frame stages
+RUN_STAGES = ('model_load',)
+
+
+class StageLatencyCollector:
+    """ml_stage_latency_seconds: the per-stage histograms of all finished runs added together"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (stage, pass) -> cumulative bucket counts by upper bound and the sum of durations
+        self.buckets: dict[tuple[str, str], dict[str, int]] = {}
+        self.sums: dict[tuple[str, str], float] = {}
+
+    def add(self, stages: dict, pass_name: str):
+        with self.lock:
+            for stage, summary in stages.items():
+                if stage in RUN_STAGES or not summary.get('buckets'):
+                    continue
+                key = (stage, pass_name)
+                buckets = self.buckets.setdefault(key, {})
+                for bound, count in summary['buckets'].items():
+                    buckets[bound] = buckets.get(bound, 0) + count
+                self.sums[key] = self.sums.get(key, 0.0) + summary['total']
+
+    def collect(self):
+        family = HistogramMetricFamily(
+            'ml_stage_latency_seconds', 'Per-frame latency of a processing stage', labels=['stage', 'pass']
+        )
+        with self.lock:
+            for (stage, pass_name), buckets in self.buckets.items():
+                family.add_metric([stage, pass_name], list(buckets.items()), self.sums[(stage, pass_name)])
+        yield family
+
+
+STAGE_LATENCY = StageLatencyCollector()
+REGISTRY.register(STAGE_LATENCY)
+
+
+def read_json(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Run metrics are not available in {path}: {e}")
+        return {}
+
+
+def record_run(timings_path: str, usage: dict, pass_name: str):
+    """Adds a finished main.py run to the metrics"""
+    stages = read_json(timings_path).get('stages', {})
+    STAGE_LATENCY.add(stages, pass_name)
+    if stages.get('model_load', {}).get('count'):
+        MODEL_LOAD.observe(stages['model_load']['total'])
+
+    if usage.get('wall_time') is not None:
+        TASK_DURATION.labels(pass_name).observe(usage['wall_time'])
+    FRAMES.labels(pass_name).inc(usage.get('frames_inferred') or 0)
+    if usage.get('effective_fps') is not None:
+        TASK_FPS.labels(pass_name).set(usage['effective_fps'])
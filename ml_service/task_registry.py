@@ -0,0 +1,162 @@
+"""
+Idempotency of ML tasks across the replicas of the consumer group.
+
+Kafka delivers a task at least once: after a rebalance or a crash before the offset commit the
+same task comes again, possibly to another replica. Every replica claims the task_id in a SQLite
+file on the shared volume before processing it. A claim of a task that is processing elsewhere
+or already finished is refused. The owner refreshes its claim while the task runs, so the claim
+of a replica that died expires after ML_TASK_LEASE seconds and the task can be taken again.
+A task that failed and was scheduled for a retry stays 'retrying' until its next attempt
+comes back from the retry topic; dead_letters.py releases a task to process it anew.
+A cancelled task is 'cancelled' here, so a delivery of it that is still queued is skipped.
+"""
+import os
+import socket
+import sqlite3
+import time
+
+DEFAULT_PATH = '/shared/ml_tasks.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class TaskRegistry:
+    def __init__(self, path: str|None = None, lease: float|None = None):
+        self.path = path or os.getenv('ML_TASK_REGISTRY_PATH', DEFAULT_PATH)
+        self.lease = lease if lease is not None else float(os.getenv('ML_TASK_LEASE', '300'))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = self.connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def connect(self) -> sqlite3.Connection:
+        # A connection per call: the consumer thread and the workers use the registry concurrently
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def claim(self, task_id: str, attempt: int = 1) -> bool:
+        """True if this replica may process the given attempt of the task"""
+        now = time.time()
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                'SELECT status, updated_at, attempts FROM tasks WHERE task_id = ?', (task_id,)
+            ).fetchone()
+            if row is None:
+                connection.execute(
+                    'INSERT INTO tasks (task_id, status, owner, attempts, updated_at) VALUES (?, ?, ?, ?, ?)',
+                    (task_id, 'processing', self.owner, attempt, now)
+                )
+                claimed = True
+            elif row[0] == 'retrying' and row[2] < attempt:
+                # The next attempt of a failed task; a redelivery of an earlier one is still refused
+                connection.execute(
+                    'UPDATE tasks SET status = ?, owner = ?, attempts = ?, updated_at = ? WHERE task_id = ?',
+                    ('processing', self.owner, attempt, now, task_id)
+                )
+                claimed = True
+            elif row[0] == 'processing' and row[1] < now - self.lease:
+                # The owner stopped refreshing the claim: the replica is gone
+                connection.execute(
+                    'UPDATE tasks SET owner = ?, attempts = attempts + 1, updated_at = ? WHERE task_id = ?',
+                    (self.owner, now, task_id)
+                )
+                claimed = True
+            else:
+                claimed = False
+            connection.execute("COMMIT")
+            return claimed
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def heartbeat(self, task_ids: list[str]):
+        """Refreshes the claims of the running tasks"""
+        if not task_ids:
+            return
+        connection = self.connect()
+        try:
+            connection.execute(
+                f'UPDATE tasks SET updated_at = ? WHERE owner = ? AND status = ? '
+                f'AND task_id IN ({", ".join("?" * len(task_ids))})',
+                (time.time(), self.owner, 'processing', *task_ids)
+            )
+        finally:
+            connection.close()
+
+    def finish(self, task_id: str, status: str):
+        """Final status of a task: further deliveries of it are skipped"""
+        connection = self.connect()
+        try:
+            connection.execute(
+                'UPDATE tasks SET status = ?, updated_at = ? WHERE task_id = ? AND owner = ?',
+                (status, time.time(), task_id, self.owner)
+            )
+        finally:
+            connection.close()
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        Marks the task cancelled. True if it is not running anywhere (queued or waiting for a retry)
+        and the caller reports the cancellation; a running task is stopped and reported by its owner
+        """
+        now = time.time()
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                'SELECT status, updated_at FROM tasks WHERE task_id = ?', (task_id,)
+            ).fetchone()
+            if row is None:
+                connection.execute(
+                    'INSERT INTO tasks (task_id, status, owner, attempts, updated_at) VALUES (?, ?, ?, 0, ?)',
+                    (task_id, 'cancelled', self.owner, now)
+                )
+                unowned = True
+            elif row[0] in ('processing', 'retrying'):
+                connection.execute(
+                    'UPDATE tasks SET status = ?, updated_at = ? WHERE task_id = ?', ('cancelled', now, task_id)
+                )
+                # An expired claim has no owner left to report
+                unowned = row[0] == 'retrying' or row[1] < now - self.lease
+            else:
+                unowned = False
+            connection.execute("COMMIT")
+            return unowned
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def status(self, task_id: str) -> str|None:
+        connection = self.connect()
+        try:
+            row = connection.execute('SELECT status FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+
+    def release(self, task_id: str):
+        """Forgets a task, so that it is processed again from the first attempt"""
+        connection = self.connect()
+        try:
+            connection.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+        finally:
+            connection.close()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from messaging import LocalConsumer, LocalProducer, OffsetTracker, rewind
+
+
+class OffsetTrackerTestCase(unittest.TestCase):
+    def test_offset_advances_over_the_contiguous_prefix_only(self):
+        offsets = OffsetTracker()
+        for offset in (5, 6, 7):
+            offsets.start('tasks', 0, offset)
+
+        self.assertIsNone(offsets.done('tasks', 0, 6))
+        self.assertIsNone(offsets.done('tasks', 0, 7))
+        self.assertEqual(offsets.done('tasks', 0, 5), 8)
+
+    def test_unfinished_message_holds_the_later_ones(self):
+        offsets = OffsetTracker()
+        for offset in (1, 2, 3):
+            offsets.start('tasks', 0, offset)
+
+        self.assertEqual(offsets.done('tasks', 0, 1), 2)
+        self.assertIsNone(offsets.done('tasks', 0, 3))
+        self.assertEqual(offsets.done('tasks', 0, 2), 4)
+
+    def test_partitions_are_independent(self):
+        offsets = OffsetTracker()
+        offsets.start('tasks', 0, 10)
+        offsets.start('tasks', 1, 3)
+
+        self.assertEqual(offsets.done('tasks', 1, 3), 4)
+        self.assertEqual(offsets.done('tasks', 0, 10), 11)
+
+
+class RewindTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'messages.sqlite3')
+        self.producer = LocalProducer(path=self.path)
+
+    def send_at(self, timestamp: float, value: bytes):
+        with patch('messaging.time.time', return_value=timestamp):
+            self.producer.send('cancellations', value)
+
+    def test_new_group_replays_messages_since_the_given_time(self):
+        for timestamp, value in ((100, b'old'), (200, b'recent'), (300, b'last')):
+            self.send_at(timestamp, value)
+        consumer = LocalConsumer('cancellations', group_id='replica', poll_interval=0, path=self.path)
+        self.assertEqual(consumer.lag(), 0)
+
+        rewind(consumer, 150)
+
+        self.assertEqual([message.value for message in consumer.fetch()], [b'recent', b'last'])
+
+    def test_rewind_before_the_first_message_replays_all(self):
+        self.send_at(100, b'first')
+        consumer = LocalConsumer('cancellations', group_id='replica', poll_interval=0, path=self.path)
+
+        rewind(consumer, 50)
+
+        self.assertEqual(consumer.lag(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import math
+import unittest
+
+import numpy as np
+
+from traffic_observer.quantile_sketch import QuantileSketch
+
+QUANTILES = (0.0, 0.01, 0.15, 0.5, 0.85, 0.95, 0.99, 1.0)
+
+
+def sketch_of(values, relative_accuracy: float = 0.01) -> QuantileSketch:
+    sketch = QuantileSketch(relative_accuracy)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+class QuantileSketchTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        # Времена проезда с длинным хвостом: от секунд до десятков минут
+        self.values = rng.lognormal(mean=3.0, sigma=1.0, size=5000)
+
+    def assert_within_accuracy(self, sketch: QuantileSketch, values: np.ndarray):
+        for q in QUANTILES:
+            # Скетч отвечает значением ранга floor(q * (n - 1)), как method="lower"
+            expected = np.quantile(values, q, method="lower")
+            self.assertLessEqual(
+                abs(sketch.quantile(q) - expected), sketch.relative_accuracy * expected * (1 + 1e-9), f"q={q}"
+            )
+
+    def test_quantiles_within_relative_accuracy(self):
+        for relative_accuracy in (0.01, 0.05):
+            self.assert_within_accuracy(sketch_of(self.values, relative_accuracy), self.values)
+
+    def test_merged_sketches_within_relative_accuracy(self):
+        merged = QuantileSketch()
+        for chunk in np.array_split(self.values, 7):
+            merged.merge(sketch_of(chunk))
+
+        self.assertEqual(merged.count, len(self.values))
+        self.assert_within_accuracy(merged, self.values)
+        self.assertEqual(merged.buckets, sketch_of(self.values).buckets)
+
+    def test_zeros_and_bounds(self):
+        values = np.array([0.0, 0.0, 0.0, 2.0, 4.0])
+        sketch = sketch_of(values)
+
+        self.assertEqual(sketch.quantile(0.5), 0.0)
+        self.assertEqual(sketch.quantile(1.0), 4.0)
+        self.assertTrue(math.isnan(QuantileSketch().quantile(0.5)))
+
+    def test_merge_needs_the_same_accuracy(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import math
+import unittest
+
+import numpy as np
+
+from traffic_observer.period import PeriodAggregate
+from traffic_observer.running_stats import RunningStats
+
+
+def accumulate(values) -> RunningStats:
+    stats = RunningStats()
+    for value in values:
+        stats.add(value)
+    return stats
+
+
+class RunningStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        # Большое смещение проверяет устойчивость: наивная сумма квадратов на нём теряет точность
+        self.values = np.random.default_rng(3).normal(1e6, 5.0, size=1000)
+
+    def assert_matches(self, stats: RunningStats, values: np.ndarray):
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.total, values.sum(), delta=1e-6 * abs(values.sum()))
+        self.assertAlmostEqual(stats.mean, values.mean(), delta=1e-9 * abs(values.mean()))
+        self.assertAlmostEqual(stats.variance, values.var(ddof=1), delta=1e-9 * values.var(ddof=1))
+        self.assertAlmostEqual(stats.std, values.std(ddof=1), delta=1e-9 * values.std(ddof=1))
+
+    def test_welford_matches_numpy(self):
+        self.assert_matches(accumulate(self.values), self.values)
+
+    def test_merge_of_split_samples_matches_numpy(self):
+        for parts in ([100, 900], [1, 999], [10, 0, 300, 690]):
+            merged = RunningStats()
+            for chunk in np.split(self.values, np.cumsum(parts)[:-1]):
+                merged.merge(accumulate(chunk))
+            self.assert_matches(merged, self.values)
+
+    def test_merge_into_empty_and_of_empty(self):
+        stats = accumulate(self.values[:10])
+        empty = RunningStats()
+        empty.merge(stats)
+        stats.merge(RunningStats())
+
+        self.assert_matches(empty, self.values[:10])
+        self.assert_matches(stats, self.values[:10])
+
+    def test_variance_needs_two_values(self):
+        self.assertTrue(math.isnan(RunningStats().variance))
+        self.assertTrue(math.isnan(accumulate([4.0]).variance))
+        self.assertEqual(accumulate([4.0]).mean, 4.0)
+
+
+class PeriodAggregateTestCase(unittest.TestCase):
+    def test_merge_of_periods_matches_one_aggregate(self):
+        rng = np.random.default_rng(5)
+        vehicles = list(zip(rng.choice(["car", "truck"], size=300), rng.uniform(5, 60, size=300), rng.random(300) < 0.3))
+        whole = PeriodAggregate(["car", "truck"])
+        first, second = PeriodAggregate(["car"]), PeriodAggregate(["car", "truck"])
+        for index, vehicle in enumerate(vehicles):
+            whole.add_vehicle(*vehicle)
+            (first if index < 120 else second).add_vehicle(*vehicle)
+
+        first.merge(second)
+
+        travel = np.array([travel_time for _, travel_time, _ in vehicles])
+        free = np.array([travel_time for _, travel_time, is_free in vehicles if is_free])
+        for merged in (whole, first):
+            self.assertAlmostEqual(merged.travel_time.mean, travel.mean())
+            self.assertAlmostEqual(merged.travel_time.variance, travel.var(ddof=1))
+            self.assertAlmostEqual(merged.free_time.mean, free.mean())
+            for class_name in ("car", "truck"):
+                times = np.array([t for name, t, _ in vehicles if name == class_name])
+                self.assertEqual(merged.classwise_travel_time[class_name].count, len(times))
+                self.assertAlmostEqual(merged.classwise_travel_time[class_name].variance, times.var(ddof=1))
+            self.assertEqual(merged.travel_time_sketch.count, len(vehicles))
+
+
+if __name__ == "__main__":
+    unittest.main()
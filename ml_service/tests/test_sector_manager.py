@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+
+from benchmarks.detections import ReplayDetector
+from data_loader.data_sector import DataSector
+from traffic_observer.sector_manager import SectorManager
+
+VEHICLE_CLASSES = ["bus", "car"]
+FRAME = np.zeros((100, 400, 3), dtype=np.uint8)
+
+
+def rectangle(x0, x1):
+    return [[x0, 0], [x1, 0], [x1, 100], [x0, 100]]
+
+
+def crossing(track_id: int):
+    # Один легковой ТС проезжает от стартовой области до полосы-финиша, по кадру на позицию
+    for center in (40, 90, 160, 230, 290, 350):
+        yield np.array([[center - 10, 40, center + 10, 60]], dtype=float), [track_id], [1]
+
+
+def make_manager(detections) -> SectorManager:
+    sector = DataSector(1, rectangle(80, 100), rectangle(280, 300), [rectangle(280, 300)], 1, 0.1, 60)
+    return SectorManager(
+        [sector], VEHICLE_CLASSES, 1, 1000, {"bus": 3, "car": 1}, [100, 400], None,
+        detector_factory=lambda imgsize, timings: ReplayDetector(detections, VEHICLE_CLASSES),
+    )
+
+
+class SamplingSpansTestCase(unittest.TestCase):
+    def test_track_ids_reused_after_seek_are_counted(self):
+        # После перемотки трекер снова нумерует треки с 1: тот же track_id - уже другое ТС
+        detections = [*crossing(1), *crossing(1)]
+        sector_manager = make_manager(detections)
+
+        for span_start in (0, 100):
+            sector_manager.seek(span_start)
+            for _ in range(len(detections) // 2):
+                sector_manager.update(FRAME.copy())
+            sector_manager.close_period()
+
+        periods = sector_manager.sectors[0].periods_data
+        self.assertEqual(len(periods), 2)
+        self.assertEqual([period.classwise_traveled_count["car"] for period in periods], [1, 1])
+        self.assertEqual([period.start_time for period in periods], [0, 100])
+        self.assertEqual(periods[0].ids_travel_time, periods[1].ids_travel_time)
+        self.assertEqual([period.aggregate.travel_time.count for period in periods], [1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import statistics
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from data_manager import stats_engine
+from traffic_observer.period import Period
+
+SECS_IN_HOUR = 3600
+VEHICLE_CLASSES = ("car", "truck", "bus")
+SIZE_COEFFS = {"car": 1, "truck": 2.5, "bus": 3}
+
+
+# Скалярные формулы funcs.py до перехода на stats_engine: эталон, с которым сверяется векторный расчёт
+
+def legacy_traffic_intensity(classwise_traveled_count, vehicle_size_coeffs, observation_time):
+    s = 0
+    for cls_name, traveled_count in classwise_traveled_count.items():
+        s += traveled_count * vehicle_size_coeffs.get(cls_name, 1)
+    return s / (observation_time / SECS_IN_HOUR)
+
+
+def legacy_mean_time(vehicles_time):
+    try:
+        return statistics.mean(vehicles_time) / SECS_IN_HOUR
+    except statistics.StatisticsError:
+        return float("nan")
+
+
+def legacy_time_index(vehicles_travel_time, vehicles_free_time):
+    free_time = legacy_mean_time(vehicles_free_time)
+    if free_time != 0:
+        return legacy_mean_time(vehicles_travel_time) / free_time
+    return float("nan")
+
+
+def legacy_traffic_stats(sector, size_coeffs):
+    # SectorManager.traffic_stats до stats_engine, по столбцам
+    columns = {name: [] for name in (
+        "Интенсивность траффика", "Среднее время проезда сек", "Средняя скорость движения км/ч",
+        "Плотность траффика", "Среднее своб. время сек", "Средняя задержка сек", "Временной индекс",
+        "Время наблюдения сек",
+    )}
+    for period in sector.periods_data:
+        travel_times = list(period.ids_travel_time.values())
+        free_times = list(period.free_travel_time.values())
+        ti = legacy_traffic_intensity(period.classwise_traveled_count, size_coeffs, period.observation_time)
+        travel = legacy_mean_time(travel_times)
+        free = legacy_mean_time(free_times)
+        speed = sector.length / travel
+        columns["Интенсивность траффика"].append(ti)
+        columns["Среднее время проезда сек"].append(travel * SECS_IN_HOUR)
+        columns["Средняя скорость движения км/ч"].append(speed)
+        columns["Плотность траффика"].append(ti / (sector.lanes_count * speed))
+        columns["Среднее своб. время сек"].append(free * SECS_IN_HOUR)
+        columns["Средняя задержка сек"].append((travel - free) * SECS_IN_HOUR)
+        columns["Временной индекс"].append(legacy_time_index(travel_times, free_times))
+        columns["Время наблюдения сек"].append(period.observation_time)
+    return columns
+
+
+def make_period(travel_times, free_times, classes, observation_time=60.0, start_time=0.0):
+    counts = {name: 0 for name in VEHICLE_CLASSES}
+    for name in classes:
+        counts[name] += 1
+    return Period(
+        dict(enumerate(travel_times)), counts, dict(enumerate(free_times)), observation_time, start_time
+    )
+
+
+def make_sector(sector_id, periods, length=0.25, lanes_count=2):
+    return SimpleNamespace(id=sector_id, periods_data=periods, length=length, lanes_count=lanes_count)
+
+
+class SectorTrafficStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        busy = []
+        for index in range(4):
+            travel = rng.uniform(8, 40, size=25)
+            classes = rng.choice(VEHICLE_CLASSES, size=25)
+            busy.append(make_period(travel, travel[travel < 15], classes, 60.0 - index, 60.0 * index))
+        self.sectors = [
+            make_sector(1, busy),
+            # Один ТС без свободного проезда и период без ТС
+            make_sector(2, [make_period([12.5], [], ["truck"]), make_period([], [], [], 30.0, 60.0)], lanes_count=1),
+            # Сектор без закрытых периодов
+            make_sector(3, []),
+        ]
+
+    def test_matches_the_scalar_formulas(self):
+        frames = stats_engine.sector_traffic_stats(self.sectors, VEHICLE_CLASSES, SIZE_COEFFS)
+
+        self.assertEqual(len(frames), len(self.sectors))
+        for sector, frame in zip(self.sectors, frames):
+            for column, expected in legacy_traffic_stats(sector, SIZE_COEFFS).items():
+                np.testing.assert_allclose(
+                    frame[column].to_numpy(dtype=float), np.array(expected, dtype=float),
+                    rtol=1e-12, equal_nan=True, err_msg=f"sector {sector.id}: {column}"
+                )
+
+    def test_single_vehicle_and_empty_periods(self):
+        frame = stats_engine.sector_traffic_stats(self.sectors, VEHICLE_CLASSES, SIZE_COEFFS)[1]
+
+        self.assertAlmostEqual(frame["Среднее время проезда сек"].iloc[0], 12.5)
+        self.assertAlmostEqual(frame["Время проезда p50 сек"].iloc[0], 12.5, delta=12.5 * 0.01)
+        # СКО по одному ТС не определено, период без ТС не имеет средних
+        self.assertTrue(np.isnan(frame["СКО времени проезда сек"].iloc[0]))
+        self.assertEqual(frame["Интенсивность траффика"].iloc[1], 0)
+        self.assertTrue(np.isnan(frame["Средняя скорость движения км/ч"].iloc[1]))
+        self.assertEqual(list(frame["Конец периода сек"]), [60.0, 90.0])
+
+    def test_std_of_travel_time(self):
+        frame = stats_engine.sector_traffic_stats(self.sectors, VEHICLE_CLASSES, SIZE_COEFFS)[0]
+
+        for period, std in zip(self.sectors[0].periods_data, frame["СКО времени проезда сек"]):
+            self.assertAlmostEqual(std, statistics.stdev(period.ids_travel_time.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
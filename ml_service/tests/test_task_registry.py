@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+import unittest
+
+from task_registry import TaskRegistry
+
+
+class TaskRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'tasks.sqlite3')
+
+    def replica(self, owner: str, lease: float = 300) -> TaskRegistry:
+        registry = TaskRegistry(self.path, lease)
+        registry.owner = owner
+        return registry
+
+    def test_live_claim_is_refused_to_other_replicas(self):
+        first, second = self.replica('first'), self.replica('second')
+
+        self.assertTrue(first.claim('task'))
+        self.assertFalse(second.claim('task'))
+        self.assertEqual(second.status('task'), 'processing')
+
+    def test_expired_claim_is_taken_over(self):
+        first, second = self.replica('first', lease=0.05), self.replica('second', lease=0.05)
+        self.assertTrue(first.claim('task'))
+
+        time.sleep(0.1)
+
+        self.assertTrue(second.claim('task'))
+        self.assertFalse(first.claim('task'))
+
+    def test_heartbeat_keeps_the_claim(self):
+        first, second = self.replica('first', lease=0.2), self.replica('second', lease=0.2)
+        self.assertTrue(first.claim('task'))
+
+        for _ in range(3):
+            time.sleep(0.1)
+            first.heartbeat(['task'])
+
+        self.assertFalse(second.claim('task'))
+
+    def test_finished_task_is_not_claimed_again(self):
+        first, second = self.replica('first', lease=0), self.replica('second', lease=0)
+        first.claim('task')
+        first.finish('task', 'completed')
+
+        self.assertFalse(second.claim('task'))
+        self.assertEqual(second.status('task'), 'completed')
+
+    def test_next_attempt_of_a_retrying_task_is_claimed_once(self):
+        first, second = self.replica('first'), self.replica('second')
+        first.claim('task')
+        first.finish('task', 'retrying')
+
+        self.assertFalse(second.claim('task', attempt=1))
+        self.assertTrue(second.claim('task', attempt=2))
+        self.assertFalse(first.claim('task', attempt=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
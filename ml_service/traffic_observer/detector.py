@@ -1,6 +1,13 @@
+import time
+
+from diagnostics.stage_timings import StageTimings
+
+
 class Detector():
-    def __init__(self, model, imgsize):
+    def __init__(self, model, imgsize, timings: StageTimings|None = None):
         self.model = model
+        self.class_names = model.names
+        self.timings = timings or StageTimings()
 
         # Изменение размера изображения до кратного 32
         height, width = imgsize
@@ -12,7 +19,15 @@ class Detector():
         self,
         frame: tuple,
     ):
+        track_start = time.perf_counter()
         track_results = self.model.track(frame, persist=True, imgsz=self.imgsize)
+        elapsed = time.perf_counter() - track_start
+
+        # Модель сама замеряет подготовку, инференс и постобработку (в мс), остальное - трекер
+        inference = sum(track_results[0].speed.values()) / 1000
+        self.timings.add("inference", inference)
+        self.timings.add("tracking", max(elapsed - inference, 0.0))
+
         if track_results[0].boxes.id is not None:
             boxes = track_results[0].boxes.xyxy.cpu()
             track_ids = track_results[0].boxes.id.int().cpu().tolist()
@@ -20,3 +35,10 @@ class Detector():
             return boxes, track_ids, classes
         else:
             return None
+
+    def reset_tracker(self):
+        # Сброс треков, например после перемотки видео: старые треки не относятся к новому кадру
+        predictor = self.model.predictor
+        if predictor is not None:
+            for tracker in getattr(predictor, "trackers", []):
+                tracker.reset()
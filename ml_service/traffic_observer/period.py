@@ -1,9 +1,62 @@
+from traffic_observer.running_stats import RunningStats
+from traffic_observer.quantile_sketch import QuantileSketch
+
+
+class PeriodAggregate:
+    # Агрегаты периода, обновляемые по мере проезда ТС через сектор.
+    # Память не зависит от кол-ва ТС, показатели открытого периода доступны в любой момент
+    def __init__(self, vehicle_classes):
+        self.travel_time = RunningStats()
+        self.free_time = RunningStats()
+        self.classwise_travel_time = {class_name: RunningStats() for class_name in vehicle_classes}
+
+        # Скетчи распределения времени проезда для перцентилей, общий и по классам
+        self.travel_time_sketch = QuantileSketch()
+        self.classwise_travel_time_sketch = {class_name: QuantileSketch() for class_name in vehicle_classes}
+
+    def add_vehicle(self, class_name: str, travel_time: float, is_free: bool):
+        self.travel_time.add(travel_time)
+        self.travel_time_sketch.add(travel_time)
+        if is_free:
+            self.free_time.add(travel_time)
+        if class_name not in self.classwise_travel_time:
+            self.classwise_travel_time[class_name] = RunningStats()
+            self.classwise_travel_time_sketch[class_name] = QuantileSketch()
+        self.classwise_travel_time[class_name].add(travel_time)
+        self.classwise_travel_time_sketch[class_name].add(travel_time)
+
+    def merge(self, other: "PeriodAggregate"):
+        self.travel_time.merge(other.travel_time)
+        self.travel_time_sketch.merge(other.travel_time_sketch)
+        self.free_time.merge(other.free_time)
+        for class_name, stats in other.classwise_travel_time.items():
+            if class_name not in self.classwise_travel_time:
+                self.classwise_travel_time[class_name] = RunningStats()
+                self.classwise_travel_time_sketch[class_name] = QuantileSketch()
+            self.classwise_travel_time[class_name].merge(stats)
+            self.classwise_travel_time_sketch[class_name].merge(other.classwise_travel_time_sketch[class_name])
+
+
 class Period:
-    def __init__(self, ids_travel_time, classwise_traveled_count, free_travel_time, observation_time):
+    def __init__(self, ids_travel_time, classwise_traveled_count, free_travel_time, observation_time, start_time=0, aggregate: PeriodAggregate|None = None):
         # TODO: set type hints
+        # Времена каждого ТС; пустые, если хранение по ТС отключено (keep-vehicle-times)
         self.ids_travel_time = ids_travel_time
         self.classwise_traveled_count = classwise_traveled_count
         self.free_travel_time = free_travel_time
         
         # Нужно чтобы использовать время из таймера, так как могло пройти меньше времени, чем observation-time
-        self.observation_time = observation_time 
\ No newline at end of file
+        self.observation_time = observation_time
+
+        # Момент видео, с которого начался период. В секундах
+        self.start_time = start_time
+
+        # Агрегаты периода. Для периодов без агрегатов они считаются по временам ТС
+        if aggregate is None:
+            aggregate = PeriodAggregate(classwise_traveled_count.keys())
+            for travel_time in ids_travel_time.values():
+                aggregate.travel_time.add(travel_time)
+                aggregate.travel_time_sketch.add(travel_time)
+            for free_time in free_travel_time.values():
+                aggregate.free_time.add(free_time)
+        self.aggregate = aggregate
@@ -0,0 +1,57 @@
+import math
+
+# Значения не больше этого считаются нулевыми (логарифм не определён)
+MIN_VALUE = 1e-9
+
+
+class QuantileSketch:
+    # Объединяемый скетч квантилей с относительной точностью (DDSketch).
+    # Значения считаются в логарифмических корзинах: квантиль находится с точностью
+    # relative_accuracy, а число корзин зависит только от диапазона значений, не от их кол-ва
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        if value <= MIN_VALUE:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "QuantileSketch"):
+        # Объединение скетчей, например всех периодов за сутки
+        if other.gamma != self.gamma:
+            raise ValueError("Объединять можно только скетчи с одинаковой точностью")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        # q от 0 до 1. NaN для пустого скетча
+        if self.count == 0:
+            return float("nan")
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+
+        running = self.zero_count
+        for key in sorted(self.buckets):
+            running += self.buckets[key]
+            if running > rank:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
@@ -0,0 +1,39 @@
+import math
+
+
+class RunningStats:
+    # Накопитель без хранения значений: кол-во, сумма, среднее и дисперсия по Уэлфорду
+    __slots__ = ("count", "total", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: "RunningStats"):
+        # Объединение накопителей (формула Чана), например нескольких периодов
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.total += other.total
+        self.count = count
+
+    @property
+    def variance(self) -> float:
+        # Выборочная дисперсия, NaN пока значений меньше двух
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
@@ -5,11 +5,13 @@ import cv2
 import logging
 
 from funcs import *
-from traffic_observer.period import Period
+from data_manager.stats_engine import sector_traffic_stats, sector_classwise_stats, sector_percentile_summary
+from traffic_observer.period import Period, PeriodAggregate
 from traffic_observer.step_timer import StepTimer
 from traffic_observer.region import Region
 from traffic_observer.detector import Detector
 from traffic_observer.lane import Lane
+from diagnostics.stage_timings import StageTimings
 
 from data_loader.data_sector import DataSector
 from ultralytics import YOLO
@@ -17,6 +19,7 @@ from ultralytics.utils.plotting import Annotator
 
 class Sector:
     def __init__(self, data_sector: DataSector, vehicle_classes):
+        self.id = data_sector.id
         self.start_region: Region = Region(data_sector.start_points)
         self.lanes: list[Lane] = [Lane(lane_points) for lane_points in data_sector.lanes_points]
         self.lanes_count: int = data_sector.lanes_count
@@ -28,6 +31,14 @@ class Sector:
         self.classwise_traveled_count = {class_name: 0 for class_name in vehicle_classes}
         self.ids_start_time = {}
         self.ids_blacklist = set()
+        self.aggregate = PeriodAggregate(vehicle_classes)
+
+        # Агрегаты по корзинам базовой длительности (bucket-time) за всё время, ключ - номер корзины
+        self.buckets: dict[int, PeriodAggregate] = {}
+
+    def open_period(self, observation_time: float, start_time: float) -> Period:
+        # Снимок текущего (незакрытого) периода без копирования времён ТС
+        return Period({}, self.classwise_traveled_count, {}, observation_time, start_time, self.aggregate)
 
 class SectorManager:
     def __init__(
@@ -38,16 +49,34 @@ class SectorManager:
             observation_time: int,
             vechicle_size_coeffs: dict[str, float],
             imgsize: tuple,
-            model_path:str
+            model_path:str,
+            start_time: float = 0,
+            keep_vehicle_times: bool = True,
+            bucket_time: float = 10,
+            timings: StageTimings|None = None,
+            detector_factory: Callable[[list[int], StageTimings], Detector]|None = None
     ):
         self.size_coeffs = vechicle_size_coeffs
         self.vehicle_classes = vehicle_classes
         self.observation_period = observation_time
+        self.keep_vehicle_times = keep_vehicle_times
+        self.bucket_time = bucket_time
+        # Подписчики на закрытие периода: получают по закрытому периоду на каждый сектор
+        self.period_listeners: list[Callable[[list[Period]], None]] = []
+        # Реально просмотренное время в каждой корзине (с учётом перемоток и выборочных замеров)
+        self.bucket_observed_time: dict[int, float] = {}
         self.period_timer = StepTimer(time_step)
-        model = YOLO(model_path)
-        self.class_names=model.names
-
-        self.detector = Detector(model, imgsize)
+        self.period_timer.align(start_time)
+        self.timings = timings or StageTimings()
+        # Свой детектор (например, заглушка для бенчмарков) вместо YOLO
+        if detector_factory is not None:
+            self.detector = detector_factory(imgsize, self.timings)
+        else:
+            # Время загрузки модели - отдельная строка замеров (model_load), не этап кадра
+            with self.timings.stage("model_load"):
+                model = YOLO(model_path)
+            self.detector = Detector(model, imgsize, self.timings)
+        self.class_names = self.detector.class_names
         self.sectors = [Sector(data_sector, self.vehicle_classes) for data_sector in data_sectors]
 
     def __annotate(self, im0, annotator, box, track_id, cls):
@@ -74,40 +103,53 @@ class SectorManager:
 
 
     def update(self, frame: cv2.typing.MatLike):
-        boxes, track_ids, classes = self.detector.track(frame)
-
-        # Обработка детекций
-        annotator = Annotator(frame, line_width=1, example=str(self.class_names))
-        for box, track_id, track_class in zip(boxes, track_ids, classes):
+        detections = self.detector.track(frame)
+        # На кадре может не оказаться ни одного трека (особенно в низком разрешении)
+        boxes, track_ids, classes = detections if detections is not None else ([], [], [])
+
+        # Подсчёт детекций: один проход детектора обслуживает все сектора
+        with self.timings.stage("regions"):
+            for box, track_id, track_class in zip(boxes, track_ids, classes):
+                for sector in self.sectors:
+                    # TODO optimize: count tracket only for start regions
+                    # if tracklet is not tracked in sector, then only in end region
+                    sector.start_region.count_tracklet(box, track_id, track_class)
+
+        # Отрисовка областей всех секторов один раз за кадр и подписи треков
+        with self.timings.stage("annotation"):
             for sector in self.sectors:
-                # TODO: make method for those
-                # TODO optimize: count tracket only for start regions
-                # if tracklet is not tracked in sector, then only in end region
-                sector.start_region.count_tracklet(box, track_id, track_class)
                 sector.start_region.draw_regions(frame)
                 for lane in sector.lanes:
                     lane.draw_lane(frame)
-            
-            #self.__annotate(frame, annotator, box, track_id, track_class)
-            self.__annotate_debug(frame, annotator, box, track_id, track_class, sector, self.__get_vehicle_travel_time_debug)
- 
-        logging.info(f"Обработан кадр по времени {self.period_timer.time}")
+
+            annotator = Annotator(frame, line_width=1, example=str(self.class_names))
+            for box, track_id, track_class in zip(boxes, track_ids, classes):
+                #self.__annotate(frame, annotator, box, track_id, track_class)
+                self.__annotate_debug(frame, annotator, box, track_id, track_class, self.__get_vehicle_sector(track_id), self.__get_vehicle_travel_time_debug)
+
+        # Покадровые строки только в DEBUG: ход обработки main.py сообщает строками PROGRESS
+        logging.debug(f"Обработан кадр по времени {self.period_timer.time}")
+
+        # Кадр покрывает шаг таймера в своей корзине
+        bucket = self.__bucket_key(self.period_timer.unresettable_time)
+        self.bucket_observed_time[bucket] = self.bucket_observed_time.get(bucket, 0) + self.period_timer.step
 
         # Обновление таймера и периода
         self.period_timer.step_forward()
         if self.period_timer.time >= self.observation_period:
             self.new_period()
 
-        # Итерация по секторам и регионам
-        self.__iterate_through_regions()
+        with self.timings.stage("lanes"):
+            # Итерация по секторам и регионам
+            self.__iterate_through_regions()
 
-        # Обработка линий
-        self.__update_lanes(boxes, track_ids)
+            # Обработка линий
+            self.__update_lanes(boxes, track_ids)
 
-        # Итерация по линиям
-        self.__iterate_through_lanes(classes, track_ids)
+            # Итерация по линиям
+            self.__iterate_through_lanes(classes, track_ids)
 
-        logging.info(f"Обновлены сектора по времени {self.period_timer.time}")
+        logging.debug(f"Обновлены сектора по времени {self.period_timer.time}")
 
     def __update_lanes(self, boxes, track_ids):
         # Update delay and tracklet intersections for each line in each sector
@@ -139,96 +181,176 @@ class SectorManager:
                         sector.ids_travel_time[vehicle_id] = dt
 
                         # Update free travel time
-                        if lane.delay < 10:
+                        is_free = lane.delay < 10
+                        if is_free:
                             sector.ids_free_time[vehicle_id] = dt
                         lane.delay = 0
 
                         track_class = classes[track_ids.index(vehicle_id)]
                         class_name = self.class_names[track_class]
                         sector.classwise_traveled_count[class_name] += 1
+                        sector.aggregate.add_vehicle(class_name, dt, is_free)
+                        self.__get_bucket(sector).add_vehicle(class_name, dt, is_free)
                         sector.ids_blacklist.add(vehicle_id)         
 
+    def __bucket_key(self, video_time: float) -> int:
+        return int(video_time // self.bucket_time)
+
+    def __get_bucket(self, sector: Sector) -> PeriodAggregate:
+        # Корзина текущего момента видео
+        key = self.__bucket_key(self.period_timer.unresettable_time)
+        if key not in sector.buckets:
+            sector.buckets[key] = PeriodAggregate(self.vehicle_classes)
+        return sector.buckets[key]
+
+    def seek(self, video_time: float):
+        # Перемотка видео: незавершённые проезды и треки относятся к прежнему кадру, сбрасываем их.
+        # Сброс трекера снова нумерует треки с 1, поэтому и чёрный список прежних ID больше не действует
+        self.period_timer.align(video_time)
+        self.detector.reset_tracker()
+        for sector in self.sectors:
+            sector.ids_start_time.clear()
+            sector.ids_blacklist.clear()
+            sector.start_region.counted_ids.clear()
+            for lane in sector.lanes:
+                lane.counted_ids.clear()
+                lane.delay = 0
+
+    def close_period(self):
+        # Закрывает текущий период, если с начала периода прошло время
+        if self.period_timer.time > 0:
+            self.new_period()
+
+    def add_period_listener(self, listener: Callable[[list[Period]], None]):
+        self.period_listeners.append(listener)
+
     def new_period(self):
         # Reset the period timer and store the data for each sector
         for sector in self.sectors:
+            # Per-vehicle times are kept only on demand, the aggregates are always stored
             sector.periods_data.append(Period(
-                sector.ids_travel_time.copy(),
+                sector.ids_travel_time.copy() if self.keep_vehicle_times else {},
                 sector.classwise_traveled_count.copy(),
-                sector.ids_free_time.copy(),
-                self.period_timer.time
+                sector.ids_free_time.copy() if self.keep_vehicle_times else {},
+                self.period_timer.time,
+                self.period_timer.unresettable_time - self.period_timer.time,
+                sector.aggregate
             ))
 
             sector.ids_travel_time.clear()
-            sector.ids_free_time.copy()
+            sector.ids_free_time.clear()
             sector.classwise_traveled_count = {class_name: 0 for class_name in self.vehicle_classes}
+            sector.aggregate = PeriodAggregate(self.vehicle_classes)
         self.period_timer.reset()
 
         for sector in self.sectors: # TODO: use another more frequently called method for long periods of time
             sector.start_region.counted_ids.clear()
             for lane in sector.lanes:
                 lane.counted_ids.clear()
-            
+
+        # Сообщаем о закрытых периодах сразу, не дожидаясь конца видео
+        closed_periods = [sector.periods_data[-1] for sector in self.sectors]
+        for listener in self.period_listeners:
+            listener(closed_periods)
+
+    def structure_sizes(self) -> dict[str, int]:
+        # Размеры накапливающихся структур для поиска роста памяти на длинных видео
+        return {
+            "ids_travel_time": sum(len(sector.ids_travel_time) for sector in self.sectors),
+            "ids_free_time": sum(len(sector.ids_free_time) for sector in self.sectors),
+            "ids_start_time": sum(len(sector.ids_start_time) for sector in self.sectors),
+            "ids_blacklist": sum(len(sector.ids_blacklist) for sector in self.sectors),
+            "region_counted_ids": sum(len(sector.start_region.counted_ids) for sector in self.sectors),
+            "lane_counted_ids": sum(len(lane.counted_ids) for sector in self.sectors for lane in sector.lanes),
+            "periods": sum(len(sector.periods_data) for sector in self.sectors),
+            "period_vehicle_times": sum(
+                len(period.ids_travel_time) + len(period.free_travel_time)
+                for sector in self.sectors for period in sector.periods_data
+            ),
+            "buckets": sum(len(sector.buckets) for sector in self.sectors),
+        }
+
+    def period_stats(self, periods: list[Period]) -> List[pd.DataFrame]:
+        # Показатели отдельных периодов (по одному на сектор)
+        return sector_traffic_stats(self.sectors, self.vehicle_classes, self.size_coeffs, [[period] for period in periods])
+
     def traffic_stats(self) -> List[pd.DataFrame]:
-        dataframes = []
-        for sector in self.sectors:
-            stats = {
-                "Интенсивность траффика": [],
-                "Среднее время проезда сек": [],
-                "Средняя скорость движения км/ч": [],
-                "Плотность траффика": [],
-                "Среднее своб. время сек": [],
-                "Средняя задержка сек": [],
-                "Временной индекс": [],
-                "Время наблюдения сек": []
-            }
-            for period in sector.periods_data:
-                stats["Интенсивность траффика"].append(traffic_intensity(
-                    period.classwise_traveled_count,
-                    self.size_coeffs,
-                    period.observation_time
-                ))
-
-                vehicles_travel_time = period.ids_travel_time.values()
-                vehicles_free_time = period.free_travel_time.values()
-                stats["Среднее время проезда сек"].append(mean_travel_time(vehicles_travel_time)*SECS_IN_HOUR)
-                stats["Средняя скорость движения км/ч"].append(mean_vehicle_speed(vehicles_travel_time, sector.length))
-
-                stats["Плотность траффика"].append(traffic_density(
-                    period.classwise_traveled_count,
-                    self.size_coeffs,
-                    vehicles_travel_time,
-                    sector.length,
-                    period.observation_time,
-                    lane_count=sector.lanes_count
-                ))
-
-                stats["Среднее своб. время сек"].append(mean_free_time(
-                    vehicles_free_time
-                )*SECS_IN_HOUR)
-                stats["Средняя задержка сек"].append(mean_vehicle_delay(
-                    vehicles_travel_time,
-                    vehicles_free_time
-                )*SECS_IN_HOUR)
-                stats["Временной индекс"].append(time_index(
-                    vehicles_travel_time,
-                    vehicles_free_time
-                ))
-
-                stats["Время наблюдения сек"].append(period.observation_time)
-            dataframes.append(pd.DataFrame(stats))
-
-        return dataframes
+        # Все показатели всех периодов всех секторов считаются одним векторным проходом
+        return sector_traffic_stats(self.sectors, self.vehicle_classes, self.size_coeffs)
+
+    def open_period_stats(self) -> List[pd.DataFrame]:
+        # Показатели текущего незакрытого периода по агрегатам, без пересчёта по ТС
+        start_time = self.period_timer.unresettable_time - self.period_timer.time
+        periods = [[sector.open_period(self.period_timer.time, start_time)] for sector in self.sectors]
+        return sector_traffic_stats(self.sectors, self.vehicle_classes, self.size_coeffs, periods)
 
     def classwise_stats(self) -> List[pd.DataFrame]:
-        dataframes = []
+        return sector_classwise_stats(self.sectors, self.vehicle_classes)
+
+    def window_stats(self, window: float, step: float|None = None) -> List[pd.DataFrame]:
+        # Показатели по окнам произвольной длины, собранным из корзин за один проход видео.
+        # step=None - смежные окна, step < window - скользящие окна
+        step = step or window
+        per_window = round(window / self.bucket_time)
+        per_step = round(step / self.bucket_time)
+        if per_window < 1 or per_step < 1 or per_window * self.bucket_time != window or per_step * self.bucket_time != step:
+            raise ValueError(f"Окно и шаг должны быть кратны bucket-time ({self.bucket_time} сек)")
+
+        periods_by_sector = [[] for _ in self.sectors]
+        if self.bucket_observed_time:
+            first = min(self.bucket_observed_time) // per_step * per_step
+            last = max(self.bucket_observed_time)
+            for start in range(first, last + 1, per_step):
+                keys = range(start, start + per_window)
+                observed = sum(self.bucket_observed_time.get(key, 0) for key in keys)
+                # Окна целиком из пропущенных отрезков не показываем
+                if observed == 0:
+                    continue
+
+                for sector, periods in zip(self.sectors, periods_by_sector):
+                    aggregate = PeriodAggregate(self.vehicle_classes)
+                    for key in keys:
+                        if key in sector.buckets:
+                            aggregate.merge(sector.buckets[key])
+                    counts = {name: stats.count for name, stats in aggregate.classwise_travel_time.items()}
+                    periods.append(Period({}, counts, {}, observed, start * self.bucket_time, aggregate))
+
+        return sector_traffic_stats(self.sectors, self.vehicle_classes, self.size_coeffs, periods_by_sector)
+
+    def bucket_table(self) -> pd.DataFrame:
+        # Корзины всех секторов в плоском виде: из них любые окна собираются и вне ML-сервиса
+        rows = []
         for sector in self.sectors:
-            stats = {class_name: [] for class_name in self.vehicle_classes}
-            for period in sector.periods_data:
-                for class_name in self.vehicle_classes:
-                    stats[class_name].append(period.classwise_traveled_count[class_name])
-            dataframes.append(pd.DataFrame(stats))
-
-        return dataframes
+            for key in sorted(self.bucket_observed_time):
+                aggregate = sector.buckets.get(key) or PeriodAggregate(self.vehicle_classes)
+                counts = {name: stats.count for name, stats in aggregate.classwise_travel_time.items()}
+                row = {
+                    "sector_id": sector.id,
+                    "bucket_start": key * self.bucket_time,
+                    "bucket_time": self.bucket_time,
+                    "observed_time": self.bucket_observed_time[key],
+                    "sector_length": sector.length,
+                    "lanes_count": sector.lanes_count,
+                    "weighted_count": sum(count * self.size_coeffs.get(name, 1) for name, count in counts.items()),
+                    "travel_count": aggregate.travel_time.count,
+                    "travel_sum": aggregate.travel_time.total,
+                    "free_count": aggregate.free_time.count,
+                    "free_sum": aggregate.free_time.total,
+                }
+                row.update({f"count_{name}": counts.get(name, 0) for name in self.vehicle_classes})
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def percentile_summary(self) -> pd.DataFrame:
+        # Перцентили времени проезда и скорости за всё время по секторам и классам
+        return sector_percentile_summary(self.sectors, self.vehicle_classes)
+
+    def __get_vehicle_sector(self, vehicle_id: int) -> Sector:
+        # Sector in which the vehicle is being timed, the first one if none
+        for sector in self.sectors:
+            if vehicle_id in sector.ids_start_time or vehicle_id in sector.ids_travel_time:
+                return sector
+        return self.sectors[0]
 
     def __get_vehicle_travel_time_debug(self, vehicle_id: int) -> float:
         # Get travel time for a vehicle by its ID
@@ -15,3 +15,8 @@ class StepTimer:
 
     def reset(self, start_time: Secs = 0):
         self.time = start_time
+
+    def align(self, video_time: Secs):
+        # Привязка к моменту видео (например, после перемотки): период начинается заново
+        self.time = 0
+        self.unresettable_time = video_time
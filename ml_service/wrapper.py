@@ -1,29 +1,87 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
-from kafka import KafkaConsumer, KafkaProducer
 import json
 import subprocess
+import itertools
 import threading
 import logging
+import logging.handlers
 import os
-from typing import Dict, Any
+import signal
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Literal
 import uuid
 
+from data_loader.input_error import PERMANENT_EXIT_CODES
+from data_manager.report_writers import report_paths
+from diagnostics.progress import parse_progress
+from diagnostics.tracing import Tracer
+from messaging import OffsetTracker, commit_offset, create_producer, create_consumer, consumer_lag, rewind
+from metrics import QUEUE_DEPTH, TASKS, TASKS_IN_FLIGHT, record_run
+from task_registry import TaskRegistry
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="ML Traffic Analysis Service", version="1.0.0")
 
-# Kafka producer for sending results
-producer = KafkaProducer(
-    bootstrap_servers=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9092').split(','),
-    value_serializer=lambda v: json.dumps(v).encode('utf-8')
-)
+# Producer for sending results: Kafka or the local broker (MESSAGING_BACKEND)
+producer = create_producer(value_serializer=lambda v: json.dumps(v).encode('utf-8'))
+
+# Directory main.py runs from, the container layout by default
+APP_DIR = os.getenv('ML_APP_DIR', '/app')
+
+# Output of main.py goes to a rotating log per task instead of the wrapper memory
+TASK_LOG_DIR = os.getenv('ML_TASK_LOG_DIR', '/shared/logs')
+TASK_LOG_MAX_BYTES = 10 * 1024 * 1024
+TASK_LOG_BACKUPS = 3
+
+# Last lines of the output sent as the error of a failed run
+ERROR_TAIL_LINES = 50
+ERROR_TAIL_CHARS = 4000
+
+# Tasks come from TASK_TOPIC. A failed run goes to the retry topic of its attempt and comes back after
+# an exponentially growing delay; a task that fails ML_MAX_ATTEMPTS times or whose input is unusable
+# (bad video, bad sector JSON) goes to DEAD_LETTER_TOPIC, see dead_letters.py to inspect and requeue
+TASK_TOPIC = 'video_processing_tasks'
+DEAD_LETTER_TOPIC = 'video_processing_tasks_dead'
+ML_MAX_ATTEMPTS = int(os.getenv('ML_MAX_ATTEMPTS', '3'))
+ML_RETRY_DELAY = float(os.getenv('ML_RETRY_DELAY', '30'))
+
+# Cancellations from video_service reach every replica; main.py gets CANCEL_GRACE seconds after SIGTERM.
+# A starting replica replays the cancellations of the last ML_CANCEL_REPLAY seconds (at least a task lease),
+# so that a cancel sent while every replica was down still reaches the registry before the task is claimed
+CANCEL_TOPIC = 'video_processing_cancellations'
+CANCEL_GRACE = 10
+ML_CANCEL_REPLAY = float(os.getenv('ML_CANCEL_REPLAY', '86400'))
+# Longest wait of the task consumer for the replay before it claims tasks anyway
+CANCEL_REPLAY_TIMEOUT = 60
+
+# Tasks processed at once by this replica; the consumer keeps polling while they run
+ML_WORKERS = int(os.getenv('ML_WORKERS', '1'))
+# How often the claims of running tasks are refreshed and the queue depth is measured, seconds
+HEARTBEAT_INTERVAL = 30
+QUEUE_DEPTH_INTERVAL = 5
 
 # Task status storage (in production, use Redis or database)
 task_status: Dict[str, Dict[str, Any]] = {}
 
+# Tasks running in this replica with the main.py process of the current pass (None between passes)
+# and the ones among them cancelled by the user, shared by the workers and the cancel consumer
+active_tasks: Dict[str, Optional[subprocess.Popen]] = {}
+cancelled_tasks: set = set()
+tasks_lock = threading.Lock()
+# Set once the cancel consumer has replayed the recent cancellations into the registry
+cancellations_replayed = threading.Event()
+
+
+class TaskCancelled(Exception):
+    """The user cancelled the task while it was running"""
+
 
 class ProcessingTask(BaseModel):
     task_id: str
@@ -33,6 +91,16 @@ class ProcessingTask(BaseModel):
     output_path: str
     report_path: str
     model_path: str
+    start: Optional[float] = None
+    end: Optional[float] = None
+    sample_duration: Optional[float] = None
+    sample_interval: Optional[float] = None
+    preview: bool = False
+    pipeline: Optional[str] = None
+    report_formats: Optional[List[str]] = None
+    profile: Optional[Literal["sampling", "cprofile"]] = None
+    memory_profile: bool = False
+    trace_id: Optional[str] = None
 
 
 @app.get("/health")
@@ -41,6 +109,12 @@ async def health_check():
     return {"status": "healthy", "service": "ml-traffic-analysis"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: tasks in flight, queue depth, frames/s, stage latencies, model load time"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/process")
 async def process_video(
         task: ProcessingTask,
@@ -75,12 +149,320 @@ async def get_task_status(task_id: str):
     return task_status[task_id]
 
 
+def build_command(task_data: dict) -> list:
+    """Build the main.py command line for a task"""
+    cmd = [
+        "python", "main.py",
+        "--video-path", task_data['video_path'],
+        "--model-path", task_data['model_path'],
+        "--output-path", task_data['output_path'],
+        "--report-path", task_data['report_path'],
+        "--sector_path", task_data['sector_path'],
+        "--buckets-path", buckets_path(task_data['report_path']),
+        "--timings-path", timings_path(task_data['report_path']),
+        "--usage-path", usage_path(task_data['report_path']),
+        # Per-period statistics are published to Kafka as soon as each period closes
+        "--task-id", str(task_data['task_id'])
+    ]
+
+    # Optional time window inside the video (seconds)
+    if task_data.get('start') is not None:
+        cmd += ["--start", str(task_data['start'])]
+    if task_data.get('end') is not None:
+        cmd += ["--end", str(task_data['end'])]
+
+    # Optional sampling schedule: measure sample_duration seconds out of every sample_interval
+    if task_data.get('sample_duration') is not None and task_data.get('sample_interval') is not None:
+        cmd += [
+            "--sample-duration", str(task_data['sample_duration']),
+            "--sample-interval", str(task_data['sample_interval'])
+        ]
+
+    # Report formats: xlsx, csv, json, parquet
+    cmd += ["--report-formats", ",".join(task_formats(task_data))]
+
+    # Optional CPU profile of this exact run, saved into the shared volume
+    if task_data.get('profile'):
+        cmd += ["--profile", task_data['profile'], "--profile-path", profile_base(task_data['task_id'])]
+
+    # Optional allocation timeline for tasks whose memory grows
+    if task_data.get('memory_profile'):
+        cmd += ["--memory-profile-path", memory_profile_path(task_data['task_id'])]
+
+    # Decode/encode in separate processes with shared-memory frames ("inline" or "processes")
+    pipeline = task_data.get('pipeline') or os.getenv('ML_PIPELINE')
+    if pipeline:
+        cmd += ["--pipeline", pipeline]
+
+    return cmd
+
+
+def progress_percent(done: int, total: int|None) -> int:
+    """Frames done as percent of the run, 99 at most until the report is written"""
+    if not total:
+        return 0
+    return min(done * 100 // total, 99)
+
+
+def task_formats(task_data: dict) -> list:
+    """Requested report formats, xlsx when the task does not choose"""
+    return task_data.get('report_formats') or ["xlsx"]
+
+
+def task_report_paths(task_data: dict, report_path: str) -> dict:
+    """Report file of every requested format, the same paths main.py writes to"""
+    return report_paths(report_path, task_formats(task_data))
+
+
+def profile_base(task_id: str) -> str:
+    """Profile files of a task without extension: <base>.json, <base>_top.txt and stacks or pstats"""
+    return os.path.join(os.getenv('ML_PROFILE_DIR', '/shared/profiles'), f"profile_{task_id}")
+
+
+def memory_profile_path(task_id: str) -> str:
+    """Memory snapshots timeline of a task"""
+    return os.path.join(os.getenv('ML_PROFILE_DIR', '/shared/profiles'), f"memory_{task_id}.json")
+
+
+def usage_path(report_path: str) -> str:
+    """Resource usage of the ML run next to the report"""
+    base, _ = os.path.splitext(report_path)
+    return f"{base}_usage.json"
+
+
+def read_resource_usage(report_path: str) -> dict:
+    """Resource usage written by main.py, empty if the run did not get that far"""
+    try:
+        with open(usage_path(report_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Resource usage is not available: {e}")
+        return {}
+
+
+def timings_path(report_path: str) -> str:
+    """Per-stage timing histograms next to the report"""
+    base, _ = os.path.splitext(report_path)
+    return f"{base}_timings.json"
+
+
+def buckets_path(report_path: str) -> str:
+    """Statistics buckets CSV next to the report, used for custom rolling windows"""
+    base, _ = os.path.splitext(report_path)
+    return f"{base}_buckets.csv"
+
+
+def preview_report_path(report_path: str) -> str:
+    """Report path for the preliminary pass, next to the final report"""
+    base, ext = os.path.splitext(report_path)
+    return f"{base}_preview{ext}"
+
+
+def publish_result(result_data: dict, tracer: Tracer):
+    """Sends an ML result to statistics_service with the trace of the task"""
+    if tracer.enabled:
+        result_data["trace_id"] = tracer.trace_id
+        # statistics_service measures the time the result waited in Kafka from here
+        result_data["published_at"] = time.time()
+
+    producer.send('ml_results', result_data)
+    producer.flush()
+
+
+def child_env(tracer: Tracer) -> dict:
+    """Environment of main.py: its spans continue the trace under the current span"""
+    return dict(os.environ, **tracer.env())
+
+
+def task_log_path(task_id: str, pass_name: str) -> str:
+    """Output of one main.py run of a task, rotated next to the other tasks' logs"""
+    return os.path.join(TASK_LOG_DIR, f"task_{task_id}_{pass_name}.log")
+
+
+def run_main(task_id: str, cmd: list, log_path: str, tracer: Tracer, on_progress) -> tuple[int, str]:
+    """
+    Run main.py streaming its output line by line: PROGRESS lines go to on_progress(done, total),
+    everything goes to the rotating log. Returns the exit code and the tail of the output.
+    The process is registered for the task, so that a cancellation can stop it
+    """
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=TASK_LOG_MAX_BYTES, backupCount=TASK_LOG_BACKUPS, encoding='utf-8'
+    )
+    # Lines go straight to the handler: a logger per task would stay in the logging registry for good
+    handler.setFormatter(logging.Formatter('%(message)s'))
+
+    tail = deque(maxlen=ERROR_TAIL_LINES)
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors='replace',
+            bufsize=1,
+            cwd=APP_DIR,  # Make sure we're in the right directory
+            env=child_env(tracer),
+            # Own process group: a cancellation stops the --pipeline processes workers too
+            start_new_session=True
+        )
+        with tasks_lock:
+            if task_id in cancelled_tasks:
+                stop_process(process)
+            active_tasks[task_id] = process
+        for line in process.stdout:
+            line = line.rstrip('\n')
+            handler.handle(logging.makeLogRecord({'msg': line, 'levelno': logging.INFO, 'levelname': 'INFO'}))
+            progress = parse_progress(line)
+            if progress is not None:
+                on_progress(*progress)
+            else:
+                tail.append(line)
+        returncode = process.wait()
+        with tasks_lock:
+            active_tasks[task_id] = None
+    finally:
+        handler.close()
+
+    return returncode, "\n".join(tail)[-ERROR_TAIL_CHARS:]
+
+
+def stop_process(process: subprocess.Popen):
+    """SIGTERM to the process group of a main.py run, SIGKILL if it is still there after CANCEL_GRACE"""
+    def kill(sig):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    kill(signal.SIGTERM)
+    timer = threading.Timer(CANCEL_GRACE, lambda: process.poll() is None and kill(signal.SIGKILL))
+    timer.daemon = True
+    timer.start()
+
+
+def check_cancelled(task_id: str):
+    with tasks_lock:
+        if task_id in cancelled_tasks:
+            raise TaskCancelled(task_id)
+
+
+def task_output_paths(task_data: dict) -> list:
+    """Files the passes of a task write to /shared: video, reports, buckets, timings and usage"""
+    paths = [task_data['output_path']]
+    for report_path in (task_data['report_path'], preview_report_path(task_data['report_path'])):
+        paths.extend(task_report_paths(task_data, report_path).values())
+        paths.extend([buckets_path(report_path), timings_path(report_path), usage_path(report_path)])
+    return paths
+
+
+def remove_task_outputs(task_data: dict):
+    """Removes the partial outputs of a cancelled task, the task logs stay for diagnostics"""
+    for path in task_output_paths(task_data):
+        try:
+            os.remove(path)
+            logger.info(f"Removed {path} of cancelled task {task_data['task_id']}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Cannot remove {path} of cancelled task {task_data['task_id']}: {e}")
+
+
+def report_cancelled(task_id: str, user_id: str, tracer: Tracer):
+    TASKS.labels("cancelled").inc()
+    task_status[task_id] = {
+        "status": "cancelled",
+        "progress": 0,
+        "message": "Processing cancelled by the user"
+    }
+    publish_result({
+        "task_id": task_id,
+        "user_id": user_id,
+        "status": "cancelled",
+        "message": "Video processing cancelled"
+    }, tracer)
+
+
+def run_preview_pass(task_data: dict, cmd: list, tracer: Tracer):
+    """
+    Run a quick low-resolution pass with a large frame stride and publish
+    its statistics as preliminary. A failed preview does not fail the task,
+    the full-fidelity pass still runs and replaces the results.
+    """
+    task_id = task_data['task_id']
+    report_path = preview_report_path(task_data['report_path'])
+
+    preview_cmd = cmd + ["--preview"]
+    # Only the full-fidelity run is profiled
+    if "--profile" in preview_cmd:
+        index = preview_cmd.index("--profile")
+        del preview_cmd[index:index + 4]
+    if "--memory-profile-path" in preview_cmd:
+        index = preview_cmd.index("--memory-profile-path")
+        del preview_cmd[index:index + 2]
+    preview_cmd[preview_cmd.index("--report-path") + 1] = report_path
+    preview_cmd[preview_cmd.index("--buckets-path") + 1] = buckets_path(report_path)
+    preview_cmd[preview_cmd.index("--timings-path") + 1] = timings_path(report_path)
+    preview_cmd[preview_cmd.index("--usage-path") + 1] = usage_path(report_path)
+
+    task_status[task_id]["message"] = "Running quick preliminary pass"
+    logger.info(f"Running preview command: {' '.join(preview_cmd)}")
+
+    def on_progress(done, total):
+        task_status[task_id]["preview_progress"] = progress_percent(done, total)
+
+    log_path = task_log_path(task_id, "preview")
+    with tracer.span("preview_pass") as attributes:
+        returncode, error_tail = run_main(task_id, preview_cmd, log_path, tracer, on_progress)
+        attributes["returncode"] = returncode
+
+    if returncode != 0:
+        logger.warning(f"Preliminary pass failed for task {task_id}, see {log_path}: {error_tail}")
+        return
+
+    record_run(timings_path(report_path), read_resource_usage(report_path), "preview")
+
+    task_status[task_id]["message"] = "Preliminary results available"
+    task_status[task_id]["preliminary_report_path"] = report_path
+
+    result_data = {
+        "task_id": task_id,
+        "user_id": task_data['user_id'],
+        "status": "processing",
+        "preliminary": True,
+        "report_path": report_path,
+        "report_paths": task_report_paths(task_data, report_path),
+        "message": "Preliminary results available, full processing in progress"
+    }
+
+    publish_result(result_data, tracer)
+
+    logger.info(f"Preliminary results sent to Kafka for task {task_id}")
+
+
+@TASKS_IN_FLIGHT.track_inprogress()
 def run_ml_processing(task_data: dict):
+    """
+    Run a task under its trace: the wait in Kafka since video_service published it
+    and the processing with the main.py runs nested in it
+    """
+    tracer = Tracer("ml_service", task_data.get('trace_id'))
+    if task_data.get('published_at') is not None:
+        tracer.record("task_queue", task_data['published_at'], time.time())
+
+    with tracer.span("ml_processing", task_id=task_data['task_id']) as attributes:
+        process_task(task_data, tracer)
+        attributes["status"] = task_status.get(task_data['task_id'], {}).get("status")
+
+
+def process_task(task_data: dict, tracer: Tracer):
     """
     Run the original ML processing code as subprocess
     This function wraps the existing main.py without modifying it
     """
     task_id = task_data['task_id']
+    with tasks_lock:
+        active_tasks.setdefault(task_id, None)
 
     try:
         logger.info(f"Starting ML processing for task {task_id}")
@@ -88,42 +470,57 @@ def run_ml_processing(task_data: dict):
         # Update status
         task_status[task_id] = {
             "status": "processing",
-            "progress": 10,
+            "progress": 0,
             "message": "Initializing AI model"
         }
 
+        # The result row in statistics_service exists from the start: periods are served with it
+        publish_result({
+            "task_id": task_id,
+            "user_id": task_data['user_id'],
+            "status": "processing",
+            "message": "Video processing started"
+        }, tracer)
+
         # Prepare command to run original main.py
-        cmd = [
-            "python", "main.py",
-            "--video-path", task_data['video_path'],
-            "--model-path", task_data['model_path'],
-            "--output-path", task_data['output_path'],
-            "--report-path", task_data['report_path'],
-            "--sector_path", task_data['sector_path']
-        ]
+        cmd = build_command(task_data)
+
+        # Optional quick low-resolution pass publishing preliminary statistics first
+        if task_data.get('preview'):
+            run_preview_pass(task_data, cmd, tracer)
+            check_cancelled(task_id)
 
         logger.info(f"Running command: {' '.join(cmd)}")
 
         # Update status
-        task_status[task_id]["progress"] = 20
+        log_path = task_log_path(task_id, "full")
         task_status[task_id]["message"] = "Processing video frames"
+        task_status[task_id]["log_path"] = log_path
+
+        def on_progress(done, total):
+            task_status[task_id]["progress"] = progress_percent(done, total)
+            task_status[task_id]["frames_done"] = done
+            task_status[task_id]["frames_total"] = total
 
         # Run the original AI processing
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd='/app'  # Make sure we're in the right directory
-        )
+        with tracer.span("main_pass") as attributes:
+            returncode, error_tail = run_main(task_id, cmd, log_path, tracer, on_progress)
+            attributes["returncode"] = returncode
+        check_cancelled(task_id)
 
-        if result.returncode == 0:
+        if returncode == 0:
             logger.info(f"ML processing completed successfully for task {task_id}")
 
+            usage = read_resource_usage(task_data['report_path'])
+            record_run(timings_path(task_data['report_path']), usage, "full")
+            TASKS.labels("completed").inc()
+
             # Update status
             task_status[task_id] = {
                 "status": "completed",
                 "progress": 100,
-                "message": "Processing completed successfully"
+                "message": "Processing completed successfully",
+                "log_path": log_path
             }
 
             # Send result to Kafka for statistics service
@@ -133,88 +530,352 @@ def run_ml_processing(task_data: dict):
                 "status": "completed",
                 "output_path": task_data['output_path'],
                 "report_path": task_data['report_path'],
+                "report_paths": task_report_paths(task_data, task_data['report_path']),
+                "buckets_path": buckets_path(task_data['report_path']),
+                "timings_path": timings_path(task_data['report_path']),
+                # Wall/CPU time, peak RSS, frames and real-time factor for capacity planning
+                "resource_usage": usage,
                 "message": "Video processing completed successfully"
             }
 
-            producer.send('ml_results', result_data)
-            producer.flush()
+            # Profile summary with the paths of the stacks and the top functions
+            if task_data.get('profile'):
+                result_data["profile_path"] = f"{profile_base(task_data['task_id'])}.json"
+            if task_data.get('memory_profile'):
+                result_data["memory_profile_path"] = memory_profile_path(task_data['task_id'])
+
+            publish_result(result_data, tracer)
 
             logger.info(f"Results sent to Kafka for task {task_id}")
 
         else:
-            logger.error(f"ML processing failed for task {task_id}: {result.stderr}")
+            logger.error(f"ML processing failed for task {task_id}, see {log_path}: {error_tail}")
 
-            # Update status with error
-            task_status[task_id] = {
-                "status": "failed",
-                "progress": 0,
-                "message": f"Processing failed: {result.stderr}",
-                "error": result.stderr
-            }
-
-            # Send failure notification to Kafka
-            result_data = {
-                "task_id": task_id,
-                "user_id": task_data['user_id'],
-                "status": "failed",
-                "error": result.stderr,
-                "message": "Video processing failed"
-            }
+            # Unusable input fails the same way every time, anything else (OOM kill, restart) may pass
+            fail_task(task_data, tracer, error_tail, returncode in PERMANENT_EXIT_CODES, log_path)
 
-            producer.send('ml_results', result_data)
-            producer.flush()
+    except TaskCancelled:
+        logger.info(f"ML processing of task {task_id} cancelled")
+        remove_task_outputs(task_data)
+        report_cancelled(task_id, task_data['user_id'], tracer)
 
     except Exception as e:
         logger.error(f"Exception during ML processing for task {task_id}: {str(e)}")
+        fail_task(task_data, tracer, f"Processing failed with exception: {str(e)}", False)
+
+    finally:
+        with tasks_lock:
+            active_tasks.pop(task_id, None)
+            cancelled_tasks.discard(task_id)
+
+
+def retry_topic(attempt: int) -> str:
+    """Retry tier of a failed attempt: one delay per topic keeps every topic in due order"""
+    return f"{TASK_TOPIC}_retry_{attempt}"
+
 
-        # Update status with exception
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff: ML_RETRY_DELAY after the first attempt, doubled after each next one"""
+    return ML_RETRY_DELAY * 2 ** (attempt - 1)
+
+
+def fail_task(task_data: dict, tracer: Tracer, error: str, permanent: bool, log_path: Optional[str] = None):
+    """
+    A failed attempt: scheduled for a retry while attempts remain, otherwise (or right away for
+    unusable input) sent to the dead letter topic and reported as failed
+    """
+    task_id = task_data['task_id']
+    attempt = task_data.get('attempt', 1)
+
+    if not permanent and attempt < ML_MAX_ATTEMPTS:
+        delay = retry_delay(attempt)
+        producer.send(retry_topic(attempt), dict(task_data, attempt=attempt, last_error=error, retry_at=time.time() + delay))
+        producer.flush()
+        TASKS.labels("retrying").inc()
+        logger.warning(f"Task {task_id} failed on attempt {attempt} of {ML_MAX_ATTEMPTS}, retrying in {delay:.0f} s")
+
+        message = f"Processing failed, retry {attempt + 1} of {ML_MAX_ATTEMPTS} in {delay:.0f} s"
         task_status[task_id] = {
-            "status": "failed",
+            "status": "retrying",
             "progress": 0,
-            "message": f"Processing failed with exception: {str(e)}",
-            "error": str(e)
+            "message": message,
+            "error": error,
+            "attempt": attempt,
+            "log_path": log_path
         }
-
-        # Send failure notification to Kafka
-        result_data = {
+        # The result stays "processing" for the user until the retries are over
+        publish_result({
             "task_id": task_id,
             "user_id": task_data['user_id'],
-            "status": "failed",
-            "error": str(e),
-            "message": "Video processing failed with exception"
-        }
+            "status": "processing",
+            "message": message
+        }, tracer)
+        return
+
+    producer.send(DEAD_LETTER_TOPIC, dict(
+        task_data, attempt=attempt, error=error, permanent=permanent, log_path=log_path, failed_at=time.time()
+    ))
+    producer.flush()
+    TASKS.labels("failed").inc()
+    logger.error(f"Task {task_id} sent to {DEAD_LETTER_TOPIC} after {attempt} attempts (permanent: {permanent})")
+
+    # Update status with error, the whole output stays in the task log
+    task_status[task_id] = {
+        "status": "failed",
+        "progress": 0,
+        "message": f"Processing failed: {error}",
+        "error": error,
+        "attempt": attempt,
+        "log_path": log_path
+    }
 
-        producer.send('ml_results', result_data)
-        producer.flush()
+    # Send failure notification to Kafka
+    publish_result({
+        "task_id": task_id,
+        "user_id": task_data['user_id'],
+        "status": "failed",
+        "error": error,
+        "log_path": log_path,
+        "message": "Video processing failed"
+    }, tracer)
+
+
+def update_queue_depth(consumer):
+    """Tasks the processing group has not taken yet, for autoscaling the replicas"""
+    try:
+        lag = consumer_lag(consumer)
+    except Exception as e:
+        logger.warning(f"Cannot get the task queue depth: {e}")
+        return
+    if lag is not None:
+        QUEUE_DEPTH.set(lag)
+
+
+def process_claimed_task(task_data: dict, registry: TaskRegistry):
+    """Worker thread: runs a claimed task and records its final status for deduplication"""
+    task_id = task_data['task_id']
+    try:
+        run_ml_processing(task_data)
+    finally:
+        registry.finish(task_id, task_status.get(task_id, {}).get("status", "failed"))
+
+
+def claim_delivery(task_data: dict, registry: TaskRegistry) -> str:
+    """
+    What to do with a delivered task: 'claimed' - process it, 'held' - it is processing under
+    a live claim (another replica, or this one after a rebalance), 'skipped' - finished or cancelled
+    """
+    task_id = task_data['task_id']
+    try:
+        if registry.claim(task_id, task_data.get('attempt', 1)):
+            return 'claimed'
+        status = registry.status(task_id)
+    except Exception as e:
+        # Processing a task twice is better than losing it
+        logger.warning(f"Cannot claim task {task_id}, processing it anyway: {e}")
+        return 'claimed'
+
+    if status == 'processing':
+        return 'held'
+    logger.info(f"Task {task_id} is already {status}, skipping the delivery")
+    # A task cancelled while waiting for a retry comes back once: its earlier attempts left outputs
+    if status == 'cancelled':
+        remove_task_outputs(task_data)
+    return 'skipped'
+
+
+def start_task(task_data: dict, registry: TaskRegistry, pool: ThreadPoolExecutor):
+    """Submits a claimed task to the workers"""
+    # Registered before the worker starts, so that a cancellation in between is not missed
+    with tasks_lock:
+        active_tasks.setdefault(task_data['task_id'], None)
+    return pool.submit(process_claimed_task, task_data, registry)
+
+
+def commit_processed(consumer, offsets: OffsetTracker, message):
+    """Commits the offset of a handled message once the messages before it are handled too"""
+    committable = offsets.done(message.topic, message.partition, message.offset)
+    if committable is None:
+        return
+    try:
+        commit_offset(consumer, message.topic, message.partition, committable)
+    except Exception as e:
+        # The partition went to another replica, which skips the finished task by its task_id
+        logger.warning(f"Cannot commit offset {committable} of {message.topic}[{message.partition}]: {e}")
 
 
 def kafka_consumer_worker():
     """
     Kafka consumer that listens for video processing tasks
-    This runs in a separate thread
+    This runs in a separate thread. It only polls: the tasks run on ML_WORKERS worker threads.
+    While all workers are busy the partitions are paused and polling goes on, so the group does
+    not drop this replica however long a video takes. Offsets are committed after the task
+    finishes, tasks delivered again after a rebalance or a crash are skipped by task_id.
+    A delivery of a task processing under a live claim is held uncommitted: it is committed once
+    the owner finishes the task, and processed here if the owner dies and its claim expires.
     """
-    consumer = KafkaConsumer(
-        'video_processing_tasks',
-        bootstrap_servers=os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9092').split(','),
+    if not cancellations_replayed.wait(CANCEL_REPLAY_TIMEOUT):
+        logger.warning("Recent cancellations are not replayed yet, claiming tasks anyway")
+    consumer = create_consumer(
+        TASK_TOPIC,
         value_deserializer=lambda m: json.loads(m.decode('utf-8')),
         group_id='ml_processing_group',
-        auto_offset_reset='latest'
+        auto_offset_reset='latest',
+        enable_auto_commit=False
+    )
+    registry = TaskRegistry()
+    offsets = OffsetTracker()
+    # future -> (message, task_id)
+    running = {}
+    # (message, task_id) of the held deliveries
+    held = []
+    heartbeat_at = queue_depth_at = 0.0
+
+    logger.info(f"Kafka consumer started with {ML_WORKERS} workers, waiting for video processing tasks...")
+
+    with ThreadPoolExecutor(max_workers=ML_WORKERS, thread_name_prefix='ml-task') as pool:
+        while True:
+            try:
+                for future in [future for future in running if future.done()]:
+                    message, _ = running.pop(future)
+                    commit_processed(consumer, offsets, message)
+
+                # Paused partitions are not fetched, but poll still keeps the replica in the group
+                partitions = consumer.assignment()
+                if len(running) >= ML_WORKERS:
+                    consumer.pause(*partitions)
+                else:
+                    consumer.resume(*partitions)
+
+                records = consumer.poll(timeout_ms=1000, max_records=max(ML_WORKERS - len(running), 1))
+                deliveries = []
+                for message in itertools.chain.from_iterable(records.values()):
+                    offsets.start(message.topic, message.partition, message.offset)
+                    task_id = message.value.setdefault('task_id', str(uuid.uuid4()))
+                    logger.info(f"Received task from Kafka: {task_id}")
+                    deliveries.append((message, task_id))
+
+                now = time.monotonic()
+                if now - heartbeat_at >= HEARTBEAT_INTERVAL:
+                    registry.heartbeat([task_id for _, task_id in running.values()])
+                    heartbeat_at = now
+                    # Held deliveries are checked again once their claims had time to change
+                    deliveries, held = held + deliveries, []
+
+                for message, task_id in deliveries:
+                    action = claim_delivery(message.value, registry)
+                    if action == 'claimed':
+                        running[start_task(message.value, registry, pool)] = (message, task_id)
+                    elif action == 'held':
+                        held.append((message, task_id))
+                    else:
+                        commit_processed(consumer, offsets, message)
+
+                if now - queue_depth_at >= QUEUE_DEPTH_INTERVAL:
+                    update_queue_depth(consumer)
+                    queue_depth_at = now
+
+            except Exception as e:
+                logger.error(f"Error processing Kafka message: {str(e)}")
+                time.sleep(1)
+
+
+def retry_worker(attempt: int):
+    """
+    Consumer of the retry tier of an attempt, runs in its own thread. Holds the head task
+    until its retry time with the partitions paused, then sends it back to TASK_TOPIC as the
+    next attempt and commits. A waiting retry never delays new tasks or other tiers
+    """
+    consumer = create_consumer(
+        retry_topic(attempt),
+        value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+        group_id='ml_retry_group',
+        auto_offset_reset='earliest',
+        enable_auto_commit=False
     )
+    waiting = deque()
 
-    logger.info("Kafka consumer started, waiting for video processing tasks...")
+    while True:
+        try:
+            partitions = consumer.assignment()
+            if waiting:
+                consumer.pause(*partitions)
+            else:
+                consumer.resume(*partitions)
+
+            records = consumer.poll(timeout_ms=1000, max_records=1)
+            waiting.extend(itertools.chain.from_iterable(records.values()))
+
+            while waiting and waiting[0].value.get('retry_at', 0) <= time.time():
+                message = waiting.popleft()
+                task_data = {key: value for key, value in message.value.items() if key != 'retry_at'}
+                task_data['attempt'] = attempt + 1
+                task_data['published_at'] = time.time()
+                producer.send(TASK_TOPIC, task_data)
+                producer.flush()
+                commit_offset(consumer, message.topic, message.partition, message.offset + 1)
+                logger.info(f"Task {task_data.get('task_id')} requeued for attempt {attempt + 1}")
 
-    for message in consumer:
+        except Exception as e:
+            logger.error(f"Error in retry worker of attempt {attempt}: {str(e)}")
+            time.sleep(1)
+
+
+def cancel_worker():
+    """
+    Consumer of the cancellations, runs in its own thread. Every replica has its own group and
+    gets every cancellation: the replica running the task stops main.py and reports it from the
+    worker, for a queued or retrying task the registry picks the one replica that reports it
+    """
+    registry = TaskRegistry()
+    consumer = create_consumer(
+        CANCEL_TOPIC,
+        value_deserializer=lambda m: json.loads(m.decode('utf-8')),
+        group_id=f"ml_cancel_group_{registry.owner}",
+        auto_offset_reset='latest'
+    )
+    # Replayed cancellations are idempotent: the registry ignores the ones of finished or cancelled tasks
+    try:
+        rewind(consumer, time.time() - max(ML_CANCEL_REPLAY, registry.lease))
+    except Exception as e:
+        logger.error(f"Cannot replay recent cancellations: {str(e)}")
+        cancellations_replayed.set()
+
+    def check_replayed():
+        if cancellations_replayed.is_set():
+            return
         try:
-            task_data = message.value
-            task_id = task_data.get('task_id', str(uuid.uuid4()))
+            replayed = consumer_lag(consumer) == 0
+        except Exception as e:
+            logger.warning(f"Cannot get the lag of the cancellations: {e}")
+            replayed = True
+        if replayed:
+            logger.info("Recent cancellations replayed")
+            cancellations_replayed.set()
 
-            logger.info(f"Received task from Kafka: {task_id}")
+    check_replayed()
 
-            # Process the task
-            run_ml_processing(task_data)
+    for message in consumer:
+        try:
+            event = message.value
+            task_id = event['task_id']
+            logger.info(f"Cancellation of task {task_id} received")
+
+            with tasks_lock:
+                running_here = task_id in active_tasks
+                if running_here:
+                    cancelled_tasks.add(task_id)
+                    process = active_tasks[task_id]
+            if running_here and process is not None:
+                stop_process(process)
+
+            # Later deliveries of the task are skipped, whether it runs here, elsewhere or not yet
+            if registry.cancel(task_id) and not running_here:
+                report_cancelled(task_id, event['user_id'], Tracer("ml_service", event.get('trace_id')))
 
         except Exception as e:
-            logger.error(f"Error processing Kafka message: {str(e)}")
+            logger.error(f"Error processing cancellation: {str(e)}")
+        check_replayed()
 
 
 @app.on_event("startup")
@@ -223,6 +884,9 @@ async def startup_event():
     # Start Kafka consumer in background thread
     consumer_thread = threading.Thread(target=kafka_consumer_worker, daemon=True)
     consumer_thread.start()
+    for attempt in range(1, ML_MAX_ATTEMPTS):
+        threading.Thread(target=retry_worker, args=(attempt,), daemon=True).start()
+    threading.Thread(target=cancel_worker, daemon=True).start()
     logger.info("ML Service started with Kafka consumer")
 
 
@@ -157,3 +157,10 @@ SWAGGER_SETTINGS = {
 
 # File paths
 SHARED_STORAGE_PATH = env('SHARED_STORAGE_PATH', default='/shared')
+
+# Messaging: "kafka" or "local" (SQLite broker file shared with video_service and ml_service)
+MESSAGING_BACKEND = env('MESSAGING_BACKEND', default='kafka')
+MESSAGING_LOCAL_PATH = env('MESSAGING_LOCAL_PATH', default=f'{SHARED_STORAGE_PATH}/messages.sqlite3')
+
+# Task traces written by all services: one JSON line per span in <TRACE_DIR>/<trace_id>.jsonl
+TRACE_DIR = env('TRACE_DIR', default=f'{SHARED_STORAGE_PATH}/traces')
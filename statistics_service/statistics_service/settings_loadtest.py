@@ -0,0 +1,14 @@
+from .settings import *
+
+# Load test run (see loadtest/ in the repository root): SQLite by default,
+# LOADTEST_DATABASE=postgres keeps the DATABASE_* connection above for a local Postgres
+DEBUG = False
+
+if env('LOADTEST_DATABASE', default='sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env('LOADTEST_SQLITE_PATH', default=str(BASE_DIR / 'loadtest.sqlite3')),
+            'OPTIONS': {'timeout': 30},
+        }
+    }
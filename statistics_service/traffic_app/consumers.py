@@ -1,17 +1,33 @@
 import asyncio
-from aiokafka import AIOKafkaConsumer
-from .models import TrafficData, VideoProcessingResult
+from .messaging import consumer_lag, create_consumer
+from .metrics import CONSUMER_LAG, MESSAGES
+from .tracing import Tracer
+from .models import TrafficData, VideoProcessingResult, PeriodStatistics
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Fields of an ML result that describe how the task ran rather than its statistics
+DIAGNOSTIC_FIELDS = ('timings_path', 'profile_path', 'memory_profile_path', 'trace_id')
+
+
+async def observe_lag(consumer, message):
+    """Updates the consumer lag metric after a message is handled"""
+    try:
+        lag = await consumer_lag(consumer, message)
+    except Exception as e:
+        logger.warning(f"Cannot get consumer lag of {message.topic}: {e}")
+        return
+    if lag is not None:
+        CONSUMER_LAG.labels(message.topic).set(lag)
+
 
 async def consume_ml_results():
     """Consumer for ML results - just save file paths"""
-    consumer = AIOKafkaConsumer(
+    consumer = create_consumer(
         'ml_results',
-        bootstrap_servers='kafka:9092',
         group_id='ml_results_group',
         auto_offset_reset='latest'
     )
@@ -27,23 +43,84 @@ async def consume_ml_results():
 
                 logger.info(f"Received ML result for task {task_id}, status: {status}")
 
+                # The wait in Kafka since ml_service published the result and the save close the trace
+                tracer = Tracer('statistics_service', data.get('trace_id'))
+                if data.get('published_at') is not None:
+                    tracer.record('result_queue', data['published_at'], time.time(), status=status)
+
                 # Just save the data as-is
+                with tracer.span('result_ingest', status=status, preliminary=data.get('preliminary', False)):
+                    await asyncio.to_thread(
+                        VideoProcessingResult.objects.update_or_create,
+                        task_id=task_id,
+                        defaults={
+                            'user_id': user_id,
+                            'status': status,
+                            'output_video_path': data.get('output_path'),
+                            'report_path': data.get('report_path'),
+                            'report_paths': data.get('report_paths') or {},
+                            'is_preliminary': data.get('preliminary', False),
+                            'buckets_path': data.get('buckets_path'),
+                            'diagnostics': {key: data[key] for key in DIAGNOSTIC_FIELDS if key in data},
+                            'resource_usage': data.get('resource_usage') or {},
+                            'error_message': data.get('error', data.get('message'))
+                        }
+                    )
+
+                logger.info(f"Saved ML result for task {task_id}")
+                MESSAGES.labels(message.topic, 'saved').inc()
+
+            except Exception as e:
+                logger.error(f"Error processing ML result: {e}")
+                MESSAGES.labels(message.topic, 'error').inc()
+
+            await observe_lag(consumer, message)
+    finally:
+        await consumer.stop()
+
+
+# Fields of a period event stored as columns, everything else goes to stats
+PERIOD_EVENT_FIELDS = {'task_id', 'sector_id', 'period_index', 'preliminary', 'start_time', 'end_time', 'observation_time'}
+
+
+async def consume_period_stats():
+    """Consumer for per-period statistics published while the video is processed"""
+    consumer = create_consumer(
+        'ml_period_stats',
+        group_id='ml_period_stats_group',
+        auto_offset_reset='latest'
+    )
+
+    await consumer.start()
+    try:
+        async for message in consumer:
+            try:
+                data = json.loads(message.value.decode('utf-8'))
+                task_id = data.get('task_id')
+
+                # Redelivered events overwrite the same period
                 await asyncio.to_thread(
-                    VideoProcessingResult.objects.update_or_create,
+                    PeriodStatistics.objects.update_or_create,
                     task_id=task_id,
+                    is_preliminary=data.get('preliminary', False),
+                    sector_id=str(data.get('sector_id')),
+                    period_index=data.get('period_index'),
                     defaults={
-                        'user_id': user_id,
-                        'status': status,
-                        'output_video_path': data.get('output_path'),
-                        'report_path': data.get('report_path'),
-                        'error_message': data.get('error', data.get('message'))
+                        'start_time': data.get('start_time'),
+                        'end_time': data.get('end_time'),
+                        'observation_time': data.get('observation_time'),
+                        'stats': {key: value for key, value in data.items() if key not in PERIOD_EVENT_FIELDS}
                     }
                 )
 
-                logger.info(f"Saved ML result for task {task_id}")
+                logger.info(f"Saved period {data.get('period_index')} of sector {data.get('sector_id')} for task {task_id}")
+                MESSAGES.labels(message.topic, 'saved').inc()
 
             except Exception as e:
-                logger.error(f"Error processing ML result: {e}")
+                logger.error(f"Error processing period stats: {e}")
+                MESSAGES.labels(message.topic, 'error').inc()
+
+            await observe_lag(consumer, message)
     finally:
         await consumer.stop()
 
@@ -52,5 +129,6 @@ async def consume_ml_results():
 async def run_all_consumers():
     """Run both consumers concurrently"""
     await asyncio.gather(
-        consume_ml_results()  # New
+        consume_ml_results(),  # New
+        consume_period_stats()
     )
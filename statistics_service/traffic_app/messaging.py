@@ -0,0 +1,162 @@
+"""
+Async message consumers: Kafka (aiokafka) or the local SQLite broker shared by the services on one machine.
+
+settings.MESSAGING_BACKEND selects "kafka" (default) or "local". The local broker keeps Kafka topic
+semantics in the file settings.MESSAGING_LOCAL_PATH: an append-only log per topic and an offset per
+consumer group, so each message reaches one consumer of a group and a new group starts at the end
+of the log ("latest") or at its beginning ("earliest").
+"""
+import asyncio
+import os
+import sqlite3
+from dataclasses import dataclass
+
+from django.conf import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    "offset" INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    value BLOB NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_topic ON messages (topic, "offset");
+CREATE TABLE IF NOT EXISTS group_offsets (
+    group_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    "offset" INTEGER NOT NULL,
+    PRIMARY KEY (group_id, topic)
+);
+"""
+
+
+@dataclass
+class LocalMessage:
+    """The ConsumerRecord fields the consumers use"""
+    topic: str
+    offset: int
+    value: bytes
+    timestamp: float
+
+
+class LocalConsumer:
+    """Local broker consumer with the AIOKafkaConsumer interface used here: start, stop, async iteration"""
+
+    def __init__(self, *topics, group_id, auto_offset_reset='latest', poll_interval=0.5, max_records=100, path=None):
+        self.topics = list(topics)
+        self.group_id = group_id
+        self.auto_offset_reset = auto_offset_reset
+        self.poll_interval = poll_interval
+        self.max_records = max_records
+        self.path = path or settings.MESSAGING_LOCAL_PATH
+        self.buffer = []
+        self.stopped = False
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def join(self):
+        """Creates the log and registers the group at the end (or the beginning) of each topic"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = self.connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            connection.execute("BEGIN IMMEDIATE")
+            for topic in self.topics:
+                start = 0
+                if self.auto_offset_reset != 'earliest':
+                    start = connection.execute(
+                        'SELECT COALESCE(MAX("offset"), 0) FROM messages WHERE topic = ?', (topic,)
+                    ).fetchone()[0]
+                connection.execute(
+                    'INSERT OR IGNORE INTO group_offsets (group_id, topic, "offset") VALUES (?, ?, ?)',
+                    (self.group_id, topic, start)
+                )
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def fetch(self):
+        """Next messages of the group; the group offset moves in the same transaction"""
+        messages = []
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for topic in self.topics:
+                position = connection.execute(
+                    'SELECT "offset" FROM group_offsets WHERE group_id = ? AND topic = ?', (self.group_id, topic)
+                ).fetchone()[0]
+                rows = connection.execute(
+                    'SELECT "offset", value, timestamp FROM messages WHERE topic = ? AND "offset" > ? '
+                    'ORDER BY "offset" LIMIT ?',
+                    (topic, position, self.max_records)
+                ).fetchall()
+                if rows:
+                    connection.execute(
+                        'UPDATE group_offsets SET "offset" = ? WHERE group_id = ? AND topic = ?',
+                        (rows[-1][0], self.group_id, topic)
+                    )
+                    messages += [LocalMessage(topic, offset, value, timestamp) for offset, value, timestamp in rows]
+            connection.execute("COMMIT")
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return messages
+
+    def lag(self, topic, offset):
+        """Messages of the topic after the given offset"""
+        connection = self.connect()
+        try:
+            return connection.execute(
+                'SELECT COUNT(*) FROM messages WHERE topic = ? AND "offset" > ?', (topic, offset)
+            ).fetchone()[0]
+        finally:
+            connection.close()
+
+    async def start(self):
+        await asyncio.to_thread(self.join)
+
+    async def stop(self):
+        self.stopped = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.buffer:
+            if self.stopped:
+                raise StopAsyncIteration
+            self.buffer = await asyncio.to_thread(self.fetch)
+            if not self.buffer:
+                await asyncio.sleep(self.poll_interval)
+        return self.buffer.pop(0)
+
+
+async def consumer_lag(consumer, message):
+    """Messages of the partition behind the given one, None until the broker reports its end"""
+    if isinstance(consumer, LocalConsumer):
+        return await asyncio.to_thread(consumer.lag, message.topic, message.offset)
+
+    from aiokafka import TopicPartition
+    highwater = consumer.highwater(TopicPartition(message.topic, message.partition))
+    if highwater is None:
+        return None
+    return max(highwater - message.offset - 1, 0)
+
+
+def create_consumer(*topics, group_id, auto_offset_reset='latest'):
+    """Consumer of the configured backend, not started yet"""
+    if settings.MESSAGING_BACKEND == 'local':
+        return LocalConsumer(*topics, group_id=group_id, auto_offset_reset=auto_offset_reset)
+
+    from aiokafka import AIOKafkaConsumer
+    return AIOKafkaConsumer(
+        *topics,
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        group_id=group_id,
+        auto_offset_reset=auto_offset_reset
+    )
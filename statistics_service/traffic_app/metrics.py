@@ -0,0 +1,49 @@
+"""
+Prometheus metrics of the statistics service, exposed at /metrics.
+
+The Kafka consumers run in their own process (run_consumer.py), so with PROMETHEUS_MULTIPROC_DIR
+set both processes write their samples to that directory and /metrics aggregates them.
+Without it (tests, a single process) the default registry is served.
+"""
+import functools
+import os
+import time
+
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+MESSAGES = Counter('statistics_messages_consumed_total', 'Consumed messages by topic and outcome', ['topic', 'result'])
+CONSUMER_LAG = Gauge(
+    'statistics_consumer_lag', 'Messages of the topic behind the last consumed one', ['topic'],
+    multiprocess_mode='livemax'
+)
+DOWNLOAD_BYTES = Counter('statistics_download_bytes_total', 'Bytes of served downloads', ['kind'])
+DOWNLOAD_SECONDS = Histogram(
+    'statistics_download_duration_seconds', 'Time to serve a download', ['kind'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+)
+
+
+def observe_download(kind):
+    """Times a download view method and counts the bytes of successful responses"""
+    def decorator(get):
+        @functools.wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            start = time.perf_counter()
+            response = get(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                DOWNLOAD_SECONDS.labels(kind).observe(time.perf_counter() - start)
+                DOWNLOAD_BYTES.labels(kind).inc(len(response.content))
+            return response
+        return wrapper
+    return decorator
+
+
+def metrics_view(request):
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
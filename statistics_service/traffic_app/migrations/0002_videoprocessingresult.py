@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoProcessingResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.UUIDField(unique=True)),
+                ('user_id', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], max_length=20)),
+                ('output_video_path', models.CharField(blank=True, max_length=500, null=True)),
+                ('report_path', models.CharField(blank=True, max_length=500, null=True)),
+                ('is_preliminary', models.BooleanField(default=False)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id'], name='traffic_app_user_id_b94cc3_idx'), models.Index(fields=['task_id'], name='traffic_app_task_id_5a5b5b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0002_videoprocessingresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprocessingresult',
+            name='buckets_path',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+    ]
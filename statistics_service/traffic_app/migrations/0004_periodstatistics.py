@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0003_videoprocessingresult_buckets_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.UUIDField()),
+                ('sector_id', models.CharField(max_length=100)),
+                ('period_index', models.IntegerField()),
+                ('is_preliminary', models.BooleanField(default=False)),
+                ('start_time', models.FloatField()),
+                ('end_time', models.FloatField()),
+                ('observation_time', models.FloatField()),
+                ('stats', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['task_id'], name='traffic_app_task_id_992a5e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('task_id', 'is_preliminary', 'sector_id', 'period_index'), name='unique_task_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0004_periodstatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprocessingresult',
+            name='report_paths',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0005_videoprocessingresult_report_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprocessingresult',
+            name='diagnostics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0006_videoprocessingresult_diagnostics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprocessingresult',
+            name='resource_usage',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
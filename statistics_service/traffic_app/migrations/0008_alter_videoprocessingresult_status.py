@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('traffic_app', '0007_videoprocessingresult_resource_usage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='videoprocessingresult',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], max_length=20),
+        ),
+    ]
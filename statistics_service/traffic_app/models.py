@@ -17,6 +17,7 @@ class VideoProcessingResult(models.Model):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
     ]
 
     task_id = models.UUIDField(unique=True)
@@ -24,6 +25,11 @@ class VideoProcessingResult(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     output_video_path = models.CharField(max_length=500, blank=True, null=True)
     report_path = models.CharField(max_length=500, blank=True, null=True)  # Just store path
+    is_preliminary = models.BooleanField(default=False)  # Report comes from the quick preview pass
+    report_paths = models.JSONField(default=dict, blank=True)  # Report file per format: xlsx, csv, json, parquet
+    buckets_path = models.CharField(max_length=500, blank=True, null=True)  # Statistics buckets CSV for custom windows
+    diagnostics = models.JSONField(default=dict, blank=True)  # Paths of per-task diagnostics, e.g. stage timings
+    resource_usage = models.JSONField(default=dict, blank=True)  # Wall/CPU time, peak RSS, frames, real-time factor
     error_message = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -33,3 +39,27 @@ class VideoProcessingResult(models.Model):
             models.Index(fields=['user_id']),
             models.Index(fields=['task_id']),
         ]
+
+
+class PeriodStatistics(models.Model):
+    """Per-sector statistics of one closed period, published by the ML service while the video is processed"""
+    task_id = models.UUIDField()
+    sector_id = models.CharField(max_length=100)
+    period_index = models.IntegerField()
+    is_preliminary = models.BooleanField(default=False)  # Period comes from the quick preview pass
+    start_time = models.FloatField()
+    end_time = models.FloatField()
+    observation_time = models.FloatField()
+    stats = models.JSONField()  # Intensity, speeds, delay, time index and class counts
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['task_id', 'is_preliminary', 'sector_id', 'period_index'],
+                name='unique_task_period'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['task_id']),
+        ]
@@ -1,8 +1,20 @@
-from django.test import TestCase, override_settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from rest_framework.test import APIClient
 from unittest.mock import patch, AsyncMock
-from .models import TrafficData
+from .models import TrafficData, VideoProcessingResult, PeriodStatistics
+import asyncio
 import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from .consumers import consume_period_stats
+from .windows import aggregate_windows
+from .messaging import LocalConsumer, consumer_lag
+from .tracing import latency_breakdown
 
 TEST_DATABASE_SETTINGS = {
     'default': {
@@ -56,3 +68,220 @@ class TrafficDataTestCase(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['user_id'], self.user_id)
         self.assertEqual(response.data[0]['data'], self.test_data)
+
+
+class AggregateWindowsTestCase(SimpleTestCase):
+    def setUp(self):
+        # Two 10-second buckets with data, one skipped bucket in between
+        self.buckets = pd.DataFrame({
+            'sector_id': [1, 1, 1],
+            'bucket_start': [0.0, 10.0, 30.0],
+            'bucket_time': [10.0, 10.0, 10.0],
+            'observed_time': [10.0, 10.0, 10.0],
+            'sector_length': [0.1, 0.1, 0.1],
+            'lanes_count': [2, 2, 2],
+            'weighted_count': [2.0, 1.0, 3.0],
+            'travel_count': [2, 1, 3],
+            'travel_sum': [20.0, 12.0, 30.0],
+            'free_count': [2, 1, 3],
+            'free_sum': [16.0, 8.0, 24.0],
+        })
+
+    def test_adjacent_windows_sum_buckets(self):
+        windows = aggregate_windows(self.buckets, 20)
+        self.assertEqual(list(windows['window_start']), [0.0, 20.0])
+        self.assertEqual(list(windows['observed_time']), [20.0, 10.0])
+        self.assertAlmostEqual(windows['intensity'].iloc[0], 3 / 20 * 3600)
+        self.assertAlmostEqual(windows['mean_travel_time'].iloc[0], 32 / 3)
+
+    def test_sliding_windows(self):
+        windows = aggregate_windows(self.buckets, 20, 10)
+        self.assertEqual(list(windows['window_start']), [0.0, 10.0, 20.0, 30.0])
+
+    def test_window_must_be_bucket_multiple(self):
+        with self.assertRaises(ValueError):
+            aggregate_windows(self.buckets, 15)
+
+    def test_window_must_be_finite(self):
+        for window, step in ((float('inf'), None), (float('nan'), None), (20, float('inf'))):
+            with self.assertRaises(ValueError):
+                aggregate_windows(self.buckets, window, step)
+
+    def test_huge_window_is_capped_at_the_buckets_span(self):
+        windows = aggregate_windows(self.buckets, 1e12, 1e12)
+        self.assertEqual(list(windows['window_start']), [0.0])
+        self.assertEqual(list(windows['window_end']), [40.0])
+        self.assertEqual(list(windows['observed_time']), [30.0])
+
+
+class LatencyBreakdownTestCase(SimpleTestCase):
+    def span(self, name, start, end, span_id, parent_id=None):
+        return {'name': name, 'service': 'test', 'start': start, 'end': end, 'duration': end - start,
+                'span_id': span_id, 'parent_id': parent_id}
+
+    def test_hops_are_offset_from_the_upload(self):
+        spans = [
+            self.span('upload', 100.0, 101.0, 'a'),
+            self.span('task_queue', 101.0, 105.0, 'b'),
+            self.span('ml_processing', 105.0, 160.0, 'c'),
+            self.span('main_pass', 106.0, 159.0, 'd', parent_id='c'),
+            self.span('result_queue', 160.0, 160.5, 'e'),
+        ]
+
+        breakdown = latency_breakdown(spans)
+
+        self.assertEqual(breakdown['total'], 60.5)
+        self.assertEqual([hop['name'] for hop in breakdown['hops']],
+                         ['upload', 'task_queue', 'ml_processing', 'result_queue'])
+        self.assertEqual(breakdown['hops'][1]['offset'], 1.0)
+        self.assertEqual(breakdown['by_name']['main_pass'], 53.0)
+
+    def test_empty_trace(self):
+        self.assertIsNone(latency_breakdown([])['total'])
+
+
+class LocalConsumerTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'messages.sqlite3')
+
+    def publish(self, topic, value):
+        # Same log layout the producers of video_service and ml_service write
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            connection.execute(
+                'INSERT INTO messages (topic, value, timestamp) VALUES (?, ?, ?)',
+                (topic, json.dumps(value).encode('utf-8'), time.time())
+            )
+        finally:
+            connection.close()
+
+    def consumer(self, group_id, auto_offset_reset='latest'):
+        consumer = LocalConsumer('ml_results', group_id=group_id, auto_offset_reset=auto_offset_reset, path=self.path)
+        asyncio.run(consumer.start())
+        return consumer
+
+    def test_group_reads_each_message_once(self):
+        first = self.consumer('ml_results_group')
+        second = self.consumer('ml_results_group')
+        self.publish('ml_results', {'task_id': 1})
+        self.publish('ml_period_stats', {'task_id': 2})
+
+        self.assertEqual([json.loads(m.value) for m in first.fetch()], [{'task_id': 1}])
+        self.assertEqual(second.fetch(), [])
+
+    def test_new_group_starts_at_latest_or_earliest(self):
+        self.consumer('creates_log')
+        self.publish('ml_results', {'task_id': 1})
+
+        self.assertEqual(self.consumer('latest_group').fetch(), [])
+        self.assertEqual(len(self.consumer('earliest_group', 'earliest').fetch()), 1)
+
+    def test_lag_counts_messages_after_the_consumed_one(self):
+        consumer = self.consumer('ml_results_group')
+        for task_id in range(3):
+            self.publish('ml_results', {'task_id': task_id})
+
+        consumer.max_records = 1
+        message = asyncio.run(consumer.__anext__())
+
+        self.assertEqual(asyncio.run(consumer_lag(consumer, message)), 2)
+
+
+class MetricsViewTestCase(SimpleTestCase):
+    def test_download_without_token_is_not_counted(self):
+        self.client.get('/api/download/report/7a8f1f52-3c41-4b0e-9d0f-2a6e5c1d4b11/')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE statistics_download_bytes_total counter', response.content.decode())
+        self.assertNotIn('statistics_download_bytes_total{kind="report"}', response.content.decode())
+
+
+def period_event(**extra):
+    event = {
+        'task_id': '3b7c1f0e-2a4d-4c8e-9f61-5d2e8a7b9c10',
+        'sector_id': 1,
+        'period_index': 0,
+        'preliminary': False,
+        'start_time': 0.0,
+        'end_time': 60.0,
+        'observation_time': 60.0,
+        'intensity': 420.0,
+    }
+    event.update(extra)
+    return event
+
+
+# The consumer saves from worker threads, outside the transaction of a TestCase
+@override_settings(DATABASES=TEST_DATABASE_SETTINGS)
+class ConsumePeriodStatsTestCase(TransactionTestCase):
+    def consume(self, *events):
+        messages = [AsyncMock(topic='ml_period_stats', value=json.dumps(event).encode('utf-8')) for event in events]
+        with patch('traffic_app.consumers.create_consumer') as create_consumer, \
+                patch('traffic_app.consumers.observe_lag', new=AsyncMock()):
+            consumer = create_consumer.return_value
+            consumer.start = AsyncMock()
+            consumer.stop = AsyncMock()
+            consumer.__aiter__.return_value = messages
+            asyncio.run(consume_period_stats())
+
+    def test_period_is_saved_with_stats(self):
+        self.consume(period_event())
+
+        period = PeriodStatistics.objects.get()
+        self.assertEqual(period.sector_id, '1')
+        self.assertEqual(period.end_time, 60.0)
+        self.assertEqual(period.stats, {'intensity': 420.0})
+
+    def test_redelivered_period_overwrites_the_same_row(self):
+        self.consume(period_event(), period_event(intensity=480.0), period_event(preliminary=True))
+
+        self.assertEqual(PeriodStatistics.objects.filter(is_preliminary=False).get().stats, {'intensity': 480.0})
+        self.assertEqual(PeriodStatistics.objects.filter(is_preliminary=True).count(), 1)
+
+
+@override_settings(DATABASES=TEST_DATABASE_SETTINGS)
+@patch('traffic_app.views.validate_user_token', return_value={'valid': True, 'user_id': 'user123'})
+class PeriodStatsViewTestCase(TestCase):
+    task_id = '3b7c1f0e-2a4d-4c8e-9f61-5d2e8a7b9c10'
+
+    def setUp(self):
+        self.client = APIClient()
+        VideoProcessingResult.objects.create(task_id=self.task_id, user_id='user123', status='processing')
+
+    def add_period(self, period_index, preliminary):
+        PeriodStatistics.objects.create(
+            task_id=self.task_id, sector_id='1', period_index=period_index, is_preliminary=preliminary,
+            start_time=period_index * 60.0, end_time=(period_index + 1) * 60.0, observation_time=60.0,
+            stats={'intensity': 100.0 + period_index}
+        )
+
+    def get(self):
+        return self.client.get(f'/api/results/{self.task_id}/periods/', HTTP_AUTHORIZATION='Bearer token')
+
+    def test_periods_of_a_running_task(self, validate):
+        self.add_period(1, False)
+        self.add_period(0, False)
+
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'processing')
+        self.assertFalse(response.data['is_preliminary'])
+        self.assertEqual([period['period_index'] for period in response.data['periods']], [0, 1])
+        self.assertEqual(response.data['periods'][1]['intensity'], 101.0)
+
+    def test_preliminary_periods_until_full_ones_exist(self, validate):
+        self.add_period(0, True)
+        self.assertTrue(self.get().data['is_preliminary'])
+
+        self.add_period(0, False)
+        self.assertFalse(self.get().data['is_preliminary'])
+
+    def test_task_of_another_user_is_not_found(self, validate):
+        validate.return_value = {'valid': True, 'user_id': 'other'}
+
+        self.assertEqual(self.get().status_code, 404)
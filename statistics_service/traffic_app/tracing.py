@@ -0,0 +1,114 @@
+"""
+Task traces: spans of video_service, ml_service (wrapper and main.py) and this service.
+
+Every service appends its spans to settings.TRACE_DIR/<trace_id>.jsonl, one JSON object per
+line with the trace and span ids, the parent span, the service and the epoch start and end.
+The trace id comes with the ML results, the consumers add the time a result waited in Kafka
+and the time it took to save it.
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def trace_path(trace_id):
+    return os.path.join(settings.TRACE_DIR, f'{trace_id}.jsonl')
+
+
+class Tracer:
+    """Writes the spans of one trace for one service, nothing without a trace id"""
+
+    def __init__(self, service, trace_id):
+        self.service = service
+        self.trace_id = trace_id
+        self.stack = []
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span_id = uuid.uuid4().hex[:16]
+        parent_id = self.stack[-1] if self.stack else None
+        self.stack.append(span_id)
+        start = time.time()
+        try:
+            yield attributes
+        finally:
+            self.stack.pop()
+            self.write(name, start, time.time(), span_id, parent_id, attributes)
+
+    def record(self, name, start, end, **attributes):
+        """Span measured after the fact, e.g. the wait of a message in Kafka"""
+        self.write(name, start, end, uuid.uuid4().hex[:16], self.stack[-1] if self.stack else None, attributes)
+
+    def write(self, name, start, end, span_id, parent_id, attributes):
+        if not self.trace_id:
+            return
+        span = {
+            'trace_id': self.trace_id,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'name': name,
+            'service': self.service,
+            'start': start,
+            'end': end,
+            'duration': end - start,
+            'attributes': attributes,
+        }
+        try:
+            os.makedirs(settings.TRACE_DIR, exist_ok=True)
+            with open(trace_path(self.trace_id), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(span) + '\n')
+        except OSError as e:
+            # Tracing is diagnostics only, the message is handled without the span
+            logger.warning(f"Span {name} is not written: {e}")
+
+
+def load_spans(trace_id):
+    """Spans of a trace ordered by start, an empty list if the trace file is missing"""
+    spans = []
+    try:
+        with open(trace_path(trace_id), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    # A line cut by a crashed writer
+                    continue
+    except OSError:
+        return []
+    return sorted(spans, key=lambda span: span['start'])
+
+
+def latency_breakdown(spans):
+    """
+    Where the time of a task went: the hops (spans without a parent) in order with their offset
+    from the start of the trace, and the total duration of every span name across the services
+    """
+    if not spans:
+        return {'total': None, 'hops': [], 'by_name': {}}
+
+    trace_start = min(span['start'] for span in spans)
+    by_name = {}
+    for span in spans:
+        by_name[span['name']] = by_name.get(span['name'], 0.0) + span['duration']
+
+    return {
+        'total': max(span['end'] for span in spans) - trace_start,
+        'hops': [
+            {
+                'name': span['name'],
+                'service': span['service'],
+                'offset': span['start'] - trace_start,
+                'duration': span['duration'],
+                'attributes': span.get('attributes') or {},
+            }
+            for span in spans if span.get('parent_id') is None
+        ],
+        'by_name': by_name,
+    }
@@ -3,6 +3,10 @@ from .views import (
     UserTrafficDataView,
     UserVideoResultsView,
     TaskResultView,
+    PeriodStatsView,
+    TaskDiagnosticsView,
+    TaskTraceView,
+    WindowStatsView,
     DownloadReportView,
     DownloadVideoView
 )
@@ -14,6 +18,10 @@ urlpatterns = [
     # New video processing endpoints
     path('results/', UserVideoResultsView.as_view(), name='user_video_results'),
     path('results/<uuid:task_id>/', TaskResultView.as_view(), name='task_result'),
+    path('results/<uuid:task_id>/periods/', PeriodStatsView.as_view(), name='task_periods'),
+    path('results/<uuid:task_id>/diagnostics/', TaskDiagnosticsView.as_view(), name='task_diagnostics'),
+    path('results/<uuid:task_id>/trace/', TaskTraceView.as_view(), name='task_trace'),
+    path('results/<uuid:task_id>/windows/', WindowStatsView.as_view(), name='task_windows'),
 
     # Download endpoints
     path('download/report/<uuid:task_id>/', DownloadReportView.as_view(), name='download_report'),
@@ -6,12 +6,19 @@ from django.conf import settings
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import os
+import json
+import math
 import mimetypes
 import logging
 
-from .models import TrafficData, VideoProcessingResult
+import pandas as pd
+
+from .metrics import observe_download
+from .models import TrafficData, VideoProcessingResult, PeriodStatistics
 from .serializers import TrafficDataSerializer
+from .tracing import latency_breakdown, load_spans
 from .utils import validate_user_token
+from .windows import aggregate_windows
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +62,7 @@ class UserVideoResultsView(APIView):
                                 "task_id": "uuid-here",
                                 "status": "completed",
                                 "created_at": "2024-01-01T10:00:00Z",
+                                "is_preliminary": False,
                                 "report_download_url": "/api/download/report/uuid-here/",
                                 "video_download_url": "/api/download/video/uuid-here/"
                             }
@@ -90,14 +98,23 @@ class UserVideoResultsView(APIView):
                 'created_at': result.created_at,
                 'updated_at': result.updated_at,
                 'error_message': result.error_message,
+                'is_preliminary': result.is_preliminary,
+                # Closed periods arrive while the video is still being processed
+                'periods_url': f'/api/results/{result.task_id}/periods/',
             }
 
             # Add download URLs if files exist
             if result.status == 'completed':
                 if result.report_path:
                     result_data['report_download_url'] = f'/api/download/report/{result.task_id}/'
+                    result_data['report_formats'] = list(result.report_paths or ['xlsx'])
                 if result.output_video_path:
                     result_data['video_download_url'] = f'/api/download/video/{result.task_id}/'
+                if result.buckets_path:
+                    result_data['windows_url'] = f'/api/results/{result.task_id}/windows/'
+            elif result.is_preliminary and result.report_path:
+                # Quick preview pass finished, the full-fidelity report will replace it
+                result_data['report_download_url'] = f'/api/download/report/{result.task_id}/'
 
             results_data.append(result_data)
 
@@ -151,13 +168,26 @@ class TaskResultView(APIView):
                 'created_at': result.created_at,
                 'updated_at': result.updated_at,
                 'error_message': result.error_message,
+                'is_preliminary': result.is_preliminary,
+                # Closed periods arrive while the video is still being processed
+                'periods_url': f'/api/results/{result.task_id}/periods/',
             }
 
             if result.status == 'completed':
                 if result.report_path:
                     result_data['report_download_url'] = f'/api/download/report/{result.task_id}/'
+                    result_data['report_formats'] = list(result.report_paths or ['xlsx'])
                 if result.output_video_path:
                     result_data['video_download_url'] = f'/api/download/video/{result.task_id}/'
+                if result.buckets_path:
+                    result_data['windows_url'] = f'/api/results/{result.task_id}/windows/'
+                if result.diagnostics:
+                    result_data['diagnostics_url'] = f'/api/results/{result.task_id}/diagnostics/'
+                if result.resource_usage:
+                    result_data['resource_usage'] = result.resource_usage
+            elif result.is_preliminary and result.report_path:
+                # Quick preview pass finished, the full-fidelity report will replace it
+                result_data['report_download_url'] = f'/api/download/report/{result.task_id}/'
 
             return Response(result_data)
 
@@ -166,12 +196,305 @@ class TaskResultView(APIView):
                             status=status.HTTP_404_NOT_FOUND)
 
 
+class TaskDiagnosticsView(APIView):
+    """Diagnostics recorded by the ML service for a task, e.g. per-stage timing histograms"""
+
+    @swagger_auto_schema(
+        operation_summary="Get task diagnostics",
+        operation_description="Contents of the diagnostic files written by the ML service for a finished task: "
+                              "per-stage timings (count, total, p50/p95/max in seconds) with the host and pipeline "
+                              "and the CPU profile summary or memory timeline when the task was profiled.",
+        manual_parameters=[
+            openapi.Parameter(
+                'Authorization',
+                openapi.IN_HEADER,
+                description="Bearer JWT token",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'task_id',
+                openapi.IN_PATH,
+                description="UUID of the task",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={200: "Task diagnostics", 401: "Unauthorized", 404: "Task not found"}
+    )
+    def get(self, request, task_id):
+        # Check authentication
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if not auth_header:
+            return Response({'error': 'Authorization header missing'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        auth_result = validate_user_token(auth_header)
+        if not auth_result.get('valid'):
+            return Response({'error': 'Invalid token'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        user_id = auth_result['user_id']
+
+        try:
+            result = VideoProcessingResult.objects.get(task_id=task_id, user_id=user_id)
+        except VideoProcessingResult.DoesNotExist:
+            return Response({'error': 'Task not found'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        # "timings_path" -> "timings": contents of every diagnostic file that is still on disk
+        diagnostics = {}
+        for key, path in (result.diagnostics or {}).items():
+            if key.endswith('_path') and path and os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    diagnostics[key.removesuffix('_path')] = json.load(f)
+
+        return Response({
+            'task_id': str(result.task_id),
+            'status': result.status,
+            'resource_usage': result.resource_usage,
+            **diagnostics
+        })
+
+
+class TaskTraceView(APIView):
+    """Latency breakdown of a task from upload to the saved result"""
+
+    @swagger_auto_schema(
+        operation_summary="Get task trace",
+        operation_description="Spans recorded for the task by video_service, ml_service and statistics_service "
+                              "(epoch seconds) and the latency breakdown: the hops in order (upload, publish, "
+                              "task_queue, ml_processing, result_queue, result_ingest) with their offset from the "
+                              "upload and duration, and the total time of every span name, e.g. main_pass, frames.",
+        manual_parameters=[
+            openapi.Parameter(
+                'Authorization',
+                openapi.IN_HEADER,
+                description="Bearer JWT token",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'task_id',
+                openapi.IN_PATH,
+                description="UUID of the task",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={200: "Task trace", 401: "Unauthorized", 404: "Task or trace not found"}
+    )
+    def get(self, request, task_id):
+        # Check authentication
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if not auth_header:
+            return Response({'error': 'Authorization header missing'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        auth_result = validate_user_token(auth_header)
+        if not auth_result.get('valid'):
+            return Response({'error': 'Invalid token'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        user_id = auth_result['user_id']
+
+        try:
+            result = VideoProcessingResult.objects.get(task_id=task_id, user_id=user_id)
+        except VideoProcessingResult.DoesNotExist:
+            return Response({'error': 'Task not found'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        trace_id = (result.diagnostics or {}).get('trace_id')
+        spans = load_spans(trace_id) if trace_id else []
+        if not spans:
+            return Response({'error': 'Trace not found'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            'task_id': str(result.task_id),
+            'trace_id': trace_id,
+            'breakdown': latency_breakdown(spans),
+            'spans': spans
+        })
+
+
+class PeriodStatsView(APIView):
+    """Per-period statistics received so far, available before the final report"""
+
+    @swagger_auto_schema(
+        operation_summary="Get per-period statistics",
+        operation_description="Statistics of every closed period per sector, published by the ML service as soon as "
+                              "each period closes. Full-pass periods are returned once any exist, otherwise the "
+                              "periods of the quick preliminary pass.",
+        manual_parameters=[
+            openapi.Parameter(
+                'Authorization',
+                openapi.IN_HEADER,
+                description="Bearer JWT token",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'task_id',
+                openapi.IN_PATH,
+                description="UUID of the task",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={200: "Per-period statistics", 401: "Unauthorized", 404: "Task not found"}
+    )
+    def get(self, request, task_id):
+        # Check authentication
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if not auth_header:
+            return Response({'error': 'Authorization header missing'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        auth_result = validate_user_token(auth_header)
+        if not auth_result.get('valid'):
+            return Response({'error': 'Invalid token'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        user_id = auth_result['user_id']
+
+        try:
+            result = VideoProcessingResult.objects.get(task_id=task_id, user_id=user_id)
+        except VideoProcessingResult.DoesNotExist:
+            return Response({'error': 'Task not found'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        periods = PeriodStatistics.objects.filter(task_id=task_id)
+        is_preliminary = not periods.filter(is_preliminary=False).exists()
+        periods = periods.filter(is_preliminary=is_preliminary).order_by('sector_id', 'period_index')
+
+        return Response({
+            'task_id': str(result.task_id),
+            'status': result.status,
+            'is_preliminary': is_preliminary,
+            'periods': [
+                {
+                    'sector_id': period.sector_id,
+                    'period_index': period.period_index,
+                    'start_time': period.start_time,
+                    'end_time': period.end_time,
+                    'observation_time': period.observation_time,
+                    **period.stats
+                }
+                for period in periods
+            ]
+        })
+
+
+class WindowStatsView(APIView):
+    """Traffic metrics for a custom rolling window, built from the stored statistics buckets"""
+
+    @swagger_auto_schema(
+        operation_summary="Get rolling window statistics",
+        operation_description="Aggregate the statistics buckets of a completed task into windows of any length "
+                              "that is a multiple of the bucket time. Without step the windows are adjacent.",
+        manual_parameters=[
+            openapi.Parameter(
+                'Authorization',
+                openapi.IN_HEADER,
+                description="Bearer JWT token",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'task_id',
+                openapi.IN_PATH,
+                description="UUID of the task",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'window',
+                openapi.IN_QUERY,
+                description="Window length in seconds",
+                type=openapi.TYPE_NUMBER,
+                required=True
+            ),
+            openapi.Parameter(
+                'step',
+                openapi.IN_QUERY,
+                description="Window step in seconds (defaults to the window length)",
+                type=openapi.TYPE_NUMBER,
+                required=False
+            )
+        ],
+        responses={200: "Per-window statistics", 400: "Invalid window", 401: "Unauthorized", 404: "Task not found"}
+    )
+    def get(self, request, task_id):
+        # Check authentication
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if not auth_header:
+            return Response({'error': 'Authorization header missing'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        auth_result = validate_user_token(auth_header)
+        if not auth_result.get('valid'):
+            return Response({'error': 'Invalid token'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        user_id = auth_result['user_id']
+
+        try:
+            window = float(request.query_params['window'])
+            step = float(request.query_params['step']) if request.query_params.get('step') else None
+            if not math.isfinite(window) or (step is not None and not math.isfinite(step)):
+                raise ValueError(window, step)
+        except (KeyError, ValueError):
+            return Response({'error': 'window (and optional step) must be numbers of seconds'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = VideoProcessingResult.objects.get(task_id=task_id, user_id=user_id, status='completed')
+        except VideoProcessingResult.DoesNotExist:
+            return Response({'error': 'Task not found'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        if not result.buckets_path or not os.path.exists(result.buckets_path):
+            return Response({'error': 'Statistics buckets not found'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        buckets = pd.read_csv(result.buckets_path)
+        if buckets.empty:
+            return Response({'task_id': str(result.task_id), 'window': window, 'step': step or window, 'windows': []})
+
+        try:
+            windows = aggregate_windows(buckets, window, step)
+        except (ValueError, OverflowError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # NaN is not valid JSON, periods without vehicles report null
+        records = windows.astype(object).where(windows.notna(), None).to_dict(orient='records')
+        return Response({
+            'task_id': str(result.task_id),
+            'window': window,
+            'step': step or window,
+            'windows': records
+        })
+
+
+# Report format -> (file extension, content type)
+REPORT_CONTENT_TYPES = {
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'json': ('.json', 'application/json'),
+    'csv': ('.csv.zip', 'application/zip'),
+    'parquet': ('.parquet.zip', 'application/zip'),
+}
+
+
 class DownloadReportView(APIView):
-    """Download Excel report file"""
+    """Download report file in one of the requested formats"""
 
     @swagger_auto_schema(
-        operation_summary="Download Excel report",
-        operation_description="Download the Excel statistics report for a completed task",
+        operation_summary="Download report",
+        operation_description="Download the statistics report for a completed task. "
+                              "While the full pass is running, the preliminary report of the quick pass is served if available. "
+                              "report_format selects one of the formats requested at upload: xlsx, json, "
+                              "csv or parquet (zip archives with a file per sheet).",
         manual_parameters=[
             openapi.Parameter(
                 'Authorization',
@@ -186,14 +509,23 @@ class DownloadReportView(APIView):
                 description="UUID of the task",
                 type=openapi.TYPE_STRING,
                 required=True
+            ),
+            openapi.Parameter(
+                'report_format',
+                openapi.IN_QUERY,
+                description="Report format (default: xlsx if it was requested, otherwise the first requested format)",
+                type=openapi.TYPE_STRING,
+                enum=list(REPORT_CONTENT_TYPES),
+                required=False
             )
         ],
         responses={
-            200: openapi.Response(description="Excel file download"),
+            200: openapi.Response(description="Report file download"),
             401: "Unauthorized",
             404: "File not found"
         }
     )
+    @observe_download('report')
     def get(self, request, task_id):
         # Check authentication
         auth_header = request.META.get('HTTP_AUTHORIZATION')
@@ -209,22 +541,32 @@ class DownloadReportView(APIView):
         user_id = auth_result['user_id']
 
         try:
-            result = VideoProcessingResult.objects.get(
-                task_id=task_id,
-                user_id=user_id,
-                status='completed'
-            )
+            result = VideoProcessingResult.objects.get(task_id=task_id, user_id=user_id)
 
-            if not result.report_path or not os.path.exists(result.report_path):
+            # Preliminary report is available while the full pass is still running
+            if result.status != 'completed' and not result.is_preliminary:
+                raise Http404("Report is not ready yet")
+
+            # Results saved before multi-format reports only have the xlsx path
+            report_paths = result.report_paths or {'xlsx': result.report_path}
+            report_format = request.query_params.get('report_format')
+            if report_format is None:
+                report_format = 'xlsx' if 'xlsx' in report_paths else next(iter(report_paths))
+            if report_format not in REPORT_CONTENT_TYPES:
+                return Response({'error': f"Unknown report format, use one of: {', '.join(REPORT_CONTENT_TYPES)}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            report_path = report_paths.get(report_format)
+            if not report_path or not os.path.exists(report_path):
                 raise Http404("Report file not found")
 
+            suffix = '_preliminary' if result.is_preliminary else ''
+            extension, content_type = REPORT_CONTENT_TYPES[report_format]
+
             # Serve the file
-            with open(result.report_path, 'rb') as f:
-                response = HttpResponse(
-                    f.read(),
-                    content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-                response['Content-Disposition'] = f'attachment; filename="traffic_report_{task_id}.xlsx"'
+            with open(report_path, 'rb') as f:
+                response = HttpResponse(f.read(), content_type=content_type)
+                response['Content-Disposition'] = f'attachment; filename="traffic_report_{task_id}{suffix}{extension}"'
                 return response
 
         except VideoProcessingResult.DoesNotExist:
@@ -259,6 +601,7 @@ class DownloadVideoView(APIView):
             404: "File not found"
         }
     )
+    @observe_download('video')
     def get(self, request, task_id):
         # Check authentication
         auth_header = request.META.get('HTTP_AUTHORIZATION')
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+SECS_IN_HOUR = 3600
+
+
+def aggregate_windows(buckets: pd.DataFrame, window: float, step: float | None = None) -> pd.DataFrame:
+    """
+    Build per-window traffic metrics from the statistics buckets exported by the ML service.
+    Any window that is a multiple of the bucket length is a sum over consecutive buckets,
+    so every resolution comes from the same single pass over the video.
+    Windows and steps longer than the stored buckets span are capped at the span.
+    """
+    step = step or window
+    if not math.isfinite(window) or not math.isfinite(step):
+        raise ValueError("window and step must be finite")
+    bucket_time = float(buckets['bucket_time'].iloc[0])
+    per_window = round(window / bucket_time)
+    per_step = round(step / bucket_time)
+    if per_window < 1 or per_step < 1 or per_window * bucket_time != window or per_step * bucket_time != step:
+        raise ValueError(f"window and step must be multiples of the bucket time ({bucket_time:g} s)")
+
+    # The prefix sums below are as long as the window: a longer window adds no data, only memory
+    span = round((buckets['bucket_start'].max() - buckets['bucket_start'].min()) / bucket_time) + 1
+    per_window = min(per_window, span)
+    per_step = min(per_step, span)
+    window = per_window * bucket_time
+
+    summed = ['observed_time', 'weighted_count', 'travel_count', 'travel_sum', 'free_count', 'free_sum']
+    results = []
+    for sector_id, sector in buckets.groupby('sector_id', sort=False):
+        keys = np.rint(sector['bucket_start'].to_numpy() / bucket_time).astype(np.int64)
+        first = keys.min() // per_step * per_step
+        size = keys.max() - first + per_window
+
+        # Dense prefix sums over bucket index: any window is a difference of two prefixes
+        dense = np.zeros((size + 1, len(summed)))
+        dense[keys - first + 1] = sector[summed].to_numpy(dtype=float)
+        prefix = np.cumsum(dense, axis=0)
+
+        starts = np.arange(0, keys.max() - first + 1, per_step)
+        totals = prefix[starts + per_window] - prefix[starts]
+        observed, weighted, travel_count, travel_sum, free_count, free_sum = totals.T
+
+        length = float(sector['sector_length'].iloc[0])
+        lanes = float(sector['lanes_count'].iloc[0])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Same formulas as the ML report: intensity per hour, speed from the sector length
+            intensity = weighted / (observed / SECS_IN_HOUR)
+            mean_travel = travel_sum / travel_count
+            mean_free = free_sum / free_count
+            speed = length / (mean_travel / SECS_IN_HOUR)
+            density = intensity / (lanes * speed)
+
+        frame = pd.DataFrame({
+            'sector_id': sector_id,
+            'window_start': (starts + first) * bucket_time,
+            'window_end': (starts + first) * bucket_time + window,
+            'observed_time': observed,
+            'intensity': intensity,
+            'mean_travel_time': mean_travel,
+            'mean_speed': speed,
+            'density': density,
+            'mean_free_time': mean_free,
+            'mean_delay': mean_travel - mean_free,
+            'time_index': mean_travel / mean_free,
+        })
+        # Windows that fall entirely into skipped parts of the video carry no data
+        results.append(frame[frame['observed_time'] > 0])
+
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True).replace([np.inf, -np.inf], np.nan)
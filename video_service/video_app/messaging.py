@@ -0,0 +1,75 @@
+"""
+Message producer: Kafka or the local SQLite broker shared by the services on one machine.
+
+settings.MESSAGING_BACKEND selects "kafka" (default) or "local". The local broker keeps Kafka topic
+semantics (an append-only log per topic, offsets committed per consumer group) in the file
+settings.MESSAGING_LOCAL_PATH; ml_service and statistics_service read the same file.
+"""
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    "offset" INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    value BLOB NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_topic ON messages (topic, "offset");
+CREATE TABLE IF NOT EXISTS group_offsets (
+    group_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    "offset" INTEGER NOT NULL,
+    PRIMARY KEY (group_id, topic)
+);
+"""
+
+
+class LocalProducer:
+    """Local broker producer with the KafkaProducer interface used here: send, flush, close"""
+
+    def __init__(self, value_serializer=None, path=None):
+        self.path = path or settings.MESSAGING_LOCAL_PATH
+        self.value_serializer = value_serializer or (lambda value: value)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = self.connect()
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def send(self, topic, value=None):
+        # The message is in the log once send returns
+        connection = self.connect()
+        try:
+            connection.execute(
+                'INSERT INTO messages (topic, value, timestamp) VALUES (?, ?, ?)',
+                (topic, self.value_serializer(value), time.time())
+            )
+        finally:
+            connection.close()
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+
+def create_producer(value_serializer=None):
+    """Producer of the configured backend"""
+    if settings.MESSAGING_BACKEND == 'local':
+        return LocalProducer(value_serializer)
+
+    from kafka import KafkaProducer
+    return KafkaProducer(
+        bootstrap_servers=[settings.KAFKA_BOOTSTRAP_SERVERS],
+        value_serializer=value_serializer
+    )
@@ -0,0 +1,36 @@
+"""
+Prometheus metrics of the video service, exposed at /metrics.
+
+Upload throughput is rate(video_upload_bytes_total); Kafka publish latency is measured
+around send and flush, so it includes the broker acknowledgement.
+"""
+import functools
+import time
+
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+UPLOADS = Counter('video_uploads_total', 'Upload requests by response status', ['status'])
+UPLOAD_BYTES = Counter('video_upload_bytes_total', 'Bytes of uploaded videos written to shared storage')
+UPLOAD_SECONDS = Histogram(
+    'video_upload_duration_seconds', 'Upload request handling time, from the parsed body to the response',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+)
+PUBLISH_SECONDS = Histogram('video_task_publish_duration_seconds', 'Time to publish a task to video_processing_tasks')
+PUBLISH_FAILURES = Counter('video_task_publish_failures_total', 'Tasks that could not be published')
+
+
+def observe_upload(post):
+    """Times an upload view method and counts its responses by status"""
+    @functools.wraps(post)
+    def wrapper(view, request, *args, **kwargs):
+        start = time.perf_counter()
+        response = post(view, request, *args, **kwargs)
+        UPLOAD_SECONDS.observe(time.perf_counter() - start)
+        UPLOADS.labels(str(response.status_code)).inc()
+        return response
+    return wrapper
+
+
+def metrics_view(request):
+    return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
@@ -9,6 +9,8 @@ class VideoTask(models.Model):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelling', 'Cancellation Requested'),
+        ('cancelled', 'Cancelled'),
     ]
 
     task_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
@@ -16,6 +18,12 @@ class VideoTask(models.Model):
     original_filename = models.CharField(max_length=255)
     video_path = models.CharField(max_length=500)
     sector_config = models.JSONField()  # ROI data from frontend
+    start_time = models.FloatField(blank=True, null=True)  # Seconds from the beginning of the video
+    end_time = models.FloatField(blank=True, null=True)
+    sample_duration = models.FloatField(blank=True, null=True)  # Sampling schedule, seconds
+    sample_interval = models.FloatField(blank=True, null=True)
+    preview = models.BooleanField(default=False)  # Quick preliminary pass before the full one
+    report_formats = models.JSONField(default=list, blank=True)  # Requested report formats, xlsx if empty
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploaded')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
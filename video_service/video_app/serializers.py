@@ -22,10 +22,47 @@ class ROIDataSerializer(serializers.Serializer):
     max_speed = serializers.IntegerField(help_text="Maximum speed limit in km/h")
 
 
+class MultiSectorROIDataSerializer(serializers.Serializer):
+    """Several sectors of one video, analysed in a single pass"""
+    sectors = ROIDataSerializer(many=True, help_text="List of sector ROIs")
+
+
+def positive(value):
+    """Sampling schedule values are lengths of time, zero is not a schedule"""
+    if value <= 0:
+        raise serializers.ValidationError('Must be greater than 0')
+
+
 class VideoUploadSerializer(serializers.Serializer):
     """Video upload request structure"""
     video = serializers.FileField(help_text="Video file (MP4, AVI, MOV formats supported)")
-    roi_data = serializers.CharField(help_text="JSON string containing ROI data structure")
+    roi_data = serializers.CharField(
+        help_text="JSON string containing ROI data structure, a list of them or {\"sectors\": [...]}"
+    )
+    start = serializers.FloatField(
+        required=False, min_value=0,
+        help_text="Offset in seconds to start the analysis from (default: beginning of the video)"
+    )
+    end = serializers.FloatField(
+        required=False, min_value=0,
+        help_text="Offset in seconds to stop the analysis at (default: end of the video)"
+    )
+    sample_duration = serializers.FloatField(
+        required=False, validators=[positive],
+        help_text="Sampling mode: seconds analysed out of every sample_interval, greater than 0"
+    )
+    sample_interval = serializers.FloatField(
+        required=False, validators=[positive],
+        help_text="Sampling mode: period of the sampling schedule in seconds, greater than 0"
+    )
+    preview = serializers.BooleanField(
+        required=False, default=False,
+        help_text="Publish preliminary statistics from a quick low-resolution pass before the full pass"
+    )
+    report_formats = serializers.CharField(
+        required=False,
+        help_text="Comma separated report formats: xlsx, csv, json, parquet (default: xlsx)"
+    )
 
 
 class VideoUploadResponseSerializer(serializers.Serializer):
@@ -33,6 +70,14 @@ class VideoUploadResponseSerializer(serializers.Serializer):
     task_id = serializers.UUIDField(help_text="Unique task identifier for tracking")
     status = serializers.CharField(help_text="Current task status")
     message = serializers.CharField(help_text="Success message")
+    trace_id = serializers.CharField(help_text="Trace of the task across the services, see /api/results/<task_id>/trace/ of statistics service")
+
+
+class TaskCancelResponseSerializer(serializers.Serializer):
+    """Task cancellation response structure"""
+    task_id = serializers.UUIDField(help_text="Unique task identifier")
+    status = serializers.CharField(help_text="cancelling: cancelled once ML service reports it, unless the task finishes first")
+    message = serializers.CharField(help_text="Confirmation message")
 
 
 class TaskStatusResponseSerializer(serializers.ModelSerializer):
@@ -1,3 +1,187 @@
-from django.test import TestCase
+from unittest.mock import patch
 
-# Create your tests here.
+import requests
+from django.test import SimpleTestCase, TestCase
+
+from .models import VideoTask
+from .serializers import VideoUploadSerializer
+from .utils import normalize_roi_sectors, parse_report_formats, parse_sampling_schedule
+
+
+def make_roi(**extra):
+    roi = {
+        "start_region": [[100, 100], [200, 100], [200, 200], [100, 200]],
+        "end_region": [[300, 100], [400, 100], [400, 200], [300, 200]],
+        "lanes": [[[150, 100], [250, 100], [250, 200], [150, 200]]],
+        "lanes_count": 1,
+        "length_km": 0.1,
+        "max_speed": 60
+    }
+    roi.update(extra)
+    return roi
+
+
+class NormalizeROISectorsTestCase(SimpleTestCase):
+    def test_single_roi_object_becomes_one_sector(self):
+        sectors = normalize_roi_sectors(make_roi())
+        self.assertEqual(len(sectors), 1)
+        self.assertEqual(sectors[0]['sector_id'], 1)
+
+    def test_list_and_sectors_key_are_accepted(self):
+        rois = [make_roi(), make_roi(sector_id=7)]
+        self.assertEqual([s['sector_id'] for s in normalize_roi_sectors(rois)], [1, 7])
+        self.assertEqual(len(normalize_roi_sectors({'sectors': [make_roi(), make_roi()]})), 2)
+
+    def test_missing_field_is_reported_with_sector_number(self):
+        roi = make_roi()
+        del roi['lanes']
+        with self.assertRaisesMessage(ValueError, 'Missing ROI field: lanes (sector #2)'):
+            normalize_roi_sectors([make_roi(), roi])
+
+    def test_duplicate_sector_ids_are_rejected(self):
+        with self.assertRaises(ValueError):
+            normalize_roi_sectors([make_roi(sector_id=1), make_roi(sector_id=1)])
+
+    def test_payload_of_the_caller_is_not_changed(self):
+        rois = [make_roi(), make_roi()]
+
+        normalize_roi_sectors(rois)
+
+        self.assertNotIn('sector_id', rois[0])
+
+    def test_default_ids_skip_explicit_ones(self):
+        sectors = normalize_roi_sectors([make_roi(sector_id=2), make_roi(), make_roi()])
+        self.assertEqual([s['sector_id'] for s in sectors], [2, 1, 3])
+
+    def test_sector_id_is_a_valid_sheet_name(self):
+        sectors = normalize_roi_sectors([make_roi(sector_id=' North/[A]: ' + 'x' * 40)])
+        self.assertEqual(sectors[0]['sector_id'], 'NorthA ' + 'x' * 24)
+
+    def test_same_sheet_name_is_a_duplicate(self):
+        with self.assertRaisesMessage(ValueError, 'Duplicate sector_id'):
+            normalize_roi_sectors([make_roi(sector_id=1), make_roi(sector_id='1')])
+
+    def test_invalid_sector_ids_are_rejected(self):
+        for sector_id in (None, 1.5, True, ['a'], '/?*'):
+            with self.assertRaises(ValueError, msg=repr(sector_id)):
+                normalize_roi_sectors([make_roi(sector_id=sector_id)])
+
+
+class ParseReportFormatsTestCase(SimpleTestCase):
+    def test_missing_formats_mean_default(self):
+        self.assertEqual(parse_report_formats({}), [])
+
+    def test_comma_separated_string_is_normalized(self):
+        self.assertEqual(parse_report_formats({'report_formats': 'CSV, json,csv'}), ['csv', 'json'])
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'pdf'):
+            parse_report_formats({'report_formats': ['xlsx', 'pdf']})
+
+
+class SamplingScheduleTestCase(SimpleTestCase):
+    def test_zero_is_rejected_by_the_serializer_and_the_parser(self):
+        for field in ('sample_duration', 'sample_interval'):
+            data = {'sample_duration': 10, 'sample_interval': 60, field: 0}
+            serializer = VideoUploadSerializer(data=data)
+            self.assertFalse(serializer.is_valid())
+            self.assertIn(field, serializer.errors)
+            with self.assertRaises(ValueError):
+                parse_sampling_schedule(data)
+
+    def test_positive_schedule_is_accepted(self):
+        serializer = VideoUploadSerializer(data={'sample_duration': 10, 'sample_interval': 60})
+        serializer.is_valid()
+        self.assertNotIn('sample_duration', serializer.errors)
+        self.assertNotIn('sample_interval', serializer.errors)
+        self.assertEqual(parse_sampling_schedule({'sample_duration': 10, 'sample_interval': 60}), (10.0, 60.0))
+
+
+class MetricsViewTestCase(SimpleTestCase):
+    def test_upload_responses_are_counted_by_status(self):
+        self.client.post('/api/upload/')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('video_uploads_total{status="401"}', response.content.decode())
+        self.assertIn('video_task_publish_duration_seconds_count', response.content.decode())
+
+
+@patch('video_app.views.send_cancel_event', return_value=True)
+@patch('video_app.views.fetch_result_status', return_value=None)
+@patch('video_app.views.validate_user_token', return_value={'valid': True, 'user_id': '1'})
+class TaskCancelViewTestCase(TestCase):
+    def setUp(self):
+        self.task = VideoTask.objects.create(
+            user_id='1', original_filename='video.mp4', video_path='/shared/videos/video.mp4',
+            sector_config={'sectors': []}, status='queued'
+        )
+
+    def cancel(self, **headers):
+        headers.setdefault('HTTP_AUTHORIZATION', 'Bearer token')
+        return self.client.delete(f'/api/task/{self.task.task_id}/', **headers)
+
+    def status(self):
+        return self.client.get(f'/api/task/{self.task.task_id}/', HTTP_AUTHORIZATION='Bearer token').json()['status']
+
+    def test_queued_task_is_cancelling_until_ml_service_reports(self, validate, fetch_result_status, send):
+        response = self.cancel()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'cancelling')
+        send.assert_called_once_with(self.task)
+        self.assertEqual(self.status(), 'cancelling')
+
+        fetch_result_status.return_value = 'cancelled'
+        self.assertEqual(self.status(), 'cancelled')
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'cancelled')
+
+    def test_task_finished_before_the_cancellation_shows_its_result(self, validate, fetch_result_status, send):
+        self.assertEqual(self.cancel().status_code, 202)
+        fetch_result_status.return_value = 'completed'
+
+        self.assertEqual(self.status(), 'completed')
+
+    def test_unreachable_statistics_service_keeps_cancelling(self, validate, fetch_result_status, send):
+        self.assertEqual(self.cancel().status_code, 202)
+        fetch_result_status.side_effect = requests.ConnectionError('refused')
+
+        self.assertEqual(self.status(), 'cancelling')
+
+    def test_task_finished_in_statistics_cannot_be_cancelled(self, validate, fetch_result_status, send):
+        fetch_result_status.return_value = 'completed'
+
+        response = self.cancel()
+
+        self.assertEqual(response.status_code, 409)
+        send.assert_not_called()
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'completed')
+
+    def test_cancelled_task_cannot_be_cancelled_again(self, validate, fetch_result_status, send):
+        self.assertEqual(self.cancel().status_code, 202)
+        self.assertEqual(self.cancel().status_code, 409)
+
+        fetch_result_status.return_value = 'cancelled'
+        self.assertEqual(self.cancel().status_code, 409)
+        send.assert_called_once()
+
+    def test_unreachable_statistics_service_keeps_the_task(self, validate, fetch_result_status, send):
+        fetch_result_status.side_effect = requests.ConnectionError('refused')
+
+        self.assertEqual(self.cancel().status_code, 503)
+        send.assert_not_called()
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'queued')
+
+    def test_task_of_another_user_is_not_found(self, validate, fetch_result_status, send):
+        validate.return_value = {'valid': True, 'user_id': '2'}
+
+        self.assertEqual(self.cancel().status_code, 404)
+
+    def test_authorization_is_required(self, validate, fetch_result_status, send):
+        response = self.client.delete(f'/api/task/{self.task.task_id}/')
+
+        self.assertEqual(response.status_code, 401)
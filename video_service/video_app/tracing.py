@@ -0,0 +1,67 @@
+"""
+Task traces shared by the services.
+
+A trace id is created for every upload and travels with the task in the Kafka messages
+(and to main.py in its environment). Each service appends its spans to
+settings.TRACE_DIR/<trace_id>.jsonl, one JSON object per line, and statistics_service
+serves the latency breakdown of the task from that file.
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+class Tracer:
+    """Writes the spans of one trace for one service"""
+
+    def __init__(self, service, trace_id):
+        self.service = service
+        self.trace_id = trace_id
+        self.stack = []
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span_id = uuid.uuid4().hex[:16]
+        parent_id = self.stack[-1] if self.stack else None
+        self.stack.append(span_id)
+        start = time.time()
+        try:
+            yield attributes
+        finally:
+            self.stack.pop()
+            self.write(name, start, time.time(), span_id, parent_id, attributes)
+
+    def record(self, name, start, end, **attributes):
+        """Span measured after the fact, e.g. from the start of the request"""
+        self.write(name, start, end, uuid.uuid4().hex[:16], self.stack[-1] if self.stack else None, attributes)
+
+    def write(self, name, start, end, span_id, parent_id, attributes):
+        span = {
+            'trace_id': self.trace_id,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'name': name,
+            'service': self.service,
+            'start': start,
+            'end': end,
+            'duration': end - start,
+            'attributes': attributes,
+        }
+        try:
+            os.makedirs(settings.TRACE_DIR, exist_ok=True)
+            with open(os.path.join(settings.TRACE_DIR, f'{self.trace_id}.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(span) + '\n')
+        except OSError as e:
+            # Tracing is diagnostics only, the request goes on without the span
+            logger.warning(f"Span {name} is not written: {e}")
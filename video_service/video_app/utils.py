@@ -1,11 +1,14 @@
 import requests
 import json
 import os
+import re
 import uuid
-from kafka import KafkaProducer
 from django.conf import settings
 import logging
 
+from .messaging import create_producer
+from .metrics import PUBLISH_FAILURES, PUBLISH_SECONDS, UPLOAD_BYTES
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,6 +34,19 @@ def validate_user_token(token):
         return {"valid": False, "error": f"Auth service unavailable: {e}"}
 
 
+def fetch_result_status(task_id, auth_header):
+    """Status of the task result in Statistics Service, None while ML service has not reported any"""
+    response = requests.get(
+        f"{settings.STATISTICS_SERVICE_URL}/api/results/{task_id}/",
+        headers={'Authorization': auth_header},
+        timeout=5
+    )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json().get('status')
+
+
 def save_video_file(video_file, user_id):
     """Saves uploaded video to shared storage"""
     try:
@@ -46,6 +62,7 @@ def save_video_file(video_file, user_id):
         with open(video_path, 'wb') as f:
             for chunk in video_file.chunks():
                 f.write(chunk)
+        UPLOAD_BYTES.inc(video_file.size)
 
         logger.info(f"Video saved: {video_path}")
         return video_path
@@ -55,14 +72,146 @@ def save_video_file(video_file, user_id):
         raise
 
 
-def create_sector_json(roi_data, user_id):
-    """Creates JSON file with sector coordinates for ML service"""
+def parse_time_window(data):
+    """Parses optional start/end offsets (in seconds) of the part of the video to analyse"""
+    window = {}
+    for field in ('start', 'end'):
+        value = data.get(field)
+        if value in (None, ''):
+            window[field] = None
+            continue
+
+        try:
+            window[field] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{field} must be a number of seconds')
+
+        if window[field] < 0:
+            raise ValueError(f'{field} must not be negative')
+
+    if window['start'] is not None and window['end'] is not None and window['end'] <= window['start']:
+        raise ValueError('end must be greater than start')
+
+    return window['start'], window['end']
+
+
+def parse_sampling_schedule(data):
+    """Parses optional sampling schedule: analyse sample_duration seconds out of every sample_interval"""
+    duration = data.get('sample_duration')
+    interval = data.get('sample_interval')
+    if duration in (None, '') and interval in (None, ''):
+        return None, None
+    if duration in (None, '') or interval in (None, ''):
+        raise ValueError('sample_duration and sample_interval must be set together')
+
     try:
-        # Convert ROI data to ML service format
+        duration, interval = float(duration), float(interval)
+    except (TypeError, ValueError):
+        raise ValueError('sample_duration and sample_interval must be numbers of seconds')
+
+    if not 0 < duration <= interval:
+        raise ValueError('sample_duration must be positive and not greater than sample_interval')
+
+    return duration, interval
+
+
+REPORT_FORMATS = ['xlsx', 'csv', 'json', 'parquet']
+
+
+def parse_report_formats(data):
+    """Parses optional report formats given as a list or a comma separated string"""
+    if hasattr(data, 'getlist') and len(data.getlist('report_formats')) > 1:
+        formats = data.getlist('report_formats')
+    else:
+        formats = data.get('report_formats')
+
+    if formats in (None, '', []):
+        return []
+    if isinstance(formats, str):
+        formats = formats.split(',')
+
+    formats = [str(name).strip().lower() for name in formats if str(name).strip()]
+    unknown = [name for name in formats if name not in REPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"unsupported report formats: {', '.join(unknown)}; use {', '.join(REPORT_FORMATS)}")
+
+    # Keep the order of the request, drop repeats
+    return list(dict.fromkeys(formats))
+
+
+ROI_REQUIRED_FIELDS = ['start_region', 'end_region', 'lanes', 'lanes_count', 'length_km', 'max_speed']
+
+# The sector id names the sector sheet of the Excel report: no characters Excel forbids, at most 31 of them
+SHEET_NAME_FORBIDDEN = re.compile(r'[\[\]:*?/\\]')
+SHEET_NAME_MAX_LENGTH = 31
+
+
+def normalize_sector_id(sector_id, number):
+    """Sector id usable as a report sheet name, ValueError for ids of other types or empty ones"""
+    if isinstance(sector_id, bool) or not isinstance(sector_id, (int, str)):
+        raise ValueError(f'sector_id must be an integer or a string (sector #{number})')
+    if isinstance(sector_id, str):
+        sector_id = SHEET_NAME_FORBIDDEN.sub('', sector_id).strip()[:SHEET_NAME_MAX_LENGTH]
+        if not sector_id:
+            raise ValueError(f'sector_id must not be empty (sector #{number})')
+    return sector_id
+
+
+def normalize_roi_sectors(roi_data):
+    """
+    Returns the list of sector ROIs from the upload payload.
+    Accepts a single ROI object, a list of ROI objects or {"sectors": [...]}
+    """
+    if isinstance(roi_data, dict) and 'sectors' in roi_data:
+        roi_sectors = roi_data['sectors']
+    elif isinstance(roi_data, list):
+        roi_sectors = roi_data
+    else:
+        roi_sectors = [roi_data]
+
+    if not isinstance(roi_sectors, list) or not roi_sectors:
+        raise ValueError('At least one sector is required')
+
+    normalized = []
+    # Sheet names of the ids taken so far: 1 and "1" name the same sheet
+    sector_ids = set()
+    for index, roi in enumerate(roi_sectors):
+        if not isinstance(roi, dict):
+            raise ValueError(f'Sector #{index + 1} must be an object')
+
+        for field in ROI_REQUIRED_FIELDS:
+            if field not in roi:
+                raise ValueError(f'Missing ROI field: {field} (sector #{index + 1})')
+
+        # The payload of the caller stays as it was
+        roi = dict(roi)
+        if 'sector_id' in roi:
+            roi['sector_id'] = normalize_sector_id(roi['sector_id'], index + 1)
+            if str(roi['sector_id']) in sector_ids:
+                raise ValueError(f"Duplicate sector_id: {roi['sector_id']}")
+            sector_ids.add(str(roi['sector_id']))
+        normalized.append(roi)
+
+    # Sectors without an id get the lowest numbers the explicit ids left free
+    next_id = 1
+    for roi in normalized:
+        if 'sector_id' not in roi:
+            while str(next_id) in sector_ids:
+                next_id += 1
+            roi['sector_id'] = next_id
+            sector_ids.add(str(next_id))
+
+    return normalized
+
+
+def create_sector_json(roi_sectors, user_id):
+    """Creates JSON file with coordinates of all sectors for ML service"""
+    try:
+        # Convert ROI data to ML service format, all sectors are analysed in one pass
         sector_data = {
             "sectors": [
                 {
-                    "sector_id": roi_data.get("sector_id", 1),
+                    "sector_id": roi_data.get("sector_id", index + 1),
                     "region_start": {"coords": roi_data["start_region"]},
                     "region_end": {"coords": roi_data["end_region"]},
                     "lanes": [{"coords": lane} for lane in roi_data["lanes"]],
@@ -70,6 +219,7 @@ def create_sector_json(roi_data, user_id):
                     "sector_length": roi_data["length_km"],
                     "max_speed": roi_data["max_speed"]
                 }
+                for index, roi_data in enumerate(roi_sectors)
             ]
         }
 
@@ -91,15 +241,13 @@ def create_sector_json(roi_data, user_id):
 
 
 def send_to_kafka(task_data):
-    """Sends task to Kafka for ML service"""
+    """Sends task to Kafka (or the local broker, see MESSAGING_BACKEND) for ML service"""
     try:
-        producer = KafkaProducer(
-            bootstrap_servers=[settings.KAFKA_BOOTSTRAP_SERVERS],
-            value_serializer=lambda v: json.dumps(v).encode('utf-8')
-        )
+        producer = create_producer(value_serializer=lambda v: json.dumps(v).encode('utf-8'))
 
-        producer.send('video_processing_tasks', task_data)
-        producer.flush()
+        with PUBLISH_SECONDS.time():
+            producer.send('video_processing_tasks', task_data)
+            producer.flush()
         producer.close()
 
         logger.info(f"Task sent to Kafka: {task_data['task_id']}")
@@ -107,4 +255,24 @@ def send_to_kafka(task_data):
 
     except Exception as e:
         logger.error(f"Error sending to Kafka: {e}")
+        PUBLISH_FAILURES.inc()
+        return False
+
+
+def send_cancel_event(task):
+    """Asks ML service to cancel a task: stop it if it is running, skip it if it is still queued"""
+    try:
+        producer = create_producer(value_serializer=lambda v: json.dumps(v).encode('utf-8'))
+        producer.send('video_processing_cancellations', {
+            "task_id": str(task.task_id),
+            "user_id": task.user_id
+        })
+        producer.flush()
+        producer.close()
+
+        logger.info(f"Cancellation sent to Kafka: {task.task_id}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error sending cancellation to Kafka: {e}")
         return False
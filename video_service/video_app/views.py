@@ -6,17 +6,41 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import json
 import logging
+import time
+
+import requests
 
 from .models import VideoTask
-from .utils import validate_user_token, save_video_file, create_sector_json, send_to_kafka
+from .metrics import observe_upload
+from .tracing import Tracer, new_trace_id
+from .utils import (
+    validate_user_token, save_video_file, create_sector_json, send_to_kafka, send_cancel_event,
+    fetch_result_status, parse_time_window, parse_sampling_schedule, parse_report_formats, normalize_roi_sectors
+)
 from .serializers import (
     VideoUploadSerializer, VideoUploadResponseSerializer,
-    TaskStatusResponseSerializer, UserTasksResponseSerializer,
+    TaskStatusResponseSerializer, TaskCancelResponseSerializer, UserTasksResponseSerializer,
     ErrorResponseSerializer, ROIDataSerializer
 )
 
 logger = logging.getLogger(__name__)
 
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def reconcile_cancelling(task, auth_header):
+    """A task being cancelled takes the final status ML service reported to statistics service"""
+    if task.status != 'cancelling':
+        return
+    try:
+        result_status = fetch_result_status(task.task_id, auth_header)
+    except requests.RequestException as e:
+        logger.warning(f"Cannot check task {task.task_id} in statistics service: {e}")
+        return
+    if result_status in FINAL_STATUSES:
+        task.status = result_status
+        task.save()
+
 
 class VideoUploadView(APIView):
     parser_classes = (MultiPartParser, FormParser)
@@ -34,6 +58,17 @@ class VideoUploadView(APIView):
         - length_km: Sector length in kilometers
         - max_speed: Speed limit in km/h
 
+        Several sectors (e.g. all approaches of an intersection) can be sent at once as a list
+        of such objects or as `{"sectors": [...]}`; they are analysed in a single ML pass.
+
+        Optional `start` and `end` fields (seconds) limit the analysis to a part of the video,
+        e.g. the rush hour inside a longer recording.
+        Optional `sample_duration` and `sample_interval` fields (seconds) enable the sampling mode
+        for very long recordings, e.g. 300 seconds out of every 900.
+        Optional `preview` flag publishes preliminary statistics from a quick low-resolution pass
+        within a fraction of the full processing time.
+        Optional `report_formats` (e.g. `csv,json`) selects the report files besides or instead of xlsx.
+
         Example ROI data:
         ```json
             {
@@ -64,13 +99,22 @@ class VideoUploadView(APIView):
             500: ErrorResponseSerializer
         }
     )
+    @observe_upload
     def post(self, request):
         """
         Upload video and ROI data for processing
         Expected data:
         - video (file)
         - roi_data (JSON string)
+        - start, end (optional, seconds)
+        - sample_duration, sample_interval (optional, seconds)
+        - preview (optional, boolean)
+        - report_formats (optional, comma separated)
         """
+        # The trace of the task starts with the request, spans are written once the task exists
+        started = time.time()
+        tracer = Tracer('video_service', new_trace_id())
+
         # 1. Check authentication
         auth_header = request.META.get('HTTP_AUTHORIZATION')
         if not auth_header:
@@ -104,28 +148,55 @@ class VideoUploadView(APIView):
             return Response({'error': 'Invalid ROI data format'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # 3. Validate ROI data structure
-        required_fields = ['start_region', 'end_region', 'lanes', 'lanes_count', 'length_km', 'max_speed']
-        for field in required_fields:
-            if field not in roi_data:
-                return Response({'error': f'Missing ROI field: {field}'},
-                                status=status.HTTP_400_BAD_REQUEST)
+        # 3. Validate ROI data structure (one or several sectors)
+        try:
+            roi_sectors = normalize_roi_sectors(roi_data)
+        except ValueError as e:
+            return Response({'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            start_time, end_time = parse_time_window(request.data)
+        except ValueError as e:
+            return Response({'error': 'Invalid time window', 'details': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            sample_duration, sample_interval = parse_sampling_schedule(request.data)
+        except ValueError as e:
+            return Response({'error': 'Invalid sampling schedule', 'details': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        preview = str(request.data.get('preview', '')).lower() in ('1', 'true', 'yes', 'on')
+
+        try:
+            report_formats = parse_report_formats(request.data)
+        except ValueError as e:
+            return Response({'error': 'Invalid report formats', 'details': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         try:
             # 4. Save video file
             video_path = save_video_file(video_file, user_id)
 
             # 5. Create sector JSON file
-            sector_json_path = create_sector_json(roi_data, user_id)
+            sector_json_path = create_sector_json(roi_sectors, user_id)
 
             # 6. Create database record
             video_task = VideoTask.objects.create(
                 user_id=user_id,
                 original_filename=video_file.name,
                 video_path=video_path,
-                sector_config=roi_data,
+                sector_config={'sectors': roi_sectors},
+                start_time=start_time,
+                end_time=end_time,
+                sample_duration=sample_duration,
+                sample_interval=sample_interval,
+                preview=preview,
+                report_formats=report_formats,
                 status='uploaded'
             )
+            tracer.record('upload', started, time.time(), task_id=str(video_task.task_id), bytes=video_file.size)
 
             # 7. Prepare task data for ML service
             task_data = {
@@ -135,18 +206,30 @@ class VideoUploadView(APIView):
                 "sector_path": sector_json_path,
                 "output_path": f"/shared/output/output_{user_id}_{video_task.task_id}.mp4",
                 "report_path": f"/shared/reports/report_{user_id}_{video_task.task_id}.xlsx",
-                "model_path": "/app/models/default-model.pt"
+                "model_path": "/app/models/default-model.pt",
+                "start": start_time,
+                "end": end_time,
+                "sample_duration": sample_duration,
+                "sample_interval": sample_interval,
+                "preview": preview,
+                "report_formats": report_formats,
+                "trace_id": tracer.trace_id
             }
 
-            # 8. Send to Kafka
-            if send_to_kafka(task_data):
+            # 8. Send to Kafka, ml_service measures the time in the queue from published_at
+            with tracer.span('publish') as attributes:
+                task_data["published_at"] = time.time()
+                attributes['sent'] = send_to_kafka(task_data)
+
+            if attributes['sent']:
                 video_task.status = 'queued'
                 video_task.save()
 
                 return Response({
                     'task_id': str(video_task.task_id),
                     'status': 'queued',
-                    'message': 'Video processing started successfully'
+                    'message': 'Video processing started successfully',
+                    'trace_id': tracer.trace_id
                 }, status=status.HTTP_201_CREATED)
             else:
                 video_task.status = 'failed'
@@ -205,6 +288,7 @@ class TaskStatusView(APIView):
 
         try:
             task = VideoTask.objects.get(task_id=task_id, user_id=user_id)
+            reconcile_cancelling(task, auth_header)
 
             return Response({
                 'task_id': str(task.task_id),
@@ -219,6 +303,93 @@ class TaskStatusView(APIView):
             return Response({'error': 'Task not found'},
                             status=status.HTTP_404_NOT_FOUND)
 
+    @swagger_auto_schema(
+        operation_summary="Cancel task",
+        operation_description="Cancel a queued or running video processing task. "
+                              "ML service stops it, removes its partial outputs and reports the cancelled status",
+        manual_parameters=[
+            openapi.Parameter(
+                'Authorization',
+                openapi.IN_HEADER,
+                description="Bearer JWT token",
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+            openapi.Parameter(
+                'task_id',
+                openapi.IN_PATH,
+                description="UUID of the task",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={
+            202: TaskCancelResponseSerializer,
+            401: ErrorResponseSerializer,
+            404: ErrorResponseSerializer,
+            409: ErrorResponseSerializer,
+            500: ErrorResponseSerializer,
+            503: ErrorResponseSerializer
+        }
+    )
+    def delete(self, request, task_id):
+        """Cancel a video processing task"""
+        # Check authentication
+        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        if not auth_header:
+            return Response({'error': 'Authorization header missing'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        auth_result = validate_user_token(auth_header)
+        if not auth_result.get('valid'):
+            return Response({'error': 'Invalid token'},
+                            status=status.HTTP_401_UNAUTHORIZED)
+
+        user_id = auth_result['user_id']
+
+        try:
+            task = VideoTask.objects.get(task_id=task_id, user_id=user_id)
+        except VideoTask.DoesNotExist:
+            return Response({'error': 'Task not found'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        if task.status in FINAL_STATUSES:
+            return Response({'error': f'Task is already {task.status}'},
+                            status=status.HTTP_409_CONFLICT)
+
+        # ML service reports the outcome to Statistics Service, this record stays queued until then
+        try:
+            result_status = fetch_result_status(task.task_id, auth_header)
+        except requests.RequestException as e:
+            logger.error(f"Cannot check task {task.task_id} in statistics service: {e}")
+            return Response({'error': 'Cannot check the task state, try again later'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if result_status in FINAL_STATUSES:
+            task.status = result_status
+            task.save()
+            return Response({'error': f'Task is already {result_status}'},
+                            status=status.HTTP_409_CONFLICT)
+
+        if task.status == 'cancelling':
+            return Response({'error': 'Task cancellation is already requested'},
+                            status=status.HTTP_409_CONFLICT)
+
+        if not send_cancel_event(task):
+            return Response({'error': 'Failed to send task cancellation'},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # The task may still finish before ML service handles the event: ML service reports the
+        # outcome to statistics service, and the status endpoints take it from there
+        task.status = 'cancelling'
+        task.save()
+
+        return Response({
+            'task_id': str(task.task_id),
+            'status': 'cancelling',
+            'message': 'Task cancellation requested'
+        }, status=status.HTTP_202_ACCEPTED)
+
 
 class UserTasksView(APIView):
     @swagger_auto_schema(
@@ -257,6 +428,7 @@ class UserTasksView(APIView):
 
         tasks_data = []
         for task in tasks:
+            reconcile_cancelling(task, auth_header)
             tasks_data.append({
                 'task_id': str(task.task_id),
                 'status': task.status,
@@ -109,6 +109,8 @@ REST_FRAMEWORK = {
 
 # Service URLs
 AUTH_SERVICE_URL = config('AUTH_SERVICE_URL', default='http://auth-service:8000')
+# Final task statuses: ML service reports them to Statistics Service only
+STATISTICS_SERVICE_URL = config('STATISTICS_SERVICE_URL', default='http://statistics-service:8000')
 KAFKA_BOOTSTRAP_SERVERS = config('KAFKA_BOOTSTRAP_SERVERS', default='kafka:9092')
 
 # File storage
@@ -116,6 +118,13 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 SHARED_STORAGE_PATH = config('SHARED_STORAGE_PATH', default='/shared')
 
+# Messaging: "kafka" or "local" (SQLite broker file shared with ml_service and statistics_service)
+MESSAGING_BACKEND = config('MESSAGING_BACKEND', default='kafka')
+MESSAGING_LOCAL_PATH = config('MESSAGING_LOCAL_PATH', default=os.path.join(SHARED_STORAGE_PATH, 'messages.sqlite3'))
+
+# Task traces: one JSON line per span in <TRACE_DIR>/<trace_id>.jsonl, appended by every service
+TRACE_DIR = config('TRACE_DIR', default=os.path.join(SHARED_STORAGE_PATH, 'traces'))
+
 # Max file size (100MB)
 FILE_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024
 DATA_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024
@@ -0,0 +1,18 @@
+from .settings import *
+
+# Load test run (see loadtest/ in the repository root): SQLite by default,
+# LOADTEST_DATABASE=postgres keeps the DB_* connection above for a local Postgres
+DEBUG = False
+
+if config('LOADTEST_DATABASE', default='sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('LOADTEST_SQLITE_PATH', default=str(BASE_DIR / 'loadtest.sqlite3')),
+            # Concurrent uploads wait for the write lock instead of failing
+            'OPTIONS': {'timeout': 30},
+        }
+    }
+
+# video_app ships without migration files, its tables are created from the models (migrate --run-syncdb)
+MIGRATION_MODULES = {'video_app': None}
@@ -0,0 +1,11 @@
+from .settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# video_app has no migration files: the test database is built from the models
+MIGRATION_MODULES = {'video_app': None}
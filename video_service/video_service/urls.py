@@ -4,6 +4,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from video_app.metrics import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Video Processing Service API",
@@ -17,6 +19,7 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('video_app.urls')),
+    path('metrics', metrics_view, name='metrics'),
 
     # Swagger URLs
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),